@@ -1,19 +1,4844 @@
 import tkinter as tk
 from tkinter import filedialog, messagebox
-from tkinter.ttk import Combobox, Progressbar
-import pandas as pd
+from tkinter.ttk import Combobox, Progressbar, Style, Treeview
 import os
 import datetime
 import threading
 from queue import Queue
 import re
 import logging
-from openpyxl import load_workbook
-from openpyxl.styles import Font
 import gc
-import psutil
 import time
 from functools import lru_cache
+import importlib
+import io
+import mmap
+import sys
+from array import array
+from collections import deque, namedtuple
+import argparse
+import base64
+import csv
+import errno
+import fnmatch
+import hashlib
+import heapq
+import hmac
+import html
+import ipaddress
+import itertools
+import json
+import math
+import posixpath
+import socket
+import struct
+import tracemalloc
+import xml.etree.ElementTree as ET
+import zipfile
+import zlib
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait as wait_futures
+
+
+class LazyModule:
+    """
+    Stand-in for a heavy module that is imported on first use. Once loaded,
+    the module global is rebound to the real module so hot loops pay nothing.
+    """
+
+    def __init__(self, alias, name):
+        self._alias = alias
+        self._name = name
+
+    def _load(self):
+        module = importlib.import_module(self._name)
+        globals()[self._alias] = module
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+
+# Heavy dependencies are deferred so the window appears before they load
+pd = LazyModule('pd', 'pandas')
+np = LazyModule('np', 'numpy')
+psutil = LazyModule('psutil', 'psutil')
+
+
+def load_workbook(*args, **kwargs):
+    from openpyxl import load_workbook as openpyxl_load_workbook
+    return openpyxl_load_workbook(*args, **kwargs)
+
+
+def Font(*args, **kwargs):
+    from openpyxl.styles import Font as OpenpyxlFont
+    return OpenpyxlFont(*args, **kwargs)
+
+
+def prewarm_modules():
+    """Import the deferred modules ahead of time (run from a background thread)"""
+    for alias in ('pd', 'np', 'psutil'):
+        module = globals()[alias]
+        if isinstance(module, LazyModule):
+            module._load()
+    importlib.import_module('openpyxl')
+    importlib.import_module('openpyxl.styles')
+
+
+class MmapReader(io.RawIOBase):
+    """Seekable file-like view over an mmap so zipfile/openpyxl can parse it in place"""
+
+    def __init__(self, mapped):
+        self._mapped = mapped
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        self._mapped.seek(offset, whence)
+        return self._mapped.tell()
+
+    def tell(self):
+        return self._mapped.tell()
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            return self._mapped.read()
+        return self._mapped.read(size)
+
+    def getbuffer(self):
+        """The mapping itself, for parsers that take the whole file as one buffer"""
+        return self._mapped
+
+    def readinto(self, buffer):
+        data = self._mapped.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            self._mapped.close()
+        super().close()
+
+
+def is_remote_path(file_path):
+    """Check if a path lives on a network share (UNC path or mapped network drive)"""
+    path = os.path.abspath(file_path)
+    if path.startswith(('\\\\', '//')):
+        return True
+    if sys.platform == 'win32':
+        import ctypes
+        drive = os.path.splitdrive(path)[0]
+        if drive:
+            DRIVE_REMOTE = 4
+            return ctypes.windll.kernel32.GetDriveTypeW(drive + '\\') == DRIVE_REMOTE
+    return False
+
+
+ARCHIVE_EXTENSIONS = ('.zip',)
+ARCHIVE_SEPARATOR = '!'  # 'bundle.zip!folder/book.xlsx'; nested archives add another '!member'
+_ARCHIVE_SPLIT = re.compile(r'(?<=\.zip)!', re.IGNORECASE)
+
+MemberStat = namedtuple('MemberStat', 'st_size st_mtime st_mtime_ns')
+
+
+def is_archive_file(file_path):
+    return file_path.lower().endswith(ARCHIVE_EXTENSIONS)
+
+
+def split_archive_path(file_path):
+    """'bundle.zip!inner.zip!book.xlsx' -> ('bundle.zip', ['inner.zip', 'book.xlsx']); ordinary files have no members"""
+    archive_path, *members = _ARCHIVE_SPLIT.split(file_path)
+    return archive_path, [member.replace('\\', '/') for member in members]  # abspath turns '/' into '\\' on Windows
+
+
+def is_archive_member(file_path):
+    return bool(split_archive_path(file_path)[1])
+
+
+def source_name(file_path):
+    """Name shown in reports: the file name, or 'bundle.zip!folder/book.xlsx' for a workbook inside an archive"""
+    archive_path, members = split_archive_path(file_path)
+    return ARCHIVE_SEPARATOR.join([os.path.basename(archive_path)] + members)
+
+
+class ArchiveReader:
+    """
+    Read workbooks straight out of .zip bundles without extracting them to disk.
+    Open archives are kept (the `max_open` most recent) so a bundle's directory
+    is parsed once however many of its members are read; nested archives up to
+    `max_nested_bytes` are held in memory and larger ones are read through a
+    seekable decompressing stream. zipfile serialises the raw reads of one
+    archive while decompression runs in parallel, at most `max_decompress`
+    members at a time. clear() may be called at any time: readers still using
+    an archive keep it open until they are done.
+    """
+
+    def __init__(self, max_open=8, max_nested_bytes=64 * 1024 * 1024, max_decompress=4):
+        self.max_open = max_open
+        self.max_nested_bytes = max_nested_bytes
+        self._archives = {}  # (archive path, signature of the file on disk) -> ZipFile, least recent first
+        self._lock = threading.RLock()
+        self._decompress = threading.BoundedSemaphore(max_decompress)
+
+    def archive(self, archive_path):
+        """ZipFile for an archive on disk or a nested one ('bundle.zip!inner.zip')"""
+        outer_path, members = split_archive_path(archive_path)
+        stat = os.stat(outer_path)
+        key = (archive_path, stat.st_size, stat.st_mtime_ns)  # A replaced bundle is opened afresh
+        with self._lock:
+            archive = self._archives.pop(key, None)
+            if archive is None:
+                if members:
+                    parent = self.archive(ARCHIVE_SEPARATOR.join([outer_path] + members[:-1]))
+                    info = self._getinfo(parent, members[-1], archive_path)
+                    if info.file_size <= self.max_nested_bytes:
+                        with self._decompress:
+                            archive = zipfile.ZipFile(io.BytesIO(parent.read(info)))
+                    else:
+                        archive = zipfile.ZipFile(parent.open(info))
+                else:
+                    archive = zipfile.ZipFile(outer_path)
+            self._archives[key] = archive
+            while len(self._archives) > self.max_open:
+                # Not closed here: another thread may still be reading it, zipfile closes it once unused
+                del self._archives[next(iter(self._archives))]
+            return archive
+
+    @staticmethod
+    def _getinfo(archive, member, file_path):
+        try:
+            return archive.getinfo(member)
+        except KeyError:
+            raise FileNotFoundError(errno.ENOENT, "No such file in the archive", file_path) from None
+
+    def _locate(self, file_path):
+        archive_path, members = split_archive_path(file_path)
+        archive = self.archive(ARCHIVE_SEPARATOR.join([archive_path] + members[:-1]))
+        return archive, self._getinfo(archive, members[-1], file_path)
+
+    def stat(self, file_path):
+        """Uncompressed size of a member; its time is the archive's, so a replaced bundle reads as changed"""
+        _, info = self._locate(file_path)
+        stat = os.stat(split_archive_path(file_path)[0])
+        return MemberStat(info.file_size, stat.st_mtime, stat.st_mtime_ns)
+
+    def read(self, file_path):
+        """Decompress one member into memory"""
+        archive, info = self._locate(file_path)
+        with self._decompress:
+            return archive.read(info)
+
+    def open(self, file_path):
+        """Seekable stream over one member, for members too large to hold in memory"""
+        archive, info = self._locate(file_path)
+        return archive.open(info)
+
+    def iter_members(self, archive_path):
+        """Yield (member path, ZipInfo) for every file in an archive, descending into nested archives"""
+        for info in self.archive(archive_path).infolist():
+            if info.is_dir():
+                continue
+            member_path = archive_path + ARCHIVE_SEPARATOR + info.filename
+            if is_archive_file(info.filename):
+                yield from self.iter_members(member_path)
+            else:
+                yield member_path, info
+
+    def clear(self):
+        with self._lock:
+            self._archives.clear()
+
+
+archive_reader = ArchiveReader()
+
+
+def source_stat(file_path):
+    """os.stat() of a file, or the size and time of a workbook inside an archive"""
+    if is_archive_member(file_path):
+        try:
+            return archive_reader.stat(file_path)
+        except zipfile.BadZipFile as e:
+            raise OSError(f"{split_archive_path(file_path)[0]}: {str(e)}") from e
+    return os.stat(file_path)
+
+
+def open_source(file_path, max_bytes=256 * 1024 * 1024):
+    """
+    What the readers should parse: the path of an ordinary file, or for a
+    workbook inside an archive its bytes in memory (a seekable stream when it
+    is over `max_bytes`). Close the result when it is not the path.
+    """
+    if not is_archive_member(file_path):
+        return file_path
+    if archive_reader.stat(file_path).st_size > max_bytes:
+        return archive_reader.open(file_path)
+    return io.BytesIO(archive_reader.read(file_path))
+
+
+class ReadAheadLoader:
+    """
+    Prefetch whole workbooks with one large sequential read each so the Excel
+    readers parse from memory instead of issuing small seeks over the network.
+    Local files are memory-mapped, remote files are read into a bytes buffer
+    and workbooks inside .zip bundles are decompressed into one.
+    """
+
+    def __init__(self, max_workers=4, max_file_bytes=256 * 1024 * 1024,
+                 max_inflight_bytes=1024 * 1024 * 1024, use_mmap=True, logger=None):
+        self.max_workers = max(1, max_workers)
+        self.max_file_bytes = max_file_bytes
+        self.max_inflight_bytes = max_inflight_bytes
+        self.use_mmap = use_mmap
+        self.logger = logger or logging.getLogger(__name__)
+        self._limits = None  # Settings before any MemoryGovernor throttling
+
+    def throttle(self, level):
+        """MemoryGovernor hook: halve the read-ahead limits `level` times; returns what changed"""
+        if self._limits is None:
+            self._limits = (self.max_workers, self.max_inflight_bytes, self.max_file_bytes)
+        workers, inflight_bytes, file_bytes = self._limits
+        before = (self.max_workers, self.max_inflight_bytes, self.max_file_bytes)
+        self.max_workers = max(1, workers >> level)
+        self.max_inflight_bytes = max(min(inflight_bytes, MemoryGovernor.MIN_INFLIGHT_BYTES), inflight_bytes >> level)
+        self.max_file_bytes = max(min(file_bytes, MemoryGovernor.MIN_FILE_BYTES), file_bytes >> level)
+        mb = 1024 * 1024
+        return (f"read-ahead workers {before[0]} -> {self.max_workers}, "
+                f"in-flight {before[1] // mb} -> {self.max_inflight_bytes // mb} MB, "
+                f"per-file read-ahead {before[2] // mb} -> {self.max_file_bytes // mb} MB")
+
+    def _read_file(self, file_path, size):
+        """Fetch a single file into memory, returning a seekable file-like object"""
+        if is_archive_member(file_path):
+            return io.BytesIO(archive_reader.read(file_path))
+        if self.use_mmap and size > 0 and not is_remote_path(file_path):
+            with open(file_path, 'rb') as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            if hasattr(mapped, 'madvise') and hasattr(mmap, 'MADV_WILLNEED'):
+                mapped.madvise(mmap.MADV_WILLNEED)
+            return MmapReader(mapped)
+
+        # One large read; BytesIO shares the bytes object so no second copy is made
+        with open(file_path, 'rb', buffering=0) as f:
+            data = f.read(size)
+            if len(data) < size:
+                remainder = f.read()
+                data = data + remainder
+        return io.BytesIO(data)
+
+    def read(self, file_path):
+        """
+        Fetch one file on its own the way iter_files would, with no prefetching
+        of others. Close the result unless it is the path itself.
+        """
+        size = source_stat(file_path).st_size
+        if size <= self.max_file_bytes:
+            return self._read_file(file_path, size)
+        if is_archive_member(file_path):
+            return archive_reader.open(file_path)
+        return file_path
+
+    def iter_files(self, file_paths):
+        """
+        Yield (file_path, source, error) in the order given. source is an
+        in-memory file-like object, or for files over the per-file budget the
+        path itself (a decompressing stream for workbooks inside archives).
+        The buffer of a yielded file is released when the caller asks for the
+        next one.
+        """
+        pending = deque()
+        files = deque(file_paths)
+        inflight_bytes = 0
+
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        try:
+            while files or pending:
+                # Reserve budget in file order so the head of the queue can never starve
+                while files and len(pending) < self.max_workers * 2:
+                    file_path = files[0]
+                    try:
+                        size = source_stat(file_path).st_size
+                    except OSError as e:
+                        files.popleft()
+                        pending.append((file_path, 0, None, e))
+                        continue
+
+                    if size > self.max_file_bytes:
+                        files.popleft()
+                        pending.append((file_path, 0, None, None))
+                        continue
+
+                    if pending and inflight_bytes + size > self.max_inflight_bytes:
+                        break
+
+                    files.popleft()
+                    inflight_bytes += size
+                    future = executor.submit(self._read_file, file_path, size)
+                    pending.append((file_path, size, future, None))
+
+                file_path, size, future, error = pending.popleft()
+                source = file_path
+                if future is not None:
+                    try:
+                        source = future.result()
+                    except Exception as e:
+                        error = e
+                        self.logger.warning(f"Read-ahead failed for {file_path}: {str(e)}")
+                elif error is None and is_archive_member(file_path):
+                    self.logger.info(f"{file_path} exceeds read-ahead budget, streaming it from the archive")
+                    try:
+                        source = archive_reader.open(file_path)
+                    except Exception as e:
+                        error = e
+                elif error is None:
+                    self.logger.info(f"{file_path} exceeds read-ahead budget, reading from disk")
+
+                try:
+                    yield file_path, source, error
+                finally:
+                    if source is not file_path:
+                        source.close()
+                    inflight_bytes -= size
+        finally:
+            # The caller may stop early: drop queued reads and release finished buffers
+            executor.shutdown(wait=False, cancel_futures=True)
+            for _, _, future, _ in pending:
+                if future is not None:
+                    future.add_done_callback(_close_prefetched)
+            archive_reader.clear()  # Let go of the bundles (Windows keeps open files locked)
+
+
+def _close_prefetched(future):
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
+
+
+class MemoryGovernor:
+    """
+    Per-phase memory accounting that keeps a scan under a memory ceiling.
+    The worker names the phase it is in (reader, detector, index, report) and
+    a background sampler records the peak RSS of each phase; with `trace` on,
+    tracemalloc also records peak Python allocations (this slows parsing
+    several times, so it is off by default). RSS includes the scan worker
+    processes. When it passes the ceiling every governed target is throttled
+    one level further: a ReadAheadLoader reads fewer files at once with a
+    smaller in-flight budget and streams big files from disk, a JobScheduler
+    runs fewer workers on fewer bytes of workbooks. The limits are
+    relaxed again once usage falls below the low-water mark, so a large run
+    slows down instead of failing. A target is any object with a
+    throttle(level) method that halves its limits `level` times and returns
+    a description of the change.
+    """
+
+    PHASES = ('reader', 'detector', 'index', 'report')
+    MIN_INFLIGHT_BYTES = 64 * 1024 * 1024
+    MIN_FILE_BYTES = 16 * 1024 * 1024
+    MAX_LEVEL = 4  # Each level halves the targets' limits
+
+    def __init__(self, ceiling_percent=85, ceiling_bytes=None, low_water=0.7, interval=0.5,
+                 trace=False, logger=None):
+        self.ceiling_percent = ceiling_percent
+        self.ceiling_bytes = ceiling_bytes
+        self.low_water = low_water
+        self.interval = interval
+        self.trace = trace
+        self.logger = logger or logging.getLogger(__name__)
+
+        self.ceiling = None
+        self.targets = []
+        self.level = 0
+        self.phase = None
+        self.stats = {}
+        self.decisions = []
+
+        self._process = None
+        self._started = None
+        self._phase_started = None
+        self._cooldown_until = 0.0
+        self._owns_trace = False
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def govern(self, target):
+        """Let the governor throttle `target` (a ReadAheadLoader or JobScheduler) while it is running"""
+        with self._lock:
+            self.targets.append(target)
+            target.throttle(self.level)
+        return target
+
+    def release(self, target):
+        """Stop throttling `target` and give it back its own limits"""
+        with self._lock:
+            if target in self.targets:
+                self.targets.remove(target)
+                target.throttle(0)
+
+    # Worker side
+
+    def enter(self, phase):
+        """Attribute everything from now on to `phase`"""
+        if self.ceiling is not None:
+            self.sample()  # Short phases may fall between two sampler ticks
+        now = time.perf_counter()
+        with self._lock:
+            self._close_phase(now)
+            self.phase = phase
+            self._phase_started = now
+            if self._tracing():
+                tracemalloc.reset_peak()
+
+    def track(self, iterable, phase='reader'):
+        """Yield from `iterable`, attributing the time spent producing each item to `phase`"""
+        iterator = iter(iterable)
+        try:
+            while True:
+                previous = self.phase
+                self.enter(phase)
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    self.enter(previous)
+                yield item
+        finally:
+            if hasattr(iterator, 'close'):
+                iterator.close()
+
+    # Sampler side
+
+    def _tracing(self):
+        return self.trace and tracemalloc.is_tracing()
+
+    def _phase_stats(self, phase):
+        return self.stats.setdefault(phase, {'seconds': 0.0, 'rss_peak': 0, 'python_peak': 0})
+
+    def _close_phase(self, now):
+        if self.phase is None:
+            return
+        stats = self._phase_stats(self.phase)
+        stats['seconds'] += now - self._phase_started
+        if self._tracing():
+            stats['python_peak'] = max(stats['python_peak'], tracemalloc.get_traced_memory()[1])
+
+    def rss(self):
+        """RSS of this process and its children (the scan workers)"""
+        if self._process is None:
+            self._process = psutil.Process()
+        rss = self._process.memory_info().rss
+        for child in self._process.children(recursive=True):
+            try:
+                rss += child.memory_info().rss
+            except psutil.Error:
+                pass  # Exited between the listing and the sample
+        return rss
+
+    def sample(self):
+        """Record RSS for the current phase and throttle the targets if needed"""
+        rss = self.rss()
+        now = time.perf_counter()
+        with self._lock:
+            if self.phase is not None:
+                stats = self._phase_stats(self.phase)
+                stats['rss_peak'] = max(stats['rss_peak'], rss)
+            if now < self._cooldown_until:
+                return rss
+            if rss > self.ceiling and self.level < self.MAX_LEVEL:
+                self._adjust(self.level + 1, 'Shrink', rss, now)
+            elif rss < self.ceiling * self.low_water and self.level > 0:
+                self._adjust(self.level - 1, 'Grow', rss, now)
+        return rss
+
+    def _adjust(self, level, action, rss, now):
+        mb = 1024 * 1024
+        self.level = level
+        detail = '; '.join(target.throttle(level) for target in self.targets) or "nothing to adjust"
+        # Give the change time to show in RSS before deciding again
+        self._cooldown_until = now + self.interval * 4
+        self.decisions.append({
+            'at': now - self._started, 'phase': self.phase, 'action': action, 'rss': rss, 'detail': detail
+        })
+        self.logger.warning(f"Memory {action.lower()} at {rss / mb:.0f} MB "
+                            f"(ceiling {self.ceiling / mb:.0f} MB) during {self.phase}: {detail}")
+        if action == 'Shrink':
+            gc.collect()
+            if self._tracing():
+                for stat in tracemalloc.take_snapshot().statistics('lineno')[:3]:
+                    self.logger.info(f"Top allocation: {stat}")
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.sample()
+            except Exception as e:
+                self.logger.warning(f"Memory sampling failed: {str(e)}")
+
+    def start(self):
+        """Start (or resume) sampling; phases and decisions accumulate across restarts"""
+        if self._started is None:
+            self._started = time.perf_counter()
+        self._stop.clear()
+        if self.ceiling is None:
+            self.ceiling = self.ceiling_bytes or psutil.virtual_memory().total * self.ceiling_percent / 100
+        if self.trace and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._owns_trace = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self.enter(None)
+        if self._owns_trace:
+            tracemalloc.stop()
+            self._owns_trace = False
+        for row in self.metrics():
+            if row['EVENT'] == 'Peak':
+                python_peak = f", Python {row['PYTHON_MB']} MB" if self.trace else ""
+                self.logger.info(f"Memory peak during {row['PHASE']}: RSS {row['RSS_MB']} MB{python_peak} "
+                                 f"over {row['SECONDS']}s")
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def metrics(self):
+        """Rows for the Run_Metrics report sheet: ceiling, per-phase peaks, then every adjustment"""
+        mb = 1024 * 1024
+        rows = [{
+            'PHASE': 'run', 'EVENT': 'Ceiling', 'SECONDS': None, 'RSS_MB': round(self.ceiling / mb, 1),
+            'PYTHON_MB': None, 'DETAIL': f"low water {self.low_water:.0%}, tracemalloc {'on' if self.trace else 'off'}"
+        }]
+        phases = list(self.PHASES) + [phase for phase in self.stats if phase not in self.PHASES]
+        for phase in phases:
+            if phase not in self.stats:
+                continue
+            stats = self.stats[phase]
+            rows.append({
+                'PHASE': phase, 'EVENT': 'Peak', 'SECONDS': round(stats['seconds'], 2),
+                'RSS_MB': round(stats['rss_peak'] / mb, 1),
+                'PYTHON_MB': round(stats['python_peak'] / mb, 1) if self.trace else None, 'DETAIL': ''
+            })
+        for decision in self.decisions:
+            rows.append({
+                'PHASE': decision['phase'], 'EVENT': decision['action'], 'SECONDS': round(decision['at'], 2),
+                'RSS_MB': round(decision['rss'] / mb, 1), 'PYTHON_MB': None, 'DETAIL': decision['detail']
+            })
+        return rows
+
+
+ProgressEvent = namedtuple(
+    'ProgressEvent',
+    ['phase', 'percent', 'message', 'rows', 'barcodes', 'rows_per_second', 'bytes_per_second', 'eta_seconds']
+)
+
+
+class ProgressTracker:
+    """
+    Progress counters shared by a scan and the places that display it.
+    Workers only assign plain attributes (rows/barcodes of the current file,
+    file begin/end); a background aggregator samples them every `interval`
+    seconds and hands a smoothed ProgressEvent with throughput and ETA to
+    each sink. Sinks never run on the worker's hot loop. Files scanned in
+    worker processes report through update_file/finish_file instead, several
+    at a time.
+    """
+
+    # Share of the overall progress bar given to each phase
+    PHASES = {
+        'scan': (0.0, 0.8),
+        'group': (0.8, 0.9),
+        'report': (0.9, 1.0),
+    }
+
+    def __init__(self, sinks=(), interval=0.25, smoothing=0.3):
+        self.sinks = list(sinks)
+        self.interval = interval
+        self.smoothing = smoothing
+
+        self.phase = 'scan'
+        self.message = ""
+        self.files_total = 0
+        self.files_done = 0
+        self.bytes_total = 0
+        self.bytes_done = 0
+        self.rows_done = 0
+        self.barcodes_done = 0
+        self.current_file = None
+        self.current_size = 0
+        self.file_rows = 0  # Rows read so far in the current file
+        self.file_rows_total = None  # Row count of the current sheet when the reader knows it
+        self.file_barcodes = 0
+        self.active = {}  # Files in worker processes: path -> (size, rows, rows total, barcodes)
+
+        self._started = None
+        self._last_sample = None
+        self._rows_rate = 0.0
+        self._bytes_rate = 0.0
+        self._fraction_rate = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    # Worker side
+
+    def set_files(self, file_paths):
+        self.files_total = len(file_paths)
+        self.bytes_total = 0
+        for file_path in file_paths:
+            try:
+                self.bytes_total += source_stat(file_path).st_size
+            except OSError:
+                pass
+
+    def begin_file(self, file_path):
+        self.current_file = file_path
+        try:
+            self.current_size = source_stat(file_path).st_size
+        except OSError:
+            self.current_size = 0
+        self.file_rows = 0
+        self.file_rows_total = None
+        self.file_barcodes = 0
+
+    def end_file(self):
+        self.files_done += 1
+        self.bytes_done += self.current_size
+        self.rows_done += self.file_rows
+        self.barcodes_done += self.file_barcodes
+        self.current_file = None
+        self.current_size = 0
+        self.file_rows = 0
+        self.file_rows_total = None
+        self.file_barcodes = 0
+
+    def update_file(self, file_path, rows, rows_total, barcodes):
+        """Latest counters of a file being scanned in a worker process"""
+        size = self.active[file_path][0] if file_path in self.active else self._size_of(file_path)
+        # Replaced, not mutated, so the aggregator never sees the dict change under it
+        self.active = {**self.active, file_path: (size, rows, rows_total, barcodes)}
+
+    def finish_file(self, file_path, barcodes):
+        """A file scanned in a worker process has been merged"""
+        active = dict(self.active)
+        size, rows, _, _ = active.pop(file_path, (self._size_of(file_path), 0, None, 0))
+        self.active = active
+        self.files_done += 1
+        self.bytes_done += size
+        self.rows_done += rows
+        self.barcodes_done += barcodes
+
+    @staticmethod
+    def _size_of(file_path):
+        try:
+            return source_stat(file_path).st_size
+        except OSError:
+            return 0
+
+    def set_phase(self, phase, message=""):
+        self.phase = phase
+        self.message = message
+
+    # Aggregator side
+
+    def scan_fraction(self):
+        """Fraction of the scan phase done, by bytes, interpolated by rows within the files in progress"""
+        in_files = [(self.current_size, self.file_rows, self.file_rows_total)]
+        in_files += [(size, rows, rows_total) for size, rows, rows_total, _ in self.active.values()]
+        in_bytes = in_count = 0.0
+        for size, rows, rows_total in in_files:
+            if rows_total:
+                in_bytes += min(rows / rows_total, 1.0) * size
+                in_count += min(rows / rows_total, 1.0)
+        if self.bytes_total:
+            return min((self.bytes_done + in_bytes) / self.bytes_total, 1.0)
+        if self.files_total:
+            return min((self.files_done + in_count) / self.files_total, 1.0)
+        return 0.0
+
+    def snapshot(self):
+        now = time.perf_counter()
+        active = list(self.active.items())
+        rows = self.rows_done + self.file_rows + sum(entry[1] for _, entry in active)
+        barcodes = self.barcodes_done + self.file_barcodes + sum(entry[3] for _, entry in active)
+        start, end = self.PHASES.get(self.phase, (0.0, 1.0))
+        fraction = start + (end - start) * (self.scan_fraction() if self.phase == 'scan' else 0.0)
+        bytes_read = self.scan_fraction() * self.bytes_total
+
+        if self._last_sample is not None:
+            last_time, last_rows, last_bytes, last_fraction = self._last_sample
+            elapsed = now - last_time
+            if elapsed > 0:
+                alpha = self.smoothing
+                self._rows_rate += alpha * ((rows - last_rows) / elapsed - self._rows_rate)
+                self._bytes_rate += alpha * ((bytes_read - last_bytes) / elapsed - self._bytes_rate)
+                self._fraction_rate += alpha * ((fraction - last_fraction) / elapsed - self._fraction_rate)
+        self._last_sample = (now, rows, bytes_read, fraction)
+
+        eta = (1.0 - fraction) / self._fraction_rate if self._fraction_rate > 1e-6 else None
+        message = self.message
+        if self.phase == 'scan' and self.current_file:
+            message = f"Scanning {source_name(self.current_file)} ({self.files_done + 1}/{self.files_total})"
+        elif self.phase == 'scan' and active:
+            others = f" and {len(active) - 1} more" if len(active) > 1 else ""
+            message = f"Scanning {source_name(active[0][0])}{others} ({self.files_done + 1}/{self.files_total})"
+        return ProgressEvent(
+            self.phase, fraction * 100, message, rows, barcodes, self._rows_rate, self._bytes_rate, eta
+        )
+
+    def emit(self):
+        event = self.snapshot()
+        for sink in self.sinks:
+            try:
+                sink(event)
+            except Exception as e:
+                logging.getLogger(__name__).warning(f"Progress sink failed: {str(e)}")
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.emit()
+
+    def start(self):
+        self._started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        for sink in self.sinks:
+            if hasattr(sink, 'close'):
+                sink.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+def format_progress(event):
+    """One-line progress text with throughput and ETA"""
+    parts = [event.message] if event.message else []
+    if event.rows:
+        parts.append(f"{event.rows:,} rows, {event.barcodes:,} barcodes")
+    if event.rows_per_second >= 1:
+        parts.append(f"{event.rows_per_second:,.0f} rows/s, {event.bytes_per_second / 1048576:.1f} MB/s")
+    if event.eta_seconds is not None:
+        parts.append(f"ETA {datetime.timedelta(seconds=int(event.eta_seconds))}")
+    return " | ".join(parts)
+
+
+class ConsoleProgressSink:
+    """Single updating line on a terminal; one line per `interval` seconds otherwise"""
+
+    def __init__(self, stream=None, interval=2.0):
+        self.stream = stream or sys.stderr
+        self.interval = interval
+        self.is_tty = hasattr(self.stream, 'isatty') and self.stream.isatty()
+        self._last = 0.0
+
+    def __call__(self, event):
+        text = f"[{event.percent:5.1f}%] {format_progress(event)}"
+        if self.is_tty:
+            self.stream.write("\r" + text[:119].ljust(119))
+        else:
+            now = time.perf_counter()
+            if now - self._last < self.interval:
+                return
+            self._last = now
+            self.stream.write(text + "\n")
+        self.stream.flush()
+
+    def close(self):
+        if self.is_tty:
+            self.stream.write("\n")
+            self.stream.flush()
+
+
+class LogProgressSink:
+    """Write progress to the log at most once per `interval` seconds"""
+
+    def __init__(self, logger, interval=5.0):
+        self.logger = logger
+        self.interval = interval
+        self._last = 0.0
+
+    def __call__(self, event):
+        now = time.perf_counter()
+        if now - self._last >= self.interval:
+            self._last = now
+            self.logger.info(f"Progress {event.percent:.1f}%: {format_progress(event)}")
+
+
+# Built-in barcode patterns, used when no barcode_patterns.json is found.
+# Patterns are grouped by family (manufacturer); format names must be unique.
+BARCODE_PATTERNS = {
+    'ICON': {
+        'ICON-17': r'^ICON\d{13}$',  # ICON followed by 13 digits
+        'ICON-18': r'^ICON\d{3}[A-Z]\d{10}$',  # ICON + 3 digits + 1 letter + 10 digits
+        'ICON-20': r'^ICON\d{5}[A-Z]\d{10}$'  # ICON + 5 digits + 1 letter + 10 digits
+    }
+}
+
+PATTERNS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "barcode_patterns.json")
+
+# The regex parser is a CPython internal; without it every pattern is tried for every value
+try:
+    from re import _parser as sre_parse
+except ImportError:
+    try:
+        import sre_parse  # Python < 3.11
+    except ImportError:
+        sre_parse = None
+
+_MAX_DISPATCH_LENGTH = 64  # Patterns allowing longer values are tried for every length
+
+
+def analyse_pattern(pattern):
+    """
+    Return (literal_prefix, min_length, max_length) of a regex, max_length
+    None if unbounded. A pattern the parser cannot analyse gets ('', 0, None),
+    so it is still tried for every value, only without the dispatch speedup.
+    """
+    if sre_parse is None:
+        return '', 0, None
+    try:
+        parsed = sre_parse.parse(pattern)
+        prefix = []
+        for op, argument in parsed:
+            if op == sre_parse.AT:
+                continue
+            if op != sre_parse.LITERAL:
+                break
+            prefix.append(chr(argument))
+        min_length, max_length = parsed.getwidth()
+    except Exception:
+        return '', 0, None
+    if max_length > _MAX_DISPATCH_LENGTH:
+        max_length = None
+    return ''.join(prefix), min_length, max_length
+
+
+class BarcodeMatcher:
+    """
+    Compiled set of barcode patterns. Values are dispatched first by length,
+    then through a prefix trie of the patterns' literal prefixes, so only the
+    few regexes that can possibly match are run. Candidates are tried longest
+    literal prefix first, not in configuration order: a value matching the
+    patterns of two overlapping formats gets the one with the longer prefix,
+    which need not be the one listed first.
+    """
+
+    def __init__(self, families):
+        self.families = families
+        self.family_of = {}
+        self.formats = []  # Format names in configuration order
+        self.lengths = set()
+        self._by_length = {}
+        self._any_length = self._new_node()
+        self._has_any_length = False
+
+        for family, formats in families.items():
+            for barcode_type, spec in formats.items():
+                if barcode_type in self.family_of:
+                    raise ValueError(f"Barcode format '{barcode_type}' is defined more than once")
+                pattern = spec['pattern'] if isinstance(spec, dict) else spec
+                compiled = re.compile(pattern)
+                prefix, min_length, max_length = analyse_pattern(pattern)
+                if isinstance(spec, dict):
+                    prefix = spec.get('prefix', prefix)
+                    if 'length' in spec:
+                        min_length = max_length = spec['length']
+
+                self.family_of[barcode_type] = family
+                self.formats.append(barcode_type)
+                candidate = (barcode_type, compiled)
+                if max_length is None:
+                    self._insert(self._any_length, prefix.upper(), candidate)
+                    self._has_any_length = True
+                    continue
+                for length in range(min_length, max_length + 1):
+                    self.lengths.add(length)
+                    root = self._by_length.setdefault(length, self._new_node())
+                    self._insert(root, prefix.upper(), candidate)
+
+    @staticmethod
+    def _new_node():
+        return [{}, []]  # Children by character, candidates whose prefix ends here
+
+    def _insert(self, root, prefix, candidate):
+        node = root
+        for char in prefix:
+            node = node[0].setdefault(char, self._new_node())
+        node[1].append(candidate)
+
+    @staticmethod
+    def _search(root, value):
+        path = [root[1]]
+        node = root
+        for char in value:
+            node = node[0].get(char)
+            if node is None:
+                break
+            path.append(node[1])
+        for candidates in reversed(path):
+            for barcode_type, compiled in candidates:
+                if compiled.fullmatch(value):
+                    return barcode_type
+        return None
+
+    def can_match_length(self, length):
+        return self._has_any_length or length in self.lengths
+
+    def match(self, value):
+        """Return the matching format name for an upper-cased, stripped value, or None"""
+        root = self._by_length.get(len(value))
+        if root is not None:
+            barcode_type = self._search(root, value)
+            if barcode_type:
+                return barcode_type
+        if self._has_any_length:
+            return self._search(self._any_length, value)
+        return None
+
+
+def load_barcode_matcher(config_path=None):
+    """
+    Load barcode families from a JSON file ({family: {format: regex}}) and
+    compile them. Falls back to the built-in ICON patterns when the default
+    barcode_patterns.json is missing.
+    """
+    path = config_path or PATTERNS_FILE
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            families = json.load(f)
+    elif config_path:
+        raise FileNotFoundError(f"Barcode pattern file not found: {config_path}")
+    else:
+        families = BARCODE_PATTERNS
+    return BarcodeMatcher(families)
+
+
+def configure_logging():
+    logging.basicConfig(
+        filename='duplicate_finder.log',
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
+    return logging.getLogger(__name__)
+
+
+def get_report_folder():
+    """Folder on the Desktop where reports and run artefacts are written"""
+    folder_path = os.path.join(os.path.expanduser("~"), "Desktop", "DUPLICATE_BARCODES")
+    os.makedirs(folder_path, exist_ok=True)
+    return folder_path
+
+
+DEFAULT_INCLUDE = ('*.xlsx', '*.xls', '*.xlsm')
+DEFAULT_EXCLUDE = ('~$*',)  # Lock files Excel leaves next to open workbooks
+
+
+def is_valid_excel_file(filename):
+    """Check if the file is a valid Excel file (not temporary and has correct extension)"""
+    base_name = os.path.basename(filename)
+    return (
+        not base_name.startswith("~$") and  # Skip temporary files
+        base_name.lower().endswith((".xlsx", ".xls", ".xlsm"))  # Must be Excel file
+    )
+
+
+def _compile_globs(patterns):
+    """Split glob patterns into (name regex, relative path regex); either is None when unused"""
+    def compile_group(group):
+        if not group:
+            return None
+        return re.compile('|'.join(fnmatch.translate(pattern) for pattern in group), re.IGNORECASE)
+
+    patterns = [pattern.replace('\\', '/') for pattern in patterns or ()]
+    return (compile_group([pattern for pattern in patterns if '/' not in pattern]),
+            compile_group([pattern for pattern in patterns if '/' in pattern]))
+
+
+class FileDiscovery:
+    """
+    Find Excel files under folders with os.scandir, listing subdirectories
+    concurrently on a thread pool: on a network share each listing is a
+    round trip, so keeping many in flight beats one sequential walk. Include
+    and exclude rules are globs, matched case-insensitively against the file
+    name, or against the path relative to the folder when they contain '/';
+    exclude rules also prune directories. Size and modification-time filters
+    use the scandir entry's stat, which costs nothing extra on Windows. Files
+    are yielded in batches as directories finish so they can be shown at once.
+    With `archives`, .zip bundles (and zips inside them) are searched like
+    folders and their workbooks yielded as 'bundle.zip!folder/book.xlsx'.
+    """
+
+    def __init__(self, include=DEFAULT_INCLUDE, exclude=DEFAULT_EXCLUDE, min_size=None, max_size=None,
+                 modified_after=None, modified_before=None, archives=True, workers=16, logger=None):
+        self.include = _compile_globs(include)
+        self.exclude = _compile_globs(exclude)
+        self.min_size = min_size
+        self.max_size = max_size
+        self.modified_after = modified_after  # Timestamps (seconds since the epoch)
+        self.modified_before = modified_before
+        self.archives = archives
+        self.workers = workers
+        self.logger = logger or logging.getLogger(__name__)
+        self.stats = self._new_stats()
+
+    @staticmethod
+    def _new_stats():
+        return {'files': 0, 'directories': 0, 'archives': 0, 'matched': 0, 'skipped': 0, 'errors': 0,
+                'seconds': 0.0}
+
+    @staticmethod
+    def _matches(rules, name, relative):
+        name_rule, path_rule = rules
+        return bool((name_rule and name_rule.match(name)) or (path_rule and path_rule.match(relative)))
+
+    def _within_limits(self, stat):
+        return not (
+            (self.min_size is not None and stat.st_size < self.min_size) or
+            (self.max_size is not None and stat.st_size > self.max_size) or
+            (self.modified_after is not None and stat.st_mtime < self.modified_after) or
+            (self.modified_before is not None and stat.st_mtime > self.modified_before)
+        )
+
+    def _has_limits(self):
+        return any(limit is not None for limit in
+                   (self.min_size, self.max_size, self.modified_after, self.modified_before))
+
+    def classify(self, name, relative, stat=None):
+        """'match', 'skip' (an included name that a rule or filter rejects) or None (not an Excel file)"""
+        if not self._matches(self.include, name, relative):
+            return None
+        if self._matches(self.exclude, name, relative):
+            return 'skip'
+        if stat is not None and not self._within_limits(stat):
+            return 'skip'
+        return 'match'
+
+    def _is_searched_archive(self, name, relative):
+        return self.archives and is_archive_file(name) and not self._matches(self.exclude, name, relative)
+
+    def _scan_archive(self, archive_path, prefix, counts):
+        """
+        List the workbooks inside one archive, nested archives included, as
+        if it were a folder; `counts` gathers files seen, skipped and unreadable
+        archives. Member sizes and times come from the archive's directory.
+        """
+        matched = []
+        needs_stat = self._has_limits()
+        counts['archives'] += 1
+        try:
+            for member_path, info in archive_reader.iter_members(archive_path):
+                counts['files'] += 1
+                member = member_path[len(archive_path) + 1:].replace(ARCHIVE_SEPARATOR, '/')
+                stat = None
+                if needs_stat:
+                    mtime = time.mktime(info.date_time + (0, 0, -1))
+                    stat = MemberStat(info.file_size, mtime, int(mtime * 1e9))
+                verdict = self.classify(posixpath.basename(member), prefix + member, stat)
+                if verdict == 'match':
+                    matched.append(member_path)
+                elif verdict == 'skip':
+                    counts['skipped'] += 1
+        except (OSError, zipfile.BadZipFile, RuntimeError, NotImplementedError) as e:
+            # Damaged, encrypted or unsupported compression: report it and keep what was listed
+            counts['errors'] += 1
+            self.logger.warning(f"Cannot read archive {archive_path}: {str(e)}")
+        return matched
+
+    def _scan_directory(self, directory, prefix):
+        """
+        List one directory (`prefix` is its path below the folder, ending in '/'):
+        (matched files, (subdirectory, prefix) pairs, counts to add to the stats)
+        """
+        matched, subdirectories = [], []
+        counts = {'files': 0, 'archives': 0, 'skipped': 0, 'errors': 0}
+        needs_stat = self._has_limits()
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                relative = prefix + entry.name
+                if entry.is_dir(follow_symlinks=False):
+                    if not self._matches(self.exclude, entry.name, relative):
+                        subdirectories.append((entry.path, relative + '/'))
+                    continue
+                if not entry.is_file():
+                    continue
+                if self._is_searched_archive(entry.name, relative):
+                    matched.extend(self._scan_archive(entry.path, relative + '/', counts))
+                    continue
+                counts['files'] += 1
+                verdict = self.classify(entry.name, relative, entry.stat() if needs_stat else None)
+                if verdict == 'match':
+                    matched.append(entry.path)
+                elif verdict == 'skip':
+                    counts['skipped'] += 1
+        return matched, subdirectories, counts
+
+    def iter_batches(self, paths, stop=None):
+        """
+        Yield lists of matching absolute file paths as directories are listed.
+        Paths that are files are checked against the rules directly. Setting
+        `stop` (or closing the generator) abandons the remaining directories.
+        """
+        start = time.perf_counter()
+        self.stats = stats = self._new_stats()
+        executor = ThreadPoolExecutor(max_workers=self.workers)
+        pending = {}  # future -> directory
+        try:
+            for path in paths:
+                if os.path.isdir(path):
+                    root = os.path.abspath(path)
+                    pending[executor.submit(self._scan_directory, root, '')] = root
+                    continue
+                name = os.path.basename(path)
+                if self._is_searched_archive(name, name) and (os.path.isfile(path) or is_archive_member(path)):
+                    matched = self._scan_archive(os.path.abspath(path), name + '/', stats)
+                    stats['matched'] += len(matched)
+                    if matched:
+                        yield matched
+                    continue
+                stats['files'] += 1
+                try:
+                    stat = source_stat(path) if self._has_limits() else None
+                except OSError:
+                    stat = None  # Let the scan report the missing file
+                verdict = self.classify(name, name, stat)
+                if verdict == 'match':
+                    stats['matched'] += 1
+                    yield [os.path.abspath(path)]
+                elif verdict == 'skip':
+                    stats['skipped'] += 1
+
+            while pending:
+                if stop is not None and stop.is_set():
+                    break
+                done, _ = wait_futures(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    directory = pending.pop(future)
+                    try:
+                        matched, subdirectories, counts = future.result()
+                    except OSError as e:
+                        stats['errors'] += 1
+                        self.logger.warning(f"Cannot list {directory}: {str(e)}")
+                        continue
+                    stats['directories'] += 1
+                    for key, count in counts.items():
+                        stats[key] += count
+                    stats['matched'] += len(matched)
+                    for subdirectory, prefix in subdirectories:
+                        pending[executor.submit(self._scan_directory, subdirectory, prefix)] = subdirectory
+                    stats['seconds'] = time.perf_counter() - start
+                    if matched:
+                        yield matched
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+            archive_reader.clear()
+            stats['seconds'] = time.perf_counter() - start
+
+    def collect(self, paths):
+        """Every matching file under `paths`, sorted"""
+        return sorted({path for batch in self.iter_batches(paths) for path in batch})
+
+
+def format_discovery_stats(stats):
+    """One line for the status bar or log: what was scanned, how fast, and what matched"""
+    rate = stats['files'] / stats['seconds'] if stats['seconds'] > 0 else 0.0
+    line = f"Scanned {stats['files']:,} files in {stats['directories']:,} folders"
+    if stats['archives']:
+        line += f" and {stats['archives']:,} archives"
+    line += f" in {stats['seconds']:.1f}s ({rate:,.0f} files/s); {stats['matched']:,} Excel files found"
+    if stats['skipped']:
+        line += f", {stats['skipped']:,} skipped by rules"
+    if stats['errors']:
+        line += f", {stats['errors']:,} folders or archives unreadable"
+    return line
+
+
+def collect_excel_files(paths, discovery=None):
+    """Expand files and folders given on the command line into a sorted list of Excel files"""
+    return (discovery or FileDiscovery()).collect(paths)
+
+
+def detect_barcode(value, matcher):
+    """
+    Detect if a value matches one of the barcode patterns
+    Returns (is_barcode, barcode_type)
+    """
+    if value is None or pd.isna(value):
+        return False, None
+
+    # Convert to string and remove any whitespace
+    str_value = str(value).strip().upper()
+
+    # Skip empty strings and lengths no pattern can produce
+    if not str_value or not matcher.can_match_length(len(str_value)):
+        return False, None
+
+    barcode_type = matcher.match(str_value)
+    return barcode_type is not None, barcode_type
+
+
+def iter_sheet_values(source, file_path, sheet_name=None, progress=None):
+    """
+    Stream (row, column, value) for every non-empty cell of one sheet.
+    .xlsx/.xlsm files are read row by row through openpyxl's read-only mode,
+    .xls files go through pandas/xlrd. A ProgressTracker, if given, sees the
+    sheet's row count and the current row.
+    """
+    if os.path.splitext(file_path)[1].lower() == '.xls':
+        df = pd.read_excel(source, sheet_name=sheet_name or 0, dtype=str, header=None, engine='xlrd')
+        if progress is not None:
+            progress.file_rows_total = len(df.index) * len(df.columns)
+        for col_idx, column in enumerate(df.columns):
+            for row_idx, value in enumerate(df[column]):
+                if not pd.isna(value):
+                    yield row_idx + 1, col_idx + 1, value
+            if progress is not None:
+                progress.file_rows += len(df.index)
+        return
+
+    wb = load_workbook(source, read_only=True, data_only=True)
+    try:
+        ws = wb[sheet_name] if sheet_name else wb.worksheets[0]
+        if progress is not None:
+            progress.file_rows_total = ws.max_row
+        for row_idx, row in enumerate(ws.iter_rows(values_only=True), start=1):
+            if progress is not None:
+                progress.file_rows = row_idx
+            for col_idx, value in enumerate(row, start=1):
+                if value is not None:
+                    yield row_idx, col_idx, value
+    finally:
+        wb.close()
+
+
+class XlsxFastPathUnavailable(Exception):
+    """The workbook uses an XML layout XlsxSheetReader does not handle"""
+
+
+_XLSX_CELL = re.compile(rb'<c\b([^>]*?)(?:/>|>(.*?)</c>)', re.S)  # Attributes may come in any order
+_XLSX_REFERENCE = re.compile(rb'\br="([A-Z]{1,3})([0-9]+)"')
+_XLSX_UNREFERENCED_CELL = re.compile(rb'<c(?:>| (?![^>]*\br="))')
+_XLSX_TYPE = re.compile(rb'\bt="([a-zA-Z]+)"')
+_XLSX_STYLE = re.compile(rb'\bs="([0-9]+)"')
+_XLSX_VALUE = re.compile(rb'<v>([^<]*)</v>')
+_XLSX_TEXT = re.compile(rb'<t(?: [^>]*)?>([^<]*)</t>')
+_XLSX_SHARED_STRING = re.compile(rb'<si(?:/>|>(.*?)</si>)', re.S)
+_XLSX_PHONETIC = re.compile(rb'<rPh\b.*?</rPh>', re.S)
+_XLSX_DIMENSION = re.compile(rb'<dimension ref="[A-Z]*[0-9]*:?[A-Z]*([0-9]*)"')
+_XLSX_LAST_ROW = re.compile(rb'<row r="([0-9]+)"')
+_column_numbers = {}
+
+
+def _column_number(letters):
+    number = _column_numbers.get(letters)
+    if number is None:
+        number = 0
+        for letter in letters:
+            number = number * 26 + letter - 64
+        _column_numbers[letters] = number
+    return number
+
+
+def _xml_name(tag):
+    """Tag or attribute name without its namespace"""
+    return tag.rsplit('}', 1)[-1]
+
+
+class XlsxSheetReader:
+    """
+    Fast reader for one .xlsx/.xlsm sheet. Text cells refer to the shared
+    string table by index, so every shared string is tested against the
+    barcode patterns once, and the sheet XML is scanned with a regular
+    expression for those indices instead of building a Python value per
+    cell. Only indices that hold barcodes are ever resolved to text.
+    Raises XlsxFastPathUnavailable for layouts it does not handle.
+    """
+
+    CHUNK_SIZE = 4 * 1024 * 1024
+
+    def __init__(self, source, sheet_name, matcher):
+        self.matcher = matcher
+        self.archive = zipfile.ZipFile(source)
+        try:
+            self.sheet_path, strings_path, styles_path = self._locate(sheet_name)
+            self.barcodes, self.formats = self._load_shared_strings(strings_path)
+            self.date_styles = self._load_date_styles(styles_path)
+            with self.archive.open(self.sheet_path) as f:
+                head = f.read(64 * 1024)
+            complete_rows = head[:head.rfind(b'</row>') + 1]  # A cell tag may be cut off at the end
+            if b'<sheetData' not in head or _XLSX_UNREFERENCED_CELL.search(complete_rows):
+                raise XlsxFastPathUnavailable("prefixed tags or cells without references")
+            dimension = _XLSX_DIMENSION.search(head)
+            self.max_row = int(dimension.group(1)) if dimension and dimension.group(1) else None
+        except Exception:
+            self.archive.close()
+            raise
+
+    def close(self):
+        self.archive.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _relationships(self, rels_path, base):
+        """Map relationship id -> (type, archive path) for one .rels part"""
+        try:
+            root = ET.fromstring(self.archive.read(rels_path))
+        except KeyError:
+            return {}
+        relationships = {}
+        for element in root:
+            if element.get('TargetMode') == 'External':
+                continue
+            target = element.get('Target', '')
+            path = target.lstrip('/') if target.startswith('/') else posixpath.normpath(posixpath.join(base, target))
+            relationships[element.get('Id')] = (element.get('Type', ''), path)
+        return relationships
+
+    def _locate(self, sheet_name):
+        """Archive paths of the requested worksheet, the shared strings and the styles"""
+        workbook_path = next(
+            (path for rel_type, path in self._relationships('_rels/.rels', '').values()
+             if rel_type.endswith('/officeDocument')),
+            'xl/workbook.xml'
+        )
+        workbook_dir = posixpath.dirname(workbook_path)
+        rels = self._relationships(
+            posixpath.join(workbook_dir, '_rels', posixpath.basename(workbook_path) + '.rels'), workbook_dir
+        )
+
+        worksheets = []
+        for element in ET.fromstring(self.archive.read(workbook_path)).iter():
+            if _xml_name(element.tag) != 'sheet':
+                continue
+            rel_id = next((value for key, value in element.attrib.items() if _xml_name(key) == 'id'), None)
+            rel_type, path = rels.get(rel_id, ('', None))
+            if rel_type.endswith('/worksheet'):
+                worksheets.append((element.get('name'), path))
+
+        if sheet_name:
+            sheet_path = next((path for name, path in worksheets if name == sheet_name), None)
+            if sheet_path is None:
+                raise KeyError(f"Worksheet {sheet_name} does not exist.")
+        elif worksheets:
+            sheet_path = worksheets[0][1]
+        else:
+            raise XlsxFastPathUnavailable("no worksheets")
+
+        strings_path = next((path for rel_type, path in rels.values() if rel_type.endswith('/sharedStrings')), None)
+        styles_path = next((path for rel_type, path in rels.values() if rel_type.endswith('/styles')), None)
+        return sheet_path, strings_path, styles_path
+
+    def _load_shared_strings(self, strings_path):
+        """Test each shared string once: barcode text and format per index (None if not a barcode)"""
+        barcodes = []
+        formats = []
+        if strings_path is None:
+            return barcodes, formats
+        data = self.archive.read(strings_path)
+        if b'<sst' not in data[:1024]:
+            raise XlsxFastPathUnavailable("prefixed shared string tags")
+        matcher = self.matcher
+        for item in _XLSX_SHARED_STRING.finditer(data):
+            # Plain <t> or rich-text runs <r><t>; phonetic hints (<rPh>) are not part of the value
+            content = item.group(1) or b''
+            if b'<rPh' in content:
+                content = _XLSX_PHONETIC.sub(b'', content)
+            text = b''.join(_XLSX_TEXT.findall(content)).decode('utf-8')
+            if '&' in text:
+                text = html.unescape(text)
+            value = text.strip().upper()
+            barcode_type = matcher.match(value) if value and matcher.can_match_length(len(value)) else None
+            barcodes.append(value if barcode_type else None)
+            formats.append(barcode_type)
+        return barcodes, formats
+
+    def _load_date_styles(self, styles_path):
+        """Style ids whose number format shows a date (openpyxl returns those cells as datetimes)"""
+        if styles_path is None:
+            return frozenset()
+        from openpyxl.styles.numbers import BUILTIN_FORMATS, is_date_format
+        root = ET.fromstring(self.archive.read(styles_path))
+        custom_formats = {}
+        date_styles = set()
+        for element in root:
+            name = _xml_name(element.tag)
+            if name == 'numFmts':
+                for number_format in element:
+                    custom_formats[int(number_format.get('numFmtId', 0))] = number_format.get('formatCode', '')
+            elif name == 'cellXfs':
+                for style_id, xf in enumerate(element):
+                    format_id = int(xf.get('numFmtId', 0))
+                    format_code = custom_formats.get(format_id, BUILTIN_FORMATS.get(format_id, ''))
+                    if is_date_format(format_code):
+                        date_styles.add(style_id)
+        return frozenset(date_styles)
+
+    def _cell_value(self, attributes, content):
+        """Value of a cell that is not a shared string, as openpyxl would return it"""
+        type_match = _XLSX_TYPE.search(attributes)
+        cell_type = type_match.group(1) if type_match else b'n'
+        if cell_type == b'inlineStr':
+            text = b''.join(_XLSX_TEXT.findall(content)).decode('utf-8')
+            return html.unescape(text) if '&' in text else text
+        value_match = _XLSX_VALUE.search(content)
+        if value_match is None:
+            return None
+        text = value_match.group(1).decode('utf-8')
+        if cell_type == b'n':
+            style_match = _XLSX_STYLE.search(attributes)
+            if style_match and int(style_match.group(1)) in self.date_styles:
+                return None  # Dates and times never hold barcodes
+            return float(text) if ('.' in text or 'E' in text or 'e' in text) else int(text)
+        if cell_type == b'str':
+            return html.unescape(text)
+        if cell_type == b'b':
+            return text == '1'
+        return None  # Error values
+
+    def _iter_cells(self, progress=None):
+        """Yield (column letters, row digits, shared string index or None, barcode, format) per barcode cell"""
+        if progress is not None:
+            progress.file_rows_total = self.max_row
+        barcodes = self.barcodes
+        formats = self.formats
+        can_match_length = self.matcher.can_match_length
+        match = self.matcher.match
+        with self.archive.open(self.sheet_path) as f:
+            pending = b''
+            while True:
+                chunk = f.read(self.CHUNK_SIZE)
+                data = pending + chunk
+                if chunk:
+                    # Only scan up to the last complete row; the rest waits for the next chunk
+                    cut = data.rfind(b'</row>')
+                    if cut < 0:
+                        pending = data
+                        continue
+                    pending = data[cut + 6:]
+                    data = data[:cut + 6]
+                    if _XLSX_UNREFERENCED_CELL.search(data):
+                        raise XlsxFastPathUnavailable("cells without references")
+
+                for cell in _XLSX_CELL.finditer(data):
+                    content = cell.group(2)
+                    if not content:
+                        continue
+                    attributes = cell.group(1)
+                    if b't="s"' in attributes:
+                        value = _XLSX_VALUE.search(content)
+                        if value is None:
+                            continue  # A formula with no cached result
+                        try:
+                            index = int(value.group(1))
+                            barcode_type = formats[index]
+                        except (ValueError, IndexError):
+                            raise XlsxFastPathUnavailable(f"shared string reference {value.group(1)!r}")
+                        if barcode_type is not None:
+                            reference = _XLSX_REFERENCE.search(attributes)
+                            yield reference.group(1), reference.group(2), index, barcodes[index], barcode_type
+                        continue
+                    value = self._cell_value(attributes, content)
+                    if value is None:
+                        continue
+                    text = str(value).strip().upper()
+                    if text and can_match_length(len(text)):
+                        barcode_type = match(text)
+                        if barcode_type is not None:
+                            reference = _XLSX_REFERENCE.search(attributes)
+                            yield reference.group(1), reference.group(2), None, text, barcode_type
+
+                if progress is not None:
+                    last_row = None
+                    for last_row in _XLSX_LAST_ROW.finditer(data[-4096:]):
+                        pass
+                    if last_row:
+                        progress.file_rows = int(last_row.group(1))
+                if not chunk:
+                    break
+
+    def iter_barcodes(self, progress=None):
+        """Yield (row, column, barcode, barcode_type) for every barcode cell"""
+        for letters, row, _, barcode, barcode_type in self._iter_cells(progress):
+            row = int(row)
+            if progress is not None:
+                progress.file_rows = row  # A whole sheet can fit in one chunk
+            yield row, _column_number(letters), barcode, barcode_type
+
+    def count_barcodes(self, progress=None):
+        """
+        Return {barcode: [barcode_type, occurrences]} without resolving cell
+        positions; shared-string references are counted per index and only the
+        indices that hold barcodes are turned into text.
+        """
+        references = [0] * len(self.barcodes)
+        counts = {}
+        for _, _, index, barcode, barcode_type in self._iter_cells(progress):
+            if index is not None:
+                references[index] += 1
+            else:
+                entry = counts.setdefault(barcode, [barcode_type, 0])
+                entry[1] += 1
+        for index, count in enumerate(references):
+            if count:
+                # Different indices can hold the same barcode once stripped/upper-cased
+                entry = counts.setdefault(self.barcodes[index], [self.formats[index], 0])
+                entry[1] += count
+        return counts
+
+
+def open_xls_workbook(source):
+    """
+    Open a legacy .xls (BIFF) workbook on demand: only the workbook globals
+    (sheet list, shared strings) are parsed; sheets load when asked for.
+    """
+    import xlrd
+    options = {'on_demand': True, 'logfile': io.StringIO()}  # xlrd prints its warnings otherwise
+    if isinstance(source, (str, os.PathLike)):
+        return xlrd.open_workbook(source, **options)
+    if isinstance(source, MmapReader):
+        return xlrd.open_workbook(file_contents=source.getbuffer(), **options)
+    if isinstance(source, io.BytesIO):
+        return xlrd.open_workbook(file_contents=source.getvalue(), **options)  # Shares the prefetched bytes
+    source.seek(0)
+    return xlrd.open_workbook(file_contents=source.read(), **options)
+
+
+def read_sheet_names(file_path):
+    """Sheet names of a workbook without loading any sheet data where the format allows it"""
+    source = open_source(file_path)
+    try:
+        if os.path.splitext(file_path)[1].lower() == '.xls':
+            book = open_xls_workbook(source)
+            try:
+                return book.sheet_names()
+            finally:
+                book.release_resources()
+        with pd.ExcelFile(source) as xls:
+            return xls.sheet_names
+    finally:
+        if source is not file_path:
+            source.close()
+
+
+class XlsSheetReader:
+    """
+    Reader for one sheet of a legacy .xls workbook. The workbook is opened on
+    demand so the other sheets are never parsed, each distinct text value is
+    tested against the barcode patterns once, and the sheet is unloaded as
+    soon as it has been scanned. Cells are read as pandas/xlrd read them:
+    text as is, whole numbers as integers; dates, booleans and errors never
+    hold barcodes.
+    """
+
+    def __init__(self, source, sheet_name, matcher):
+        self.matcher = matcher
+        self.book = open_xls_workbook(source)
+        names = self.book.sheet_names()
+        if sheet_name and sheet_name not in names:
+            self.book.release_resources()
+            raise KeyError(f"Worksheet {sheet_name} does not exist.")
+        self.sheet_index = names.index(sheet_name) if sheet_name else 0
+
+    def close(self):
+        self.book.release_resources()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def iter_barcodes(self, progress=None):
+        """Yield (row, column, barcode, barcode_type) for every barcode cell"""
+        from xlrd import XL_CELL_NUMBER, XL_CELL_TEXT
+
+        can_match_length = self.matcher.can_match_length
+        match = self.matcher.match
+        texts = {}  # Text cells share the workbook's string table, so most values repeat
+        sheet = self.book.sheet_by_index(self.sheet_index)
+        try:
+            if progress is not None:
+                progress.file_rows_total = sheet.nrows
+            for row in range(sheet.nrows):
+                if progress is not None:
+                    progress.file_rows = row + 1
+                for column, (cell_type, value) in enumerate(zip(sheet.row_types(row), sheet.row_values(row))):
+                    if cell_type == XL_CELL_TEXT:
+                        result = texts.get(value)
+                        if result is None:
+                            text = value.strip().upper()
+                            result = texts[value] = (
+                                text, match(text) if text and can_match_length(len(text)) else None
+                            )
+                        text, barcode_type = result
+                    elif cell_type == XL_CELL_NUMBER:
+                        text = str(int(value) if value.is_integer() else value)
+                        barcode_type = match(text) if can_match_length(len(text)) else None
+                    else:
+                        continue
+                    if barcode_type is not None:
+                        yield row + 1, column + 1, text, barcode_type
+        finally:
+            self.book.unload_sheet(self.sheet_index)
+
+    def count_barcodes(self, progress=None):
+        """Return {barcode: [barcode_type, occurrences]}"""
+        counts = {}
+        for _, _, barcode, barcode_type in self.iter_barcodes(progress):
+            entry = counts.setdefault(barcode, [barcode_type, 0])
+            entry[1] += 1
+        return counts
+
+
+def iter_sheet_barcodes(source, file_path, sheet_name, matcher, progress=None):
+    """
+    Stream (row, column, barcode, barcode_type) for every barcode cell of one
+    sheet. .xlsx/.xlsm sheets go through the shared-string fast path and .xls
+    sheets through XlsSheetReader; layouts the fast path does not handle go
+    through iter_sheet_values. When the fast path meets such a layout part way
+    through the sheet, openpyxl carries on after the last cell already yielded.
+    """
+    reader = _open_sheet_reader(source, file_path, sheet_name, matcher)
+    resume_after = None
+    if reader is not None:
+        with reader:
+            try:
+                for found in reader.iter_barcodes(progress):
+                    resume_after = found[:2]
+                    yield found
+                return
+            except XlsxFastPathUnavailable as e:
+                logging.getLogger(__name__).info(
+                    f"Shared-string fast path stopped part way through {file_path}: {str(e)}")
+        if hasattr(source, 'seek'):
+            source.seek(0)
+
+    yield from _iter_value_barcodes(source, file_path, sheet_name, matcher, progress, resume_after)
+
+
+def _iter_value_barcodes(source, file_path, sheet_name, matcher, progress=None, resume_after=None):
+    """Barcode cells through iter_sheet_values; cells are in sheet order, so `resume_after` skips those already seen"""
+    for row, column, value in iter_sheet_values(source, file_path, sheet_name, progress):
+        if resume_after is not None and (row, column) <= resume_after:
+            continue
+        is_barcode, barcode_type = detect_barcode(value, matcher)
+        if is_barcode:
+            yield row, column, str(value).strip().upper(), barcode_type
+
+
+def count_sheet_barcodes(source, file_path, sheet_name, matcher, progress=None):
+    """Return {barcode: [barcode_type, occurrences]} for one sheet"""
+    reader = _open_sheet_reader(source, file_path, sheet_name, matcher)
+    if reader is not None:
+        with reader:
+            try:
+                return reader.count_barcodes(progress)
+            except XlsxFastPathUnavailable as e:
+                # Nothing has been handed out yet: count the whole sheet again through openpyxl
+                logging.getLogger(__name__).info(
+                    f"Shared-string fast path stopped part way through {file_path}: {str(e)}")
+        if hasattr(source, 'seek'):
+            source.seek(0)
+
+    counts = {}
+    for _, _, barcode, barcode_type in _iter_value_barcodes(source, file_path, sheet_name, matcher, progress):
+        entry = counts.setdefault(barcode, [barcode_type, 0])
+        entry[1] += 1
+    return counts
+
+
+def _open_sheet_reader(source, file_path, sheet_name, matcher):
+    """XlsSheetReader/XlsxSheetReader for the sheet, or None when openpyxl should read it instead"""
+    if os.path.splitext(file_path)[1].lower() == '.xls':
+        return XlsSheetReader(source, sheet_name, matcher)
+    try:
+        return XlsxSheetReader(source, sheet_name, matcher)
+    except (XlsxFastPathUnavailable, zipfile.BadZipFile, ET.ParseError) as e:
+        # openpyxl copes with the layout, or reports the damage in its usual words
+        logging.getLogger(__name__).info(f"Shared-string fast path not used for {file_path}: {str(e)}")
+        if hasattr(source, 'seek'):
+            source.seek(0)
+        return None
+
+
+class HyperLogLog:
+    """
+    Fixed-size distinct-count sketch. Registers are a bytearray of 2**precision
+    bytes (4 KB at the default precision, ~1.6% standard error). Sketches with
+    the same precision merge by taking the register-wise maximum.
+    """
+
+    def __init__(self, precision=12, registers=None):
+        self.precision = precision
+        self.m = 1 << precision
+        self.registers = bytearray(registers) if registers is not None else bytearray(self.m)
+        if len(self.registers) != self.m:
+            raise ValueError(f"Expected {self.m} registers, got {len(self.registers)}")
+
+    @staticmethod
+    def alpha(m):
+        return 0.7213 / (1 + 1.079 / m)
+
+    def add(self, value):
+        digest = hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest()
+        h = int.from_bytes(digest, 'big')
+        index = h >> (64 - self.precision)
+        remaining_bits = 64 - self.precision
+        w = h & ((1 << remaining_bits) - 1)
+        rank = remaining_bits - w.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other):
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge sketches with different precision")
+        self.registers = bytearray(map(max, self.registers, other.registers))
+        return self
+
+    def estimate(self):
+        m = self.m
+        total = sum(2.0 ** -r for r in self.registers)
+        estimate = self.alpha(m) * m * m / total
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)  # Linear counting for small cardinalities
+        return estimate
+
+    def to_base64(self):
+        return base64.b64encode(bytes(self.registers)).decode('ascii')
+
+    @classmethod
+    def from_base64(cls, data, precision=12):
+        return cls(precision, base64.b64decode(data))
+
+
+def pairwise_union_estimates(sketches):
+    """Estimate |A ∪ B| for every pair of sketches at once, returns {(i, j): estimate}"""
+    import numpy as np
+
+    if len(sketches) < 2:
+        return {}
+    m = sketches[0].m
+    alpha = HyperLogLog.alpha(m)
+    matrix = np.array([np.frombuffer(bytes(s.registers), dtype=np.uint8) for s in sketches])
+    powers = 2.0 ** -np.arange(256)
+
+    unions = {}
+    for i in range(len(sketches) - 1):
+        merged = np.maximum(matrix[i], matrix[i + 1:])
+        estimates = alpha * m * m / powers[merged].sum(axis=1)
+        zeros = (merged == 0).sum(axis=1)
+        small = (estimates <= 2.5 * m) & (zeros > 0)
+        estimates[small] = m * np.log(m / zeros[small])
+        for offset, estimate in enumerate(estimates):
+            unions[(i, i + 1 + offset)] = float(estimate)
+    return unions
+
+
+class TriageSketchStore:
+    """
+    Persist per-file sketches between runs so repeat triage of an unchanged
+    file costs nothing and results from different runs can be merged.
+    Entries are keyed by path and sheet and invalidated by size/mtime.
+    """
+
+    def __init__(self, store_path, precision=12):
+        self.store_path = store_path
+        self.precision = precision
+        self.entries = {}
+        if store_path and os.path.exists(store_path):
+            try:
+                with open(store_path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if data.get('precision') == precision:
+                    self.entries = data.get('files', {})
+            except (OSError, ValueError) as e:
+                logging.getLogger(__name__).warning(f"Ignoring unreadable sketch store {store_path}: {str(e)}")
+
+    @staticmethod
+    def key(file_path, sheet_name):
+        return f"{os.path.abspath(file_path)}|{sheet_name or ''}"
+
+    @staticmethod
+    def signature(file_path):
+        stat = source_stat(file_path)
+        return [stat.st_size, int(stat.st_mtime)]
+
+    def get(self, file_path, sheet_name):
+        entry = self.entries.get(self.key(file_path, sheet_name))
+        if not entry or entry['signature'] != self.signature(file_path):
+            return None
+        sketches = {fmt: HyperLogLog.from_base64(data, self.precision) for fmt, data in entry['formats'].items()}
+        return entry['hits'], entry.get('repeats'), sketches
+
+    def put(self, file_path, sheet_name, hits, repeats, sketches):
+        self.entries[self.key(file_path, sheet_name)] = {
+            'signature': self.signature(file_path),
+            'hits': hits,
+            'repeats': repeats,
+            'formats': {fmt: sketch.to_base64() for fmt, sketch in sketches.items()}
+        }
+
+    def save(self):
+        if not self.store_path:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.store_path)), exist_ok=True)
+        with open(self.store_path, 'w', encoding='utf-8') as f:
+            json.dump({'precision': self.precision, 'files': self.entries}, f)
+
+
+def run_triage(file_sheets, matcher, loader=None, store=None, precision=12,
+               max_pair_files=300, progress=None, logger=None):
+    """
+    Stream every barcode through per-file, per-format HyperLogLog sketches and
+    estimate distinct counts, the union and pairwise overlaps between files.
+    file_sheets is a list of (file_path, sheet_name) pairs.
+    """
+    logger = logger or logging.getLogger(__name__)
+    loader = loader or ReadAheadLoader(logger=logger)
+    sheet_by_file = dict(file_sheets)
+    if progress is not None:
+        progress.set_files(list(sheet_by_file))
+
+    # Files whose stored sketches are still valid are not read at all; only
+    # the rest go through the read-ahead loader
+    sketched = {}
+    if store:
+        for file_path, sheet_name in sheet_by_file.items():
+            try:
+                cached = store.get(file_path, sheet_name)
+            except (OSError, ValueError):
+                cached = None  # Read below, which reports the error
+            if cached:
+                sketched[file_path] = cached
+                if progress is not None:
+                    progress.begin_file(file_path)
+                    progress.file_barcodes = cached[0]
+                    progress.end_file()
+
+    errors = []
+    for file_path, source, read_error in loader.iter_files([f for f in sheet_by_file if f not in sketched]):
+        sheet_name = sheet_by_file[file_path]
+        if progress is not None:
+            progress.begin_file(file_path)
+
+        try:
+            if read_error:
+                raise read_error
+
+            # Occurrences are counted per distinct barcode, so each one is sketched once
+            hits = 0
+            repeats = 0
+            sketches = {}
+            for barcode, (barcode_type, count) in count_sheet_barcodes(
+                    source, file_path, sheet_name, matcher, progress).items():
+                hits += count
+                repeats += count - 1
+                sketch = sketches.get(barcode_type)
+                if sketch is None:
+                    sketch = sketches[barcode_type] = HyperLogLog(precision)
+                sketch.add(barcode)
+            if progress is not None:
+                progress.file_barcodes = hits
+            if store:
+                store.put(file_path, sheet_name, hits, repeats, sketches)
+            sketched[file_path] = (hits, repeats, sketches)
+        except Exception as e:
+            logger.error(f"Triage failed for {file_path}: {str(e)}")
+            errors.append((file_path, str(e)))
+        finally:
+            if progress is not None:
+                progress.end_file()
+
+    files = []
+    for file_path in sheet_by_file:
+        if file_path not in sketched:
+            continue  # Failed
+        hits, repeats, sketches = sketched[file_path]
+        file_sketch = HyperLogLog(precision)
+        for sketch in sketches.values():
+            file_sketch.merge(sketch)
+        files.append({
+            'FILE_NAME': source_name(file_path),
+            'PATH': file_path,
+            'HITS': hits,
+            'REPEATS': repeats,  # Exact in-file repeats; None for sketches stored by older versions
+            'DISTINCT': file_sketch.estimate(),
+            'SKETCH': file_sketch,
+            'FORMATS': sketches
+        })
+
+    if store:
+        store.save()
+
+    if progress is not None:
+        progress.set_phase('group', "Estimating overlaps...")
+    union = HyperLogLog(precision)
+    format_sketches = {}
+    for entry in files:
+        union.merge(entry['SKETCH'])
+        for fmt, sketch in entry['FORMATS'].items():
+            format_sketches.setdefault(fmt, HyperLogLog(precision)).merge(sketch)
+
+    # Inclusion-exclusion on the sketch estimates: |A ∩ B| ≈ |A| + |B| - |A ∪ B|
+    pairs = []
+    if len(files) <= max_pair_files:
+        unions = pairwise_union_estimates([entry['SKETCH'] for entry in files])
+        for (i, j), union_estimate in unions.items():
+            overlap = files[i]['DISTINCT'] + files[j]['DISTINCT'] - union_estimate
+            # Ignore overlaps that are within the sketch error of zero
+            noise = 0.05 * min(files[i]['DISTINCT'], files[j]['DISTINCT'])
+            if overlap > max(noise, 1):
+                pairs.append((files[i]['FILE_NAME'], files[j]['FILE_NAME'], overlap))
+        pairs.sort(key=lambda pair: pair[2], reverse=True)
+    else:
+        logger.info(f"Skipping pairwise overlap estimates for {len(files)} files (limit {max_pair_files})")
+
+    return {
+        'files': files,
+        'errors': errors,
+        'total_hits': sum(entry['HITS'] for entry in files),
+        'union': union.estimate(),
+        'formats': {fmt: sketch.estimate() for fmt, sketch in sorted(format_sketches.items())},
+        'pairs': pairs,
+        'pairs_skipped': len(files) > max_pair_files
+    }
+
+
+def format_triage_summary(result, max_pairs=10):
+    """Render a triage result as plain text for the CLI and the GUI dialog"""
+    total_hits = result['total_hits']
+    union = result['union']
+    lines = [
+        f"Files sketched: {len(result['files'])}",
+        f"Barcodes seen: {total_hits}",
+        f"Estimated distinct barcodes: ~{union:,.0f}",
+        f"Estimated repeated barcodes: ~{max(total_hits - union, 0):,.0f}",
+    ]
+    for fmt, estimate in result['formats'].items():
+        lines.append(f"  {fmt}: ~{estimate:,.0f} distinct")
+    repeated_files = [entry for entry in result['files'] if entry['REPEATS']]
+    if repeated_files:
+        lines.append(f"\nRepeated within the same file (exact): {sum(entry['REPEATS'] for entry in repeated_files):,}")
+        for entry in sorted(repeated_files, key=lambda entry: entry['REPEATS'], reverse=True)[:max_pairs]:
+            lines.append(f"  {entry['FILE_NAME']}: {entry['REPEATS']:,}")
+
+    if result['pairs_skipped']:
+        lines.append("\nPairwise overlaps skipped (too many files).")
+    elif result['pairs']:
+        lines.append(f"\nLikely overlapping files ({len(result['pairs'])} pair(s)):")
+        for name_a, name_b, overlap in result['pairs'][:max_pairs]:
+            lines.append(f"  {name_a} <-> {name_b}: ~{overlap:,.0f}")
+        if len(result['pairs']) > max_pairs:
+            lines.append(f"  ... and {len(result['pairs']) - max_pairs} more")
+    else:
+        lines.append("\nNo overlapping files detected.")
+
+    if result['errors']:
+        lines.append(f"\nWarning: {len(result['errors'])} file(s) could not be read.")
+    lines.append("\nEstimates are approximate (~2% error); run a full check to confirm.")
+    return "\n".join(lines)
+
+
+def scan_file_into_store(store, source, file_path, sheet_name, matcher, progress=None):
+    """
+    Add every barcode of one sheet to a LocationStore and return how many were
+    found. Nothing is kept from a file that fails part way through.
+    """
+    file_start = len(store)
+    file_id = store.intern_file(os.path.abspath(file_path))
+    sheet_id = store.intern_sheet(sheet_name)
+    try:
+        for row, column, barcode, barcode_type in iter_sheet_barcodes(source, file_path, sheet_name, matcher, progress):
+            store.add(barcode, barcode_type, file_id, sheet_id, row, column)
+            if progress is not None:
+                progress.file_barcodes += 1
+    except Exception:
+        store.truncate(file_start)
+        raise
+    return len(store) - file_start
+
+
+def iter_duplicate_groups(file_sheets, matcher, loader=None, cross_file_only=False, reference_files=None,
+                          errors=None, progress=None, logger=None):
+    """
+    Stream duplicate groups as soon as they are discovered. Each group is
+    yielded once, when its barcode is seen for the second time, as a dict with
+    BARCODE, FAMILY, FORMAT and LOCATIONS [(file_path, sheet_name, row, column), ...].
+    With cross_file_only, repeats inside the same file are ignored. Files in
+    `reference_files` (existing allocations) only count against the other,
+    new files: a barcode shared by two reference files is not a conflict.
+    Closing the generator stops parsing and cancels queued reads.
+    """
+    logger = logger or logging.getLogger(__name__)
+    loader = loader or ReadAheadLoader(logger=logger)
+    sheet_by_file = dict(file_sheets)
+    references = set(reference_files or ())
+    first_seen = {}
+    reported = set()
+    if progress is not None:
+        progress.set_files(list(sheet_by_file))
+
+    for file_path, source, read_error in loader.iter_files([f for f, _ in file_sheets]):
+        sheet_name = sheet_by_file[file_path]
+        if progress is not None:
+            progress.begin_file(file_path)
+
+        try:
+            if read_error:
+                raise read_error
+
+            for row, column, barcode, barcode_type in iter_sheet_barcodes(
+                    source, file_path, sheet_name, matcher, progress):
+                location = (file_path, sheet_name, row, column)
+                if progress is not None:
+                    progress.file_barcodes += 1
+                first = first_seen.get(barcode)
+                if first is None:
+                    first_seen[barcode] = location
+                elif barcode not in reported and not (cross_file_only and first[0] == file_path) and not (
+                        file_path in references and first[0] in references):
+                    reported.add(barcode)
+                    yield {
+                        'BARCODE': barcode,
+                        'FAMILY': matcher.family_of[barcode_type],
+                        'FORMAT': barcode_type,
+                        'LOCATIONS': [first, location]
+                    }
+        except Exception as e:
+            logger.error(f"Duplicate check failed for {file_path}: {str(e)}")
+            if errors is not None:
+                errors.append((file_path, str(e)))
+        finally:
+            if progress is not None:
+                progress.end_file()
+
+
+def find_first_duplicates(file_sheets, matcher, stop_after=1, **kwargs):
+    """
+    Return up to stop_after duplicate groups, stopping all remaining parsing
+    as soon as enough conflicts are found. A clean result is an empty list.
+    """
+    groups = iter_duplicate_groups(file_sheets, matcher, **kwargs)
+    try:
+        return list(itertools.islice(groups, stop_after)) if stop_after else list(groups)
+    finally:
+        groups.close()
+
+
+def format_conflicts(groups, errors=None):
+    """Render early-exit duplicate groups as plain text"""
+    if not groups:
+        lines = ["CLEAN: no shared barcodes found."]
+    else:
+        lines = [f"CONFLICT: {len(groups)} duplicate barcode(s) found (stopped early)."]
+        for group in groups:
+            lines.append(f"\n{group['BARCODE']} ({group['FAMILY']} {group['FORMAT']})")
+            for file_path, sheet_name, row, column in group['LOCATIONS']:
+                sheet = f" [{sheet_name}]" if sheet_name else ""
+                lines.append(f"  {source_name(file_path)}{sheet} row {row}, column {column}")
+    if errors:
+        lines.append(f"\nWarning: {len(errors)} file(s) could not be read.")
+    return "\n".join(lines)
+
+
+_WIDER_TYPECODES = {'B': 'H', 'H': 'I', 'I': 'Q'}
+_SHAPE_SEGMENT = re.compile(r'([0-9]+)|A')
+_LAYOUT_TABLE = str.maketrans('0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ', '9' * 10 + 'A' * 26)
+_PACKED_LIMIT = 1 << 63
+_pack_plans = {}
+
+
+def _pack_plan(prefix, layout):
+    """Work out the shape string and digit/letter segments for one layout, once"""
+    if set(layout) - {'9', 'A'}:
+        return None  # Characters outside 0-9/A-Z
+    segments = []
+    parts = []
+    start = 0
+    for match in re.finditer(r'9+|A', layout):
+        width = match.end() - match.start()
+        if match.group().startswith('9'):
+            segments.append((start, start + width, 10 ** width))
+            parts.append(str(width))
+        else:
+            segments.append((start, start + 1, 0))
+            parts.append('A')
+        start += width
+    return prefix + ':' + ''.join(parts), segments
+
+
+def pack_barcode(barcode):
+    """
+    Pack a barcode into a (shape, int) pair. The shape keeps the leading
+    letters and the digit/letter layout (e.g. 'ICON:3A10'), the int holds the
+    remaining characters in mixed radix (10 per digit, 26 per letter).
+    Returns None when the barcode does not fit in 63 bits.
+    """
+    split = len(barcode) - len(barcode.lstrip('ABCDEFGHIJKLMNOPQRSTUVWXYZ'))
+    prefix, body = barcode[:split], barcode[split:]
+    plan_key = (prefix, body.translate(_LAYOUT_TABLE))
+    plan = _pack_plans.get(plan_key)
+    if plan is None:
+        plan = _pack_plans[plan_key] = _pack_plan(*plan_key) or False
+    if not plan:
+        return None
+
+    shape, segments = plan
+    if len(segments) == 1 and segments[0][2]:
+        value = int(body)
+    else:
+        value = 0
+        for start, end, radix in segments:
+            if radix:
+                value = value * radix + int(body[start:end])
+            else:
+                value = value * 26 + ord(body[start]) - 65
+    if value >= _PACKED_LIMIT:
+        return None
+    return shape, value
+
+
+def unpack_barcode(shape, value):
+    """Rebuild the barcode string from pack_barcode's (shape, int) pair"""
+    prefix, layout = shape.split(':', 1)
+    parts = []
+    for match in reversed(list(_SHAPE_SEGMENT.finditer(layout))):
+        if match.group(1):
+            width = int(match.group(1))
+            value, digits = divmod(value, 10 ** width)
+            parts.append(str(digits).zfill(width))
+        else:
+            value, letter = divmod(value, 26)
+            parts.append(chr(65 + letter))
+    return prefix + ''.join(reversed(parts))
+
+
+class LocationStore:
+    """
+    Columnar store of barcode locations. Each location is one entry in a set
+    of typed arrays: packed barcode key, file id, sheet id, row, column and a
+    categorical code for (format, shape). File paths, sheet names and codes
+    are interned once. Integer columns start narrow and widen on overflow,
+    so a typical location costs 17 bytes.
+    """
+
+    def __init__(self):
+        self.files = []
+        self.sheets = []
+        self.kinds = []  # (barcode_type, shape), shape None for barcodes kept in self.overflow
+        self.overflow = []
+        self._file_ids = {}
+        self._sheet_ids = {}
+        self._kind_ids = {}
+        self._overflow_ids = {}
+
+        self.keys = array('q')
+        self.file_ids = array('B')
+        self.sheet_ids = array('B')
+        self.rows = array('B')
+        self.columns = array('B')
+        self.codes = array('B')
+
+    def __len__(self):
+        return len(self.keys)
+
+    @staticmethod
+    def _intern(value, table, ids):
+        value_id = ids.get(value)
+        if value_id is None:
+            value_id = ids[value] = len(table)
+            table.append(value)
+        return value_id
+
+    def intern_file(self, file_path):
+        return self._intern(file_path, self.files, self._file_ids)
+
+    def intern_sheet(self, sheet_name):
+        return self._intern(sheet_name, self.sheets, self._sheet_ids)
+
+    def _append(self, name, value):
+        column = getattr(self, name)
+        try:
+            column.append(value)
+        except OverflowError:
+            typecode = column.typecode
+            while True:
+                typecode = _WIDER_TYPECODES[typecode]
+                try:
+                    column = array(typecode, column)
+                    column.append(value)
+                    break
+                except OverflowError:
+                    continue
+            setattr(self, name, column)
+
+    def add(self, barcode, barcode_type, file_id, sheet_id, row, column):
+        packed = pack_barcode(barcode)
+        if packed is None:
+            shape, key = None, self._intern(barcode, self.overflow, self._overflow_ids)
+        else:
+            shape, key = packed
+        code = self._kind_ids.get((barcode_type, shape))
+        if code is None:
+            code = self._intern((barcode_type, shape), self.kinds, self._kind_ids)
+
+        try:
+            self.file_ids.append(file_id)
+            self.sheet_ids.append(sheet_id)
+            self.rows.append(row)
+            self.columns.append(column)
+            self.codes.append(code)
+        except OverflowError:
+            # Widen whichever column overflowed and finish the remaining appends
+            length = len(self.keys)
+            for name, value in (('file_ids', file_id), ('sheet_ids', sheet_id), ('rows', row),
+                                ('columns', column), ('codes', code)):
+                if len(getattr(self, name)) == length:
+                    self._append(name, value)
+        self.keys.append(key)
+
+    def extend(self, other):
+        """Append every location of another LocationStore, re-interning its files, sheets and formats"""
+        if not len(other):
+            return
+        file_map = np.array([self.intern_file(path) for path in other.files], dtype=np.int64)
+        sheet_map = np.array([self.intern_sheet(sheet) for sheet in other.sheets], dtype=np.int64)
+        overflow_map = np.array([self._intern(value, self.overflow, self._overflow_ids) for value in other.overflow]
+                                or [0], dtype=np.int64)
+        kind_map = np.array([self._intern(kind, self.kinds, self._kind_ids) for kind in other.kinds], dtype=np.int64)
+
+        keys = other._column('keys').astype(np.int64)
+        codes = other._column('codes').astype(np.int64)
+        is_overflow = np.array([shape is None for _, shape in other.kinds], dtype=bool)[codes]
+        keys[is_overflow] = overflow_map[keys[is_overflow]]
+        for name, values in (('file_ids', file_map[other._column('file_ids')]),
+                             ('sheet_ids', sheet_map[other._column('sheet_ids')]),
+                             ('rows', other._column('rows')),
+                             ('columns', other._column('columns')),
+                             ('codes', kind_map[codes])):
+            column = getattr(self, name)
+            typecode = column.typecode
+            top = int(values.max())
+            while top >= 1 << (8 * array(typecode).itemsize):
+                typecode = _WIDER_TYPECODES[typecode]
+            if typecode != column.typecode:
+                column = array(typecode, column)
+                setattr(self, name, column)
+            column.frombytes(values.astype(typecode).tobytes())
+        self.keys.frombytes(keys.astype('q').tobytes())
+
+    def truncate(self, length):
+        """Drop every location added after the first length ones (e.g. from a failed file)"""
+        for name in ('keys', 'file_ids', 'sheet_ids', 'rows', 'columns', 'codes'):
+            del getattr(self, name)[length:]
+
+    def barcode(self, code, key):
+        shape = self.kinds[code][1]
+        return self.overflow[key] if shape is None else unpack_barcode(shape, key)
+
+    def location(self, index):
+        """Return (file_path, sheet_name, row, column) for one location"""
+        return (
+            self.files[self.file_ids[index]],
+            self.sheets[self.sheet_ids[index]],
+            self.rows[index],
+            self.columns[index]
+        )
+
+    def nbytes(self):
+        """Bytes held by the per-location columns (interned tables excluded)"""
+        return sum(
+            column.itemsize * len(column)
+            for column in (self.keys, self.file_ids, self.sheet_ids, self.rows, self.columns, self.codes)
+        )
+
+    def format_counts(self):
+        counts = {}
+        for code, count in enumerate(np.bincount(self._column('codes'), minlength=len(self.kinds))):
+            barcode_type = self.kinds[code][0]
+            counts[barcode_type] = counts.get(barcode_type, 0) + int(count)
+        return counts
+
+    def _column(self, name):
+        column = getattr(self, name)
+        return np.frombuffer(column, dtype=column.typecode) if len(column) else np.zeros(0, dtype=column.typecode)
+
+    def _runs(self, start=0, stop=None):
+        """
+        Sort locations start:stop by (code, key) and return (order, run starts,
+        run lengths). order holds absolute location indices.
+        """
+        keys = self._column('keys')[start:stop]
+        codes = self._column('codes')[start:stop]
+        relative_order = np.lexsort((keys, codes))  # Stable, so each run keeps file order
+        sorted_keys = keys[relative_order]
+        sorted_codes = codes[relative_order]
+        order = relative_order + start
+        changed = np.empty(len(order), dtype=bool)
+        changed[:1] = True
+        changed[1:] = (sorted_keys[1:] != sorted_keys[:-1]) | (sorted_codes[1:] != sorted_codes[:-1])
+        starts = np.flatnonzero(changed)
+        lengths = np.diff(np.append(starts, len(order)))
+        return order, starts, lengths
+
+    def unique_count(self):
+        if not len(self):
+            return 0
+        return len(self._runs()[1])
+
+    def duplicate_groups(self, start=0, stop=None):
+        """
+        Return [(barcode, barcode_type, location_indices), ...] for every
+        barcode stored more than once within locations start:stop, ordered by barcode.
+        """
+        if not len(self.keys[start:stop]):
+            return []
+        order, starts, lengths = self._runs(start, stop)
+        groups = []
+        for start, length in zip(starts[lengths > 1], lengths[lengths > 1]):
+            indices = order[start:start + length]
+            first = indices[0]
+            code = self.codes[first]
+            groups.append((self.barcode(code, self.keys[first]), self.kinds[code][0], indices.tolist()))
+        groups.sort(key=lambda group: group[0])
+        return groups
+
+
+class ReferenceIndex:
+    """
+    Sorted packed-key index over the reference locations of a LocationStore
+    (the first `length` entries). Built once, then probed in vectorised
+    batches with searchsorted, one slice of keys per (format, shape) code.
+    """
+
+    def __init__(self, store, length=None):
+        length = len(store) if length is None else length
+        self.store = store
+        if length:
+            order, starts, lengths = store._runs(0, length)
+            first = order[starts]
+            self.codes = store._column('codes')[first]
+            self.keys = store._column('keys')[first]
+            self.first_locations = first
+            self.counts = lengths
+        else:
+            self.codes = np.zeros(0, dtype=np.uint8)
+            self.keys = np.zeros(0, dtype=np.int64)
+            self.first_locations = np.zeros(0, dtype=np.int64)
+            self.counts = np.zeros(0, dtype=np.int64)
+
+        # Entries are sorted by code first, so each code owns one contiguous slice
+        self.code_slices = {}
+        boundaries = np.flatnonzero(np.diff(self.codes.astype(np.int64))) + 1
+        for lo, hi in zip(np.append(0, boundaries), np.append(boundaries, len(self.codes))):
+            if hi > lo:
+                self.code_slices[int(self.codes[lo])] = (int(lo), int(hi))
+
+    def __len__(self):
+        return len(self.keys)
+
+    def lookup(self, start, stop):
+        """Return the index entry for each store location start:stop, or -1 when absent"""
+        codes = self.store._column('codes')[start:stop]
+        keys = self.store._column('keys')[start:stop]
+        positions = np.full(len(keys), -1, dtype=np.int64)
+        for code in np.unique(codes):
+            if int(code) not in self.code_slices:
+                continue
+            lo, hi = self.code_slices[int(code)]
+            mask = codes == code
+            probe_keys = keys[mask]
+            found = np.searchsorted(self.keys[lo:hi], probe_keys)
+            found = np.minimum(found, hi - lo - 1)
+            hit = self.keys[lo:hi][found] == probe_keys
+            positions[mask] = np.where(hit, found + lo, -1)
+        return positions
+
+
+class DuplicateTracker:
+    """
+    Incremental duplicate detection over a growing LocationStore, so results
+    can be shown while a scan is still running. Per format it keeps the keys
+    seen so far as a sorted array with the file of their first sighting;
+    update() takes in the locations added since the last call and returns the
+    groups that appeared or grew.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.position = 0
+        self._keys = {}  # code -> sorted keys seen so far
+        self._first_files = {}  # code -> file id of each key's first sighting
+        self.groups = {}  # (code, key) -> (barcode, barcode_type, [file_id, ...] one per location)
+
+    def __len__(self):
+        return len(self.groups)
+
+    def update(self):
+        """Return [(barcode, barcode_type, file_ids), ...] for groups changed by the new locations"""
+        start, stop = self.position, len(self.store)
+        self.position = stop
+        if start == stop:
+            return []
+        codes = self.store._column('codes')[start:stop]
+        keys = self.store._column('keys')[start:stop]
+        file_ids = self.store._column('file_ids')[start:stop]
+
+        changed = []
+        for code in np.unique(codes).tolist():
+            mask = codes == code
+            order = np.argsort(keys[mask], kind='stable')  # Keeps each run in location order
+            run_keys = keys[mask][order]
+            run_files = file_ids[mask][order]
+            unique_keys, starts, counts = np.unique(run_keys, return_index=True, return_counts=True)
+
+            seen = self._keys.get(code, np.zeros(0, dtype=np.int64))
+            first_files = self._first_files.get(code, np.zeros(0, dtype=np.int64))
+            positions = np.searchsorted(seen, unique_keys)
+            found = np.zeros(len(unique_keys), dtype=bool)
+            inside = positions < len(seen)
+            found[inside] = seen[positions[inside]] == unique_keys[inside]
+
+            hits = np.flatnonzero(found | (counts > 1))
+            if len(hits):
+                barcode_type = self.store.kinds[code][0]
+                files = run_files.tolist()
+                if len(seen):
+                    prior_files = first_files[np.minimum(positions[hits], len(seen) - 1)].tolist()
+                else:
+                    prior_files = [0] * len(hits)
+                for key, run_start, count, was_seen, prior in zip(
+                        unique_keys[hits].tolist(), starts[hits].tolist(), counts[hits].tolist(),
+                        found[hits].tolist(), prior_files):
+                    new_files = files[run_start:run_start + count]
+                    group = self.groups.get((code, key))
+                    if group is not None:
+                        group[2].extend(new_files)
+                    else:
+                        group = self.groups[(code, key)] = (
+                            self.store.barcode(code, key), barcode_type, ([prior] if was_seen else []) + new_files
+                        )
+                    changed.append(group)
+
+            fresh = ~found
+            self._keys[code] = np.insert(seen, positions[fresh], unique_keys[fresh])
+            self._first_files[code] = np.insert(first_files, positions[fresh], run_files[starts[fresh]])
+
+        return changed
+
+
+def scan_files(store, file_sheets, matcher, loader=None, progress=None, logger=None, stop=None):
+    """
+    Scan (file_path, sheet_name) pairs into a LocationStore and return one
+    File_Summary entry per file. Failed files are recorded and skipped;
+    setting the `stop` event ends the scan between files.
+    """
+    logger = logger or logging.getLogger(__name__)
+    loader = loader or ReadAheadLoader(logger=logger)
+    sheet_by_file = dict(file_sheets)
+    file_summary = []
+    for file_path, source, read_error in loader.iter_files(list(sheet_by_file)):
+        if stop is not None and stop.is_set():
+            break
+        if progress is not None:
+            progress.begin_file(file_path)
+        try:
+            if read_error:
+                raise read_error
+            count = scan_file_into_store(store, source, file_path, sheet_by_file[file_path], matcher, progress)
+            status = 'Processed successfully'
+        except Exception as e:
+            logger.warning(f"Skipping {file_path} due to error: {str(e)}")
+            count = 0
+            status = f'Failed: {str(e)}'
+        finally:
+            if progress is not None:
+                progress.end_file()
+        file_summary.append({
+            'FILE_NAME': source_name(file_path),
+            'BARCODE_COUNT': count,
+            'PATH': file_path,
+            'STATUS': status
+        })
+    return file_summary
+
+
+# Errors worth another attempt: the file or its share was briefly unavailable
+_TRANSIENT_ERRNOS = {errno.EAGAIN, errno.EBUSY, errno.EINTR, errno.EIO, errno.ETIMEDOUT, errno.ECONNRESET,
+                     errno.ECONNABORTED, errno.ENETUNREACH, errno.EHOSTUNREACH, errno.ESTALE}
+# Windows: sharing/lock violation (open in Excel), network path or name gone, semaphore timeout
+_TRANSIENT_WINERRORS = {32, 33, 53, 59, 64, 121}
+
+
+def is_transient_io_error(error):
+    """True for I/O errors that may clear on their own (locked file, dropped share); parse errors never are"""
+    if not isinstance(error, OSError):
+        return False
+    if getattr(error, 'winerror', None) in _TRANSIENT_WINERRORS:
+        return True
+    if isinstance(error, (FileNotFoundError, PermissionError, IsADirectoryError, NotADirectoryError)):
+        return False
+    return isinstance(error, (TimeoutError, ConnectionError)) or error.errno in _TRANSIENT_ERRNOS
+
+
+class _WorkerProgress:
+    """
+    Progress counters of the file a worker process is scanning. The readers
+    assign them as usual; a thread sends ('progress', rows, rows total,
+    barcodes) to the parent every `interval` seconds while they change.
+    """
+
+    def __init__(self, connection, lock, interval=0.5):
+        self.connection = connection
+        self.lock = lock  # Shared with the worker loop's own sends
+        self.interval = interval
+        self.file_rows = 0
+        self.file_rows_total = None
+        self.file_barcodes = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        sent = None
+        while not self._stop.wait(self.interval):
+            state = (self.file_rows, self.file_rows_total, self.file_barcodes)
+            if state != sent:
+                with self.lock:
+                    self.connection.send(('progress',) + state)
+                sent = state
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._stop.set()
+        self._thread.join()
+
+
+def _isolated_scan_worker(connection, matcher, loader=None, progress_interval=0.5):
+    """
+    Worker process loop: scan each (file_path, sheet_name) received and send
+    back its LocationStore. Files are fetched with `loader`'s one large read,
+    and row progress is reported while the file is parsed.
+    """
+    loader = loader or ReadAheadLoader(max_workers=1)
+    lock = threading.Lock()
+    while True:
+        try:
+            task = connection.recv()
+        except (EOFError, OSError):
+            return
+        if task is None:
+            return
+        file_path, sheet_name = task
+        store = LocationStore()
+        source = file_path
+        with _WorkerProgress(connection, lock, progress_interval) as progress:
+            try:
+                source = loader.read(file_path)
+                scan_file_into_store(store, source, file_path, sheet_name, matcher, progress)
+                reply = ('done', store)
+            except Exception as e:
+                reply = ('error', str(e), is_transient_io_error(e))
+            finally:
+                if source is not file_path:
+                    source.close()
+        with lock:
+            connection.send(reply)
+
+
+class _ScanWorker:
+    """One worker process of an IsolatedScanner and the file it is working on"""
+
+    def __init__(self, matcher, loader=None):
+        import multiprocessing
+        self.connection, child_connection = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(
+            target=_isolated_scan_worker, args=(child_connection, matcher, loader), daemon=True
+        )
+        self.process.start()
+        child_connection.close()
+        self.task = None
+        self.started = None
+        self.monitor = None
+        self.progress = None  # (rows, rows total, barcodes) of the current task, once reported
+
+    def assign(self, task):
+        index, file_path, sheet_name, attempt = task
+        self.task = task
+        self.started = time.monotonic()
+        self.progress = None
+        self.connection.send((file_path, sheet_name))
+
+    def poll(self, ready, timeout, memory_limit):
+        """
+        Outcome of the current task after a connection wait(): the worker's
+        ('done', store) or ('error', message, transient) reply, ('failed', reason)
+        when the worker died or overran a limit and has to be replaced, or None
+        while it is still working. Progress reports update self.progress.
+        """
+        if self.connection in ready:
+            try:
+                while self.connection.poll():
+                    message = self.connection.recv()
+                    if message[0] != 'progress':
+                        self.task = None
+                        return message
+                    self.progress = message[1:]
+            except (EOFError, OSError):
+                self.process.join(1)
+                return ('failed', f'Worker process exited unexpectedly (exit code {self.process.exitcode})')
+        if time.monotonic() - self.started > timeout:
+            return ('failed', f'Timed out after {timeout:g}s (worker killed)')
+        if memory_limit and self.rss() > memory_limit:
+            return ('failed', f'Exceeded memory limit of {memory_limit / 1024 ** 2:.0f} MB (worker killed)')
+        return None
+
+    def rss(self):
+        try:
+            if self.monitor is None:
+                self.monitor = psutil.Process(self.process.pid)
+            return self.monitor.memory_info().rss
+        except psutil.Error:
+            return 0
+
+    def stop(self, kill=False):
+        if not kill:
+            try:
+                self.connection.send(None)
+                self.process.join(1)
+            except (OSError, ValueError):
+                pass
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join(5)
+        self.connection.close()
+
+
+class IsolatedScanner:
+    """
+    Scan files in worker processes so one pathological workbook cannot stall or
+    exhaust a run. Each file gets a wall-clock limit and a memory limit; a worker
+    that overruns either is killed, the file is recorded as failed with the reason
+    and a fresh worker takes over while the other files keep flowing. Only
+    transient I/O errors are retried. Results are merged in input order, so the
+    report does not depend on which worker finished first. Workers fetch each
+    file with `loader`'s single large read and report their row progress.
+    """
+
+    def __init__(self, matcher, workers=2, timeout=300, memory_limit=None, retries=2, retry_delay=1.0,
+                 poll_interval=0.2, loader=None, logger=None):
+        self.matcher = matcher
+        self.workers = max(1, workers)
+        self.timeout = timeout
+        self.memory_limit = memory_limit
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.poll_interval = poll_interval
+        self.loader = loader
+        self.logger = logger or logging.getLogger(__name__)
+
+    def scan(self, store, file_sheets, progress=None, stop=None, on_file=None):
+        """
+        Scan (file_path, sheet_name) pairs into `store` and return one File_Summary
+        entry per file. on_file(file_path) is called after each file is merged.
+        """
+        from multiprocessing.connection import wait
+
+        file_sheets = list(file_sheets)
+        pending = deque((index, file_path, sheet_name, 1) for index, (file_path, sheet_name) in enumerate(file_sheets))
+        retry_at = []  # (time, task) of transient failures waiting for another attempt
+        finished = {}  # index -> (LocationStore or None, status)
+        file_summary = []
+        workers = [_ScanWorker(self.matcher, self.loader) for _ in range(min(self.workers, len(file_sheets)))]
+        try:
+            while len(file_summary) < len(file_sheets):
+                if stop is not None and stop.is_set():
+                    break
+                now = time.monotonic()
+                for due in [item for item in retry_at if item[0] <= now]:
+                    retry_at.remove(due)
+                    pending.appendleft(due[1])
+                for worker in workers:
+                    if worker.task is None and pending:
+                        worker.assign(pending.popleft())
+
+                busy = [worker for worker in workers if worker.task is not None]
+                if busy:
+                    ready = wait([worker.connection for worker in busy], timeout=self.poll_interval)
+                else:
+                    ready = []
+                    time.sleep(self.poll_interval)
+                for position, worker in enumerate(workers):
+                    if worker.task is None:
+                        continue
+                    index, file_path, sheet_name, attempt = worker.task
+                    outcome = worker.poll(ready, self.timeout, self.memory_limit)
+                    if outcome is None:
+                        if progress is not None and worker.progress is not None:
+                            progress.update_file(file_path, *worker.progress)
+                        continue
+                    if outcome[0] == 'done':
+                        finished[index] = (outcome[1], 'Processed successfully')
+                    elif outcome[0] == 'error' and outcome[2] and attempt <= self.retries:
+                        self.logger.warning(f"Transient error reading {file_path} (attempt {attempt}), "
+                                            f"retrying: {outcome[1]}")
+                        retry_at.append((time.monotonic() + self.retry_delay * 2 ** (attempt - 1),
+                                         (index, file_path, sheet_name, attempt + 1)))
+                    else:
+                        finished[index] = (None, f'Failed: {outcome[1]}')
+                    if outcome[0] == 'failed':
+                        worker.stop(kill=True)
+                        workers[position] = _ScanWorker(self.matcher, self.loader)
+
+                while len(file_summary) in finished:
+                    index = len(file_summary)
+                    file_store, status = finished.pop(index)
+                    file_path = file_sheets[index][0]
+                    count = len(file_store) if file_store is not None else 0
+                    if progress is not None:
+                        progress.finish_file(file_path, count)
+                    if file_store is not None:
+                        store.extend(file_store)
+                    else:
+                        self.logger.warning(f"Skipping {file_path} due to error: {status[len('Failed: '):]}")
+                    file_summary.append({
+                        'FILE_NAME': source_name(file_path),
+                        'BARCODE_COUNT': count,
+                        'PATH': os.path.abspath(file_path),
+                        'STATUS': status
+                    })
+                    if on_file is not None:
+                        on_file(file_path)
+        finally:
+            for worker in workers:
+                worker.stop(kill=stop is not None and stop.is_set())
+        return file_summary
+
+
+JOB_PRIORITIES = {'High': 0, 'Normal': 1, 'Low': 2}
+
+
+class CheckJob:
+    """
+    One duplicate check handed to a JobScheduler. Lower priority numbers run
+    first. state moves from queued to running to merging (all files read) and
+    then done, failed or cancelled; once done, store and file_summary hold the result and report the files
+    written for it (when output is set). on_update(job) is called from the
+    scheduler whenever the job changes. A job given a `store` is merged into it
+    file by file, in input order, as the files arrive: progress gets each
+    file's rows while it is read and on_file(file_path) is called after each
+    merge, as with IsolatedScanner.scan.
+    """
+
+    def __init__(self, name, file_sheets, priority=0, output=None, sink=None, on_update=None,
+                 store=None, progress=None, on_file=None):
+        self.job_id = None
+        self.name = name
+        self.file_sheets = list(file_sheets)
+        self.priority = priority
+        self.output = output
+        self.sink = sink
+        self.on_update = on_update
+        self.state = 'queued'
+        self.files_done = 0
+        self.store = None
+        self.file_summary = None
+        self.duplicates = None
+        self.report = []
+        self.error = None
+        self.submitted = time.time()
+        self.finished = None
+        self.progress = progress
+        self.on_file = on_file
+        self.streaming = store is not None
+        self._store = store if store is not None else LocationStore()
+        self._summary = []  # File_Summary of the files merged so far
+        self._results = {}  # position in file_sheets -> (LocationStore or None, status)
+        self._merge_lock = threading.Lock()
+        self._cancel = threading.Event()
+        self._finished = threading.Event()
+
+    @property
+    def percent(self):
+        return 100 * self.files_done / len(self.file_sheets) if self.file_sheets else 100
+
+    @property
+    def active(self):
+        return self.state in ('queued', 'running')
+
+    def cancel(self):
+        self._cancel.set()
+
+    def wait(self, timeout=None):
+        """Block until the job is done, failed or cancelled; returns False on timeout"""
+        return self._finished.wait(timeout)
+
+
+class JobScheduler:
+    """
+    Run several duplicate checks at once on one bounded pool of scan worker
+    processes. Each file of each job is an extraction task; the next task is
+    taken from the job with the best (priority, number of files), so a quick
+    single-file check does not wait behind an archive scan of equal priority.
+    A file queued by several jobs is extracted once and its locations are
+    handed to each of them. Jobs merge their files in their own order, so a
+    job's report does not depend on what else was running. Workers have the
+    IsolatedScanner time and memory limits and read files through `loader`.
+    At most `max_inflight_bytes` of workbooks are worked on at once (None: no
+    limit), though one file always may; a MemoryGovernor can throttle both
+    this and the number of workers.
+    """
+
+    def __init__(self, matcher, workers=2, timeout=300, memory_limit=None, retries=2, retry_delay=1.0,
+                 poll_interval=0.2, loader=None, max_inflight_bytes=None, logger=None):
+        self.matcher = matcher
+        self.workers = max(1, workers)
+        self.max_inflight_bytes = max_inflight_bytes
+        self.timeout = timeout
+        self.memory_limit = memory_limit
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.poll_interval = poll_interval
+        self.loader = loader
+        self.logger = logger or logging.getLogger(__name__)
+        self.jobs = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._tasks = {}  # (path, sheet, size, mtime) -> {'subscribers': [(job, position)], 'attempt', 'worker'}
+        self._queue = []  # Heap of (priority, job size, sequence, key); stale entries are skipped
+        self._retry_at = []  # (time, key)
+        self._sequence = itertools.count()
+        self._closed = False
+        self._limits = None  # (workers, max_inflight_bytes) before any MemoryGovernor throttling
+        self._finisher = ThreadPoolExecutor(max_workers=1)  # Merges finished jobs and writes their reports
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    @staticmethod
+    def _task_key(file_path, sheet_name):
+        path = os.path.abspath(file_path)
+        try:
+            stat = source_stat(path)
+            return (path, sheet_name, stat.st_size, stat.st_mtime_ns)
+        except OSError:
+            return (path, sheet_name, None, None)  # The worker reports the error
+
+    def submit(self, job):
+        """Queue a CheckJob and return it"""
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("The scheduler has been shut down")
+            job.job_id = len(self.jobs) + 1
+            self.jobs.append(job)
+            rank = (job.priority, len(job.file_sheets))
+            for position, (file_path, sheet_name) in enumerate(job.file_sheets):
+                key = self._task_key(file_path, sheet_name)
+                task = self._tasks.get(key)
+                if task is None:
+                    task = self._tasks[key] = {'subscribers': [], 'attempt': 1, 'worker': None, 'rank': rank}
+                    heapq.heappush(self._queue, rank + (next(self._sequence), key))
+                elif rank < task['rank'] and task['worker'] is None:
+                    # Shared with a more urgent job: move it up (the old heap entry goes stale)
+                    task['rank'] = rank
+                    heapq.heappush(self._queue, rank + (next(self._sequence), key))
+                task['subscribers'].append((job, position))
+        self.logger.info(f"Queued job {job.job_id} '{job.name}': {len(job.file_sheets)} file(s), priority {job.priority}")
+        if not job.file_sheets:
+            job.state = 'merging'
+            self._finisher.submit(self._complete, job)
+        self._wakeup.set()
+        return job
+
+    def cancel(self, job):
+        job.cancel()
+        self._wakeup.set()
+
+    def throttle(self, level):
+        """
+        MemoryGovernor hook: halve the number of workers and the bytes of
+        workbooks in flight `level` times; returns what changed. Without a
+        limit of its own the in-flight budget starts from every worker
+        holding a file of the loader's full per-file read-ahead size.
+        """
+        mb = 1024 * 1024
+        with self._lock:
+            if self._limits is None:
+                self._limits = (self.workers, self.max_inflight_bytes)
+            workers, inflight_bytes = self._limits
+            before = (self.workers, self.max_inflight_bytes)
+            self.workers = max(1, workers >> level)
+            if level == 0:
+                self.max_inflight_bytes = inflight_bytes
+            else:
+                base = inflight_bytes or workers * (self.loader or ReadAheadLoader()).max_file_bytes
+                self.max_inflight_bytes = max(min(base, MemoryGovernor.MIN_INFLIGHT_BYTES), base >> level)
+        self._wakeup.set()
+        budgets = [f"{limit // mb} MB" if limit is not None else "unlimited"
+                   for limit in (before[1], self.max_inflight_bytes)]
+        return f"scan workers {before[0]} -> {self.workers}, workbooks in flight {budgets[0]} -> {budgets[1]}"
+
+    def shutdown(self, cancel=False, wait=True):
+        """Stop taking jobs; with cancel, stop the running ones too. Waits for the queue to drain"""
+        with self._lock:
+            self._closed = True
+            if cancel:
+                for job in self.jobs:
+                    job.cancel()
+        self._wakeup.set()
+        if wait:
+            self._thread.join()
+            self._finisher.shutdown(wait=True)
+
+    def _notify(self, job):
+        if job.state in ('done', 'failed', 'cancelled'):
+            job._finished.set()
+        if job.on_update is not None:
+            try:
+                job.on_update(job)
+            except Exception as e:
+                self.logger.warning(f"Job {job.job_id} update callback failed: {str(e)}")
+
+    def _next_task(self):
+        """Pop the most urgent task still waiting for a worker (called with the lock held)"""
+        now = time.monotonic()
+        for due in [item for item in self._retry_at if item[0] <= now]:
+            self._retry_at.remove(due)
+            task = self._tasks.get(due[1])
+            if task is not None:
+                heapq.heappush(self._queue, task['rank'] + (next(self._sequence), due[1]))
+        while self._queue:
+            priority, size, _, key = heapq.heappop(self._queue)
+            task = self._tasks.get(key)
+            if task is None or task['worker'] is not None or (priority, size) != task['rank']:
+                continue
+            if any(item[1] == key for item in self._retry_at):
+                continue
+            return key, task
+        return None, None
+
+    def _drop_cancelled(self, workers):
+        """Unsubscribe cancelled jobs; kill workers whose file no job needs any more (lock held)"""
+        cancelled = [job for job in self.jobs if job.active and job._cancel.is_set()]
+        for job in cancelled:
+            job.state = 'cancelled'
+            job.finished = time.time()
+            job._results.clear()
+            self.logger.info(f"Cancelled job {job.job_id} '{job.name}'")
+        if not cancelled:
+            return cancelled
+        for key in list(self._tasks):
+            task = self._tasks[key]
+            task['subscribers'] = [(job, position) for job, position in task['subscribers'] if job.active]
+            if task['subscribers']:
+                continue
+            del self._tasks[key]
+            worker = task['worker']
+            if worker is not None:
+                worker.stop(kill=True)
+                workers[workers.index(worker)] = _ScanWorker(self.matcher, self.loader)
+        return cancelled
+
+    def _finish_task(self, key, file_store, status):
+        """Hand one extracted file to every job waiting for it (lock held); returns the jobs now complete"""
+        task = self._tasks.pop(key)
+        completed = []
+        for job, position in task['subscribers']:
+            if not job.active:
+                continue
+            job._results[position] = (file_store, status)
+            job.files_done += 1  # Streaming jobs pop merged files from _results
+            job.state = 'running'
+            if job.files_done == len(job.file_sheets):
+                job.state = 'merging'
+                completed.append(job)
+        return task['subscribers'], completed
+
+    def _run(self):
+        from multiprocessing.connection import wait
+
+        workers = []
+        try:
+            while True:
+                with self._lock:
+                    cancelled = self._drop_cancelled(workers)
+                    if self._closed and not self._tasks:
+                        break
+                    while len(workers) < self.workers and len(workers) < len(self._tasks):
+                        workers.append(_ScanWorker(self.matcher, self.loader))
+                    # Retire idle workers beyond a throttled limit; busy ones finish their file first
+                    for worker in [worker for worker in workers if worker.task is None][:max(0, len(workers) - self.workers)]:
+                        worker.stop()
+                        workers.remove(worker)
+                    running = [worker.task[0][2] or 0 for worker in workers if worker.task is not None]
+                    inflight_bytes = sum(running)
+                    started = []
+                    for worker in workers:
+                        if worker.task is not None:
+                            continue
+                        if len(running) >= self.workers:
+                            break
+                        key, task = self._next_task()
+                        if key is None:
+                            break
+                        if (running and self.max_inflight_bytes is not None
+                                and inflight_bytes + (key[2] or 0) > self.max_inflight_bytes):
+                            # Wait for a running file to finish and free its memory
+                            heapq.heappush(self._queue, task['rank'] + (next(self._sequence), key))
+                            break
+                        running.append(key[2] or 0)
+                        inflight_bytes += key[2] or 0
+                        task['worker'] = worker
+                        worker.assign((key, key[0], key[1], task['attempt']))
+                        started.extend(job for job, _ in task['subscribers'] if job.state == 'queued')
+                    for job in started:
+                        job.state = 'running'
+                for job in cancelled + started:
+                    self._notify(job)
+
+                busy = [worker for worker in workers if worker.task is not None]
+                if not busy:
+                    self._wakeup.wait(self.poll_interval)
+                    self._wakeup.clear()
+                    continue
+                ready = wait([worker.connection for worker in busy], timeout=self.poll_interval)
+
+                for position, worker in enumerate(workers):
+                    if worker.task is None:
+                        continue
+                    key, file_path, sheet_name, attempt = worker.task
+                    outcome = worker.poll(ready, self.timeout, self.memory_limit)
+                    if outcome is None:
+                        if worker.progress is not None:
+                            with self._lock:
+                                task = self._tasks.get(key)
+                                watching = [job for job, _ in task['subscribers'] if job.progress is not None] if task else []
+                            for job in watching:
+                                job.progress.update_file(file_path, *worker.progress)
+                        continue
+                    if outcome[0] == 'failed':
+                        worker.stop(kill=True)
+                        workers[position] = _ScanWorker(self.matcher, self.loader)
+                    with self._lock:
+                        task = self._tasks.get(key)
+                        if task is None:
+                            continue  # Every job that wanted it was cancelled
+                        task['worker'] = None
+                        if outcome[0] == 'error' and outcome[2] and attempt <= self.retries:
+                            self.logger.warning(f"Transient error reading {file_path} (attempt {attempt}), "
+                                                f"retrying: {outcome[1]}")
+                            task['attempt'] = attempt + 1
+                            self._retry_at.append((time.monotonic() + self.retry_delay * 2 ** (attempt - 1), key))
+                            continue
+                        if outcome[0] == 'done':
+                            subscribers, completed = self._finish_task(key, outcome[1], 'Processed successfully')
+                        else:
+                            self.logger.warning(f"Skipping {file_path} due to error: {outcome[1]}")
+                            subscribers, completed = self._finish_task(key, None, f'Failed: {outcome[1]}')
+                    for job in dict.fromkeys(job for job, _ in subscribers):
+                        if job.streaming:
+                            self._merge(job)
+                    for job in completed:
+                        self._finisher.submit(self._complete, job)
+                    for job in dict.fromkeys(job for job, _ in subscribers):
+                        self._notify(job)
+        except Exception as e:
+            self.logger.error(f"Job scheduler stopped: {str(e)}")
+            with self._lock:
+                for job in self.jobs:
+                    if job.active or job.state == 'merging':
+                        job.state, job.error = 'failed', str(e)
+            for job in self.jobs:
+                self._notify(job)
+        finally:
+            for worker in workers:
+                worker.stop(kill=True)
+
+    def _merge(self, job):
+        """Merge the job's extracted files into its store in its own order, as far as they have arrived"""
+        with job._merge_lock:
+            while len(job._summary) in job._results:
+                position = len(job._summary)
+                file_path = job.file_sheets[position][0]
+                file_store, status = job._results.pop(position)
+                count = len(file_store) if file_store is not None else 0
+                if job.progress is not None:
+                    job.progress.finish_file(file_path, count)
+                if file_store is not None:
+                    job._store.extend(file_store)
+                job._summary.append({
+                    'FILE_NAME': source_name(file_path),
+                    'BARCODE_COUNT': count,
+                    'PATH': os.path.abspath(file_path),
+                    'STATUS': status
+                })
+                if job.on_file is not None:
+                    try:
+                        job.on_file(file_path)
+                    except Exception as e:
+                        self.logger.warning(f"Job {job.job_id} file callback failed: {str(e)}")
+
+    def _complete(self, job):
+        """Merge the rest of the job's files and write its report (finisher thread)"""
+        try:
+            self._merge(job)
+            store, file_summary = job._store, job._summary
+            groups = store.duplicate_groups()
+            if job.output and groups:
+                failed = sum(1 for entry in file_summary if not entry['STATUS'].startswith('Processed'))
+                report = build_duplicate_report(store, file_summary, failed, self.matcher, groups)
+                job.report = (job.sink or XlsxReportSink()).write(report, job.output)
+            job.store, job.file_summary, job.duplicates = store, file_summary, len(groups)
+            job.state = 'done' if not job._cancel.is_set() else 'cancelled'
+            self.logger.info(f"Job {job.job_id} '{job.name}' finished: {len(groups)} duplicate barcodes "
+                             f"in {time.time() - job.submitted:.1f}s")
+        except Exception as e:
+            job.state, job.error = 'failed', str(e)
+            self.logger.error(f"Job {job.job_id} '{job.name}' failed: {str(e)}")
+        job.finished = time.time()
+        self._notify(job)
+
+
+def reconcile_files(reference_sheets, probe_sheets, matcher, loader=None, progress=None, logger=None):
+    """
+    Check shipped (probe) files against an allocation (reference) set.
+    The reference files are scanned once into a ReferenceIndex, then every
+    probe file is looked up against it as soon as it has been read.
+    """
+    logger = logger or logging.getLogger(__name__)
+    loader = loader or ReadAheadLoader(logger=logger)
+    store = LocationStore()
+    file_summary = []
+    errors = []
+    if progress is not None:
+        progress.set_files([f for f, _ in reference_sheets] + [f for f, _ in probe_sheets])
+
+    def scan(file_sheets, role, on_file=None):
+        sheet_by_file = dict(file_sheets)
+        for file_path, source, read_error in loader.iter_files([f for f, _ in file_sheets]):
+            file_name = source_name(file_path)
+            if progress is not None:
+                progress.begin_file(file_path)
+            file_start = len(store)
+            try:
+                if read_error:
+                    raise read_error
+                count = scan_file_into_store(store, source, file_path, sheet_by_file[file_path], matcher, progress)
+                status = 'Processed successfully'
+            except Exception as e:
+                logger.error(f"Error processing {file_path}: {str(e)}")
+                errors.append(f"Error processing {file_name}: {str(e)}")
+                count = 0
+                status = f'Failed: {str(e)}'
+            finally:
+                if progress is not None:
+                    progress.end_file()
+            file_summary.append({
+                'ROLE': role,
+                'FILE_NAME': file_name,
+                'BARCODE_COUNT': count,
+                'PATH': os.path.abspath(file_path),
+                'STATUS': status
+            })
+            if on_file and count:
+                on_file(file_start, len(store))
+
+    scan(reference_sheets, 'REFERENCE')
+    reference_length = len(store)
+    index = ReferenceIndex(store, reference_length)
+    logger.info(f"Reference index built: {len(index)} distinct barcodes from {reference_length} locations")
+
+    shipped = np.zeros(len(index), dtype=np.int64)
+    unallocated = []
+
+    def probe(start, stop):
+        positions = index.lookup(start, stop)
+        found = positions[positions >= 0]
+        np.add.at(shipped, found, 1)
+        unallocated.extend((np.flatnonzero(positions < 0) + start).tolist())
+
+    scan(probe_sheets, 'PROBE', on_file=probe)
+
+    return {
+        'store': store,
+        'index': index,
+        'reference_length': reference_length,
+        'shipped': shipped,
+        'unallocated': unallocated,
+        'double_shipped': store.duplicate_groups(reference_length),
+        'family_of': matcher.family_of,
+        'file_summary': file_summary,
+        'errors': errors
+    }
+
+
+def save_reconciliation_report(result, output_filename, sink=None):
+    """
+    Write unallocated, double-shipped and never-shipped serials to separate
+    tables through `sink` (default: xlsx, where tables too long for one sheet
+    continue on further sheets); returns the summary metrics.
+    """
+    store = result['store']
+    index = result['index']
+
+    def location_row(location_index):
+        file_path, sheet_name, row, column = store.location(location_index)
+        code = store.codes[location_index]
+        barcode_type = store.kinds[code][0]
+        return [
+            store.barcode(code, store.keys[location_index]),
+            result['family_of'].get(barcode_type, ""),
+            barcode_type,
+            source_name(file_path),
+            sheet_name or "",
+            row,
+            column
+        ]
+
+    location_headers = ['BARCODE', 'FAMILY', 'FORMAT', 'FILE_NAME', 'SHEET', 'ROW', 'COLUMN']
+    unallocated_rows = sorted((location_row(i) for i in result['unallocated']), key=lambda row: row[0])
+    double_rows = [[barcode, len(indices)] + [source_name(store.location(i)[0]) for i in indices]
+                   for barcode, barcode_type, indices in result['double_shipped']]
+    never_positions = np.flatnonzero(result['shipped'] == 0)
+    never_rows = sorted((location_row(int(index.first_locations[i])) for i in never_positions),
+                        key=lambda row: row[0])
+
+    file_summary = result['file_summary']
+    summary = {
+        'Reference Files': sum(1 for entry in file_summary if entry['ROLE'] == 'REFERENCE'),
+        'Probe Files': sum(1 for entry in file_summary if entry['ROLE'] == 'PROBE'),
+        'Failed Files': len(result['errors']),
+        'Allocated Barcodes (distinct)': len(index),
+        'Shipped Barcodes (locations)': len(store) - result['reference_length'],
+        'Unallocated Shipments': len(unallocated_rows),
+        'Double-Shipped Barcodes': len(double_rows),
+        'Never-Shipped Barcodes': len(never_rows)
+    }
+
+    (sink or XlsxReportSink()).write_sheets([
+        ReportSheet('Summary', ['Metric', 'Value'], [list(item) for item in summary.items()]),
+        ReportSheet('Unallocated', location_headers, unallocated_rows),
+        ReportSheet('Double_Shipped', ['BARCODE', 'COPIES'], double_rows, wide=True),
+        ReportSheet('Never_Shipped', location_headers, never_rows),
+        ReportSheet('File_Summary', *dict_rows(file_summary))
+    ], output_filename)
+    return summary
+
+
+def partial_from_store(store):
+    """
+    Reduce a LocationStore to a mergeable partial barcode set: the packed key,
+    format code and file/sheet/row/column postings of every location, sorted
+    by (shape, key) so partials from any number of workers or shard files can
+    be k-way merged. Barcodes too long to pack are ordered by their text.
+    """
+    shapes = sorted({shape or '' for _, shape in store.kinds})
+    shape_rank = np.array([shapes.index(shape or '') for _, shape in store.kinds] or [0], dtype=np.int64)
+    codes = store._column('codes').astype(np.int64)
+    keys = store._column('keys').astype(np.int64)
+    postings = {name: store._column(name).astype(np.int64) for name in ('file_ids', 'sheet_ids', 'rows', 'columns')}
+
+    sort_keys = keys.copy()
+    if store.overflow:
+        overflow_rank = np.empty(len(store.overflow), dtype=np.int64)
+        overflow_rank[sorted(range(len(store.overflow)), key=store.overflow.__getitem__)] = np.arange(len(store.overflow))
+        is_overflow = np.array([shape is None for _, shape in store.kinds], dtype=bool)[codes]
+        sort_keys[is_overflow] = overflow_rank[keys[is_overflow]]
+    order = np.lexsort((sort_keys, shape_rank[codes]))  # Stable, so each barcode keeps file order
+    partial = {
+        'files': list(store.files),
+        'sheets': list(store.sheets),
+        'kinds': list(store.kinds),
+        'overflow': list(store.overflow),
+        'codes': codes[order],
+        'keys': keys[order]
+    }
+    for name, column in postings.items():
+        partial[name] = column[order]
+    return partial
+
+
+def encode_partial(partial):
+    """JSON-safe form of a partial barcode set for the wire: keys, codes and file ids only"""
+    encoded = {name: partial[name] for name in ('files', 'kinds', 'overflow')}
+    for name in ('codes', 'keys', 'file_ids'):
+        column = partial[name]
+        encoded[name] = {
+            'dtype': column.dtype.str,
+            'data': base64.b64encode(zlib.compress(column.tobytes())).decode('ascii')
+        }
+    return encoded
+
+
+def decode_partial(encoded):
+    partial = {
+        'files': list(encoded['files']),
+        'kinds': [tuple(kind) for kind in encoded['kinds']],
+        'overflow': list(encoded['overflow'])
+    }
+    for name in ('codes', 'keys', 'file_ids'):
+        column = encoded[name]
+        partial[name] = np.frombuffer(zlib.decompress(base64.b64decode(column['data'])), dtype=column['dtype'])
+    return partial
+
+
+def _partial_runs(partial, partial_id):
+    """Yield (shape, key, partial_id, start, length) for each distinct barcode of one partial"""
+    codes = partial['codes']
+    keys = partial['keys']
+    if not len(keys):
+        return
+    shapes = [shape or '' for _, shape in partial['kinds']]
+    shape_ids = np.array([sorted(set(shapes)).index(shape) for shape in shapes], dtype=np.int64)[codes]
+    changed = np.empty(len(keys), dtype=bool)
+    changed[:1] = True
+    changed[1:] = (keys[1:] != keys[:-1]) | (shape_ids[1:] != shape_ids[:-1])
+    starts = np.flatnonzero(changed)
+    lengths = np.diff(np.append(starts, len(keys)))
+    overflow = partial['overflow']
+    for start, length in zip(starts.tolist(), lengths.tolist()):
+        shape = partial['kinds'][codes[start]][1]
+        key = int(keys[start])
+        if shape is None:
+            yield '', overflow[key], partial_id, start, length
+        else:
+            yield shape, key, partial_id, start, length
+
+
+def merge_partials(partials):
+    """
+    k-way merge partial barcode sets into duplicate groups. Returns a dict with
+    groups [(barcode, barcode_type, [file_path, ...]), ...] ordered by barcode,
+    plus total, unique and per-format counts.
+    """
+    groups = []
+    unique = 0
+    merged = heapq.merge(*(_partial_runs(partial, partial_id) for partial_id, partial in enumerate(partials)))
+    for (shape, key), runs in itertools.groupby(merged, key=lambda run: (run[0], run[1])):
+        unique += 1
+        runs = list(runs)
+        if len(runs) == 1 and runs[0][4] == 1:
+            continue
+        first = partials[runs[0][2]]
+        barcode_type = first['kinds'][first['codes'][runs[0][3]]][0]
+        files = []
+        for _, _, partial_id, start, length in runs:
+            partial = partials[partial_id]
+            files.extend(partial['files'][file_id] for file_id in partial['file_ids'][start:start + length].tolist())
+        groups.append((unpack_barcode(shape, key) if shape else key, barcode_type, files))
+    groups.sort(key=lambda group: group[0])
+
+    format_counts = {}
+    for partial in partials:
+        for code, count in enumerate(np.bincount(partial['codes'], minlength=len(partial['kinds'])).tolist()):
+            barcode_type = partial['kinds'][code][0]
+            format_counts[barcode_type] = format_counts.get(barcode_type, 0) + count
+    return {
+        'groups': groups,
+        'total': sum(len(partial['keys']) for partial in partials),
+        'unique': unique,
+        'format_counts': format_counts
+    }
+
+
+class _ShardRequestHandler:
+    """
+    JSON-over-HTTP front end of a ShardCoordinator, mixed into
+    BaseHTTPRequestHandler when the server starts (http.server is slow to import)
+    """
+
+    routes = {'/lease': 'handle_lease', '/heartbeat': 'handle_heartbeat', '/result': 'handle_result'}
+
+    def do_POST(self):
+        coordinator = self.server.coordinator
+        handler = self.routes.get(self.path)
+        if handler is None:
+            self.send_error(404)
+            return
+        if coordinator.token and not hmac.compare_digest(self.headers.get('X-Shard-Token', ''), coordinator.token):
+            self.send_error(403)
+            return
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+            response = getattr(coordinator, handler)(request)
+        except Exception as e:
+            coordinator.logger.error(f"Bad {self.path} request from {self.client_address[0]}: {str(e)}")
+            self.send_error(400, str(e))
+            return
+        body = json.dumps(response).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # The coordinator logs leases and results itself
+
+
+def is_loopback_host(host):
+    """True if a bind address only accepts connections from this machine"""
+    if host == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False  # Any other host name may resolve to a reachable interface
+
+
+class ShardCoordinator:
+    """
+    Hand out shards of files to scan workers over HTTP and k-way merge their
+    partial barcode sets. A worker leases a shard, sends heartbeats while it
+    scans and posts the partial result. A shard whose lease expires (worker
+    crashed) or whose worker asks for a new lease (worker restarted) goes back
+    to the queue; after max_attempts it is reported as failed. It listens on
+    loopback only unless a token is set.
+    """
+
+    def __init__(self, file_sheets, shard_size=20, host='127.0.0.1', port=8765, token=None,
+                 lease_timeout=120.0, max_attempts=3, logger=None):
+        if not token and not is_loopback_host(host):
+            raise ValueError(f"Refusing to hand out shards on {host} without a token: "
+                             f"set --token, or listen on 127.0.0.1 only")
+        self.shards = [file_sheets[i:i + shard_size] for i in range(0, len(file_sheets), max(1, shard_size))]
+        self.host = host
+        self.port = port
+        self.token = token
+        self.lease_timeout = lease_timeout
+        self.max_attempts = max_attempts
+        self.logger = logger or logging.getLogger(__name__)
+        self.poll_interval = min(2.0, lease_timeout / 4)  # Tells idle workers how long to wait
+
+        self.queue = deque(range(len(self.shards)))
+        self.leases = {}  # shard id -> (worker, lease expiry)
+        self.attempts = [0] * len(self.shards)
+        self.results = {}  # shard id -> (worker, partial, file_summary)
+        self.failed = {}  # shard id -> reason
+        self.progress = None
+        self.server = None
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        if not self.shards:
+            self._done.set()
+
+    @property
+    def url(self):
+        host = 'localhost' if self.host in ('', '0.0.0.0') else self.host
+        return f"http://{host}:{self.port}"
+
+    def _check_done(self):
+        if len(self.results) + len(self.failed) == len(self.shards):
+            self._done.set()
+
+    def _requeue(self, shard_id, reason):
+        if self.attempts[shard_id] >= self.max_attempts:
+            self.failed[shard_id] = f"{reason} ({self.attempts[shard_id]} attempts)"
+            self.logger.error(f"Shard {shard_id} failed: {self.failed[shard_id]}")
+            self._check_done()
+        else:
+            self.queue.appendleft(shard_id)
+            self.logger.warning(f"Shard {shard_id} reassigned: {reason}")
+
+    def _expire_leases(self):
+        now = time.monotonic()
+        for shard_id, (worker, expiry) in list(self.leases.items()):
+            if expiry < now:
+                del self.leases[shard_id]
+                self._requeue(shard_id, f"lease of {worker} expired")
+
+    # Request handlers, called from the HTTP server threads
+
+    def handle_lease(self, request):
+        worker = request['worker']
+        with self._lock:
+            self._expire_leases()
+            # Workers scan one shard at a time, so an earlier lease means the worker restarted
+            for shard_id, (holder, _) in list(self.leases.items()):
+                if holder == worker:
+                    del self.leases[shard_id]
+                    self._requeue(shard_id, f"{worker} restarted")
+            if self._done.is_set():
+                return {'done': True}
+            if not self.queue:
+                return {'wait': self.poll_interval}
+            shard_id = self.queue.popleft()
+            self.attempts[shard_id] += 1
+            self.leases[shard_id] = (worker, time.monotonic() + self.lease_timeout)
+        self.logger.info(f"Shard {shard_id} ({len(self.shards[shard_id])} files) leased to {worker}")
+        return {
+            'shard': shard_id,
+            'files': [[file_path, sheet_name] for file_path, sheet_name in self.shards[shard_id]],
+            'heartbeat': self.lease_timeout / 4
+        }
+
+    def handle_heartbeat(self, request):
+        shard_id = request['shard']
+        with self._lock:
+            lease = self.leases.get(shard_id)
+            if lease is None or lease[0] != request['worker']:
+                return {'ok': False}  # Reassigned; the worker should abandon the shard
+            self.leases[shard_id] = (lease[0], time.monotonic() + self.lease_timeout)
+        return {'ok': True}
+
+    def handle_result(self, request):
+        shard_id = request['shard']
+        worker = request['worker']
+        partial = decode_partial(request['partial'])
+        with self._lock:
+            if shard_id in self.results or shard_id in self.failed:
+                return {'ok': True}  # A late copy from a worker whose lease had expired
+            self.results[shard_id] = (worker, partial, request['file_summary'])
+            self.leases.pop(shard_id, None)
+            if shard_id in self.queue:
+                self.queue.remove(shard_id)
+            if self.progress is not None:
+                for entry in request['file_summary']:
+                    self.progress.begin_file(entry['PATH'])
+                    self.progress.file_barcodes = entry['BARCODE_COUNT']
+                    self.progress.end_file()
+            self._check_done()
+        self.logger.info(f"Shard {shard_id} done by {worker}: {len(partial['keys'])} barcodes")
+        return {'ok': True}
+
+    # Coordinator side
+
+    def run(self, progress=None):
+        """Serve shards until every one has a result or has failed, then merge"""
+        self.progress = progress
+        if progress is not None:
+            progress.set_files([file_path for shard in self.shards for file_path, _ in shard])
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        handler = type('ShardRequestHandler', (_ShardRequestHandler, BaseHTTPRequestHandler), {})
+        self.server = ThreadingHTTPServer((self.host, self.port), handler)
+        self.server.coordinator = self
+        self.port = self.server.server_address[1]
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.logger.info(f"Coordinator serving {len(self.shards)} shard(s) on {self.url}")
+        try:
+            while not self._done.wait(self.poll_interval):
+                with self._lock:
+                    self._expire_leases()
+            # Stay up long enough for polling workers to hear that the job is finished
+            time.sleep(self.poll_interval * 2)
+        finally:
+            self.server.shutdown()
+            self.server.server_close()
+        return self.merge()
+
+    def merge(self):
+        shard_ids = sorted(self.results)
+        result = merge_partials([self.results[shard_id][1] for shard_id in shard_ids])
+        file_summary = []
+        shard_rows = []
+        errors = []
+        for shard_id, shard in enumerate(self.shards):
+            if shard_id in self.results:
+                worker, _, entries = self.results[shard_id]
+                status = 'Done'
+            else:
+                worker = ''
+                status = f"Failed: {self.failed.get(shard_id, 'not scanned')}"
+                entries = [{
+                    'FILE_NAME': source_name(file_path),
+                    'BARCODE_COUNT': 0,
+                    'PATH': file_path,
+                    'STATUS': status
+                } for file_path, _ in shard]
+            for entry in entries:
+                file_summary.append(dict(entry, SHARD=shard_id, WORKER=worker))
+                if not entry['STATUS'].startswith('Processed'):
+                    errors.append(f"Error processing {entry['FILE_NAME']}: {entry['STATUS']}")
+            shard_rows.append({
+                'SHARD': shard_id,
+                'FILES': len(shard),
+                'WORKER': worker,
+                'ATTEMPTS': self.attempts[shard_id],
+                'STATUS': status
+            })
+        result.update(file_summary=file_summary, shards=shard_rows, errors=errors)
+        return result
+
+
+def _post_json(url, payload, token=None, timeout=60):
+    import urllib.request
+    headers = {'Content-Type': 'application/json'}
+    if token:
+        headers['X-Shard-Token'] = token
+    request = urllib.request.Request(url, data=json.dumps(payload).encode('utf-8'), headers=headers)
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.loads(response.read())
+
+
+def run_shard_worker(coordinator_url, matcher, worker_name=None, token=None, loader=None,
+                     max_idle=60.0, logger=None):
+    """
+    Lease shards from a coordinator until it reports the job done, scan each
+    into a LocationStore and post back its partial barcode set. Gives up when
+    the coordinator has been unreachable for max_idle seconds.
+    Returns the number of shards completed.
+    """
+    logger = logger or logging.getLogger(__name__)
+    loader = loader or ReadAheadLoader(logger=logger)
+    worker = worker_name or f"{socket.gethostname()}-{os.getpid()}"
+    coordinator_url = coordinator_url.rstrip('/')
+    completed = 0
+    unreachable_since = None
+
+    while True:
+        try:
+            lease = _post_json(f"{coordinator_url}/lease", {'worker': worker}, token)
+            unreachable_since = None
+        except OSError as e:  # Includes urllib's URLError
+            if getattr(e, 'code', None) == 403:
+                raise PermissionError("Coordinator rejected the shard token") from e
+            now = time.monotonic()
+            unreachable_since = unreachable_since or now
+            if now - unreachable_since > max_idle:
+                logger.info(f"Coordinator {coordinator_url} unreachable, worker {worker} stopping")
+                return completed
+            time.sleep(2.0)
+            continue
+
+        if lease.get('done'):
+            logger.info(f"Worker {worker} finished after {completed} shard(s)")
+            return completed
+        if 'shard' not in lease:
+            time.sleep(lease.get('wait', 2.0))
+            continue
+
+        shard_id = lease['shard']
+        lost = threading.Event()
+        stop_heartbeat = threading.Event()
+
+        def heartbeat():
+            while not stop_heartbeat.wait(lease['heartbeat']):
+                try:
+                    if not _post_json(f"{coordinator_url}/heartbeat", {'worker': worker, 'shard': shard_id}, token)['ok']:
+                        lost.set()
+                        return
+                except OSError as e:
+                    logger.warning(f"Heartbeat for shard {shard_id} failed: {str(e)}")
+
+        heartbeat_thread = threading.Thread(target=heartbeat, daemon=True)
+        heartbeat_thread.start()
+        try:
+            store = LocationStore()
+            file_summary = scan_files(store, lease['files'], matcher, loader, logger=logger, stop=lost)
+        finally:
+            stop_heartbeat.set()
+            heartbeat_thread.join()
+
+        if lost.is_set():
+            logger.warning(f"Shard {shard_id} was reassigned, abandoning it")
+            continue
+        try:
+            _post_json(f"{coordinator_url}/result", {
+                'worker': worker,
+                'shard': shard_id,
+                'partial': encode_partial(partial_from_store(store)),
+                'file_summary': file_summary
+            }, token)
+            completed += 1
+        except OSError as e:
+            # The lease will expire and the shard goes to another worker
+            logger.error(f"Could not deliver shard {shard_id}: {str(e)}")
+
+
+def save_sharded_report(result, output_filename, sink=None):
+    """Write a merged multi-node scan in the layout of the single-machine duplicate report (xlsx unless a sink is given)"""
+    format_counts = result['format_counts']
+    summary = {
+        'Total Files Processed': len(result['file_summary']),
+        'Successfully Processed Files': sum(
+            1 for entry in result['file_summary'] if entry['STATUS'].startswith('Processed')),
+        'Failed Files': len(result['errors']),
+        'Total Barcodes Found': result['total'],
+        'Unique Barcodes': result['unique'],
+        'Duplicate Barcodes': len(result['groups']),
+        'Shards': len(result['shards']),
+        'Reassigned Shards': sum(1 for shard in result['shards'] if shard.get('ATTEMPTS', 1) > 1)
+    }
+    for barcode_type in sorted(format_counts):
+        summary[f"{barcode_type} Barcodes"] = format_counts[barcode_type]
+
+    report = {
+        'groups': ((barcode, barcode_type, [(file_path, None, None, None) for file_path in files])
+                   for barcode, barcode_type, files in result['groups']),
+        'max_copies': max((len(files) for _, _, files in result['groups']), default=0),
+        'file_summary': sorted(result['file_summary'], key=lambda entry: entry['BARCODE_COUNT'], reverse=True),
+        'summary': summary,
+        'tables': {'Shards': result['shards']}
+    }
+    (sink or XlsxReportSink()).write(report, output_filename)
+    return summary
+
+
+# Shard files hold the output of the extraction stage so it can be merged and
+# checked again without re-reading any workbook. Layout (little-endian):
+#
+#   8 bytes   magic b'ICSHARD1'
+#   4 bytes   manifest length M (uint32)
+#   M bytes   manifest, UTF-8 JSON:
+#               version   format version (1)
+#               created   ISO timestamp
+#               count     number of barcode locations
+#               files     one entry per source file (PATH, FILE_NAME, SHEET, SIZE,
+#                         MTIME, BARCODE_COUNT, STATUS); file ids index this list
+#               sheets    sheet names (null = first sheet); sheet ids index this list
+#               kinds     [format, shape] pairs; codes index this list (shape null
+#                         for barcodes that do not pack into 63 bits)
+#               overflow  unpacked barcodes; their key is an index into this list
+#               columns   [{name, dtype, length}] describing the blocks below
+#   blocks    one per column (codes, keys, file_ids, sheet_ids, rows, columns), each
+#             zlib-compressed: the zigzag-encoded differences between consecutive
+#             values, stored in the narrowest unsigned dtype that holds them
+#   4 bytes   CRC-32 of everything above (uint32)
+#
+# Locations are sorted by (shape, packed key), so key differences are small,
+# and the postings of one barcode stay in file order.
+SHARD_MAGIC = b'ICSHARD1'
+SHARD_VERSION = 1
+SHARD_EXTENSION = '.bcshard'
+_SHARD_COLUMNS = ('codes', 'keys', 'file_ids', 'sheet_ids', 'rows', 'columns')
+
+
+def _encode_column(values):
+    """Delta + zigzag encode an int64 column into the narrowest unsigned dtype, then compress"""
+    deltas = np.diff(values.astype(np.int64), prepend=np.int64(0))
+    zigzag = ((deltas << 1) ^ (deltas >> 63)).view(np.uint64)
+    top = int(zigzag.max()) if len(zigzag) else 0
+    dtype = next(dtype for dtype in ('<u1', '<u2', '<u4', '<u8') if top >> (8 * int(dtype[2:])) == 0)
+    return dtype, zlib.compress(zigzag.astype(dtype).tobytes(), 6)
+
+
+def _decode_column(dtype, data):
+    zigzag = np.frombuffer(zlib.decompress(data), dtype=dtype).astype(np.uint64)
+    deltas = (zigzag >> np.uint64(1)).view(np.int64) ^ -(zigzag & np.uint64(1)).view(np.int64)
+    return np.cumsum(deltas)
+
+
+def _write_column_file(output_path, magic, manifest, columns):
+    """
+    Save a JSON manifest and (name, int64 array) columns as magic + manifest +
+    encoded columns + CRC32. Returns the bytes written.
+    """
+    blocks = []
+    layout = []
+    for name, values in columns:
+        dtype, data = _encode_column(values)
+        layout.append({'name': name, 'dtype': dtype, 'length': len(data)})
+        blocks.append(data)
+    manifest = json.dumps(dict(manifest, columns=layout)).encode('utf-8')
+    body = magic + struct.pack('<I', len(manifest)) + manifest + b''.join(blocks)
+
+    # Write next to the target and rename, so a crash never leaves half a file
+    temp_path = output_path + '.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(body)
+        f.write(struct.pack('<I', zlib.crc32(body)))
+    os.replace(temp_path, output_path)
+    return len(body) + 4
+
+
+def _read_column_file(path, magic, description):
+    """Load a file written by _write_column_file: (manifest, {name: int64 array})"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    if len(data) < 16 or data[:8] != magic:
+        raise ValueError(f"{path} is not a {description}")
+    body, checksum = data[:-4], struct.unpack('<I', data[-4:])[0]
+    if zlib.crc32(body) != checksum:
+        raise ValueError(f"{path} is damaged (checksum mismatch)")
+    manifest_length = struct.unpack('<I', body[8:12])[0]
+    manifest = json.loads(body[12:12 + manifest_length].decode('utf-8'))
+    columns = {}
+    offset = 12 + manifest_length
+    for column in manifest['columns']:
+        columns[column['name']] = _decode_column(column['dtype'], body[offset:offset + column['length']])
+        offset += column['length']
+    return manifest, columns
+
+
+def write_shard(output_path, partial, file_entries):
+    """
+    Save a partial barcode set (see partial_from_store) and the manifest
+    entries of its source files as a shard file. Returns the bytes written.
+    """
+    manifest = {
+        'version': SHARD_VERSION,
+        'created': datetime.datetime.now().isoformat(timespec='seconds'),
+        'count': len(partial['keys']),
+        'files': file_entries,
+        'sheets': partial['sheets'],
+        'kinds': partial['kinds'],
+        'overflow': partial['overflow']
+    }
+    return _write_column_file(output_path, SHARD_MAGIC, manifest,
+                              [(name, partial[name]) for name in _SHARD_COLUMNS])
+
+
+def read_shard(shard_path):
+    """Load a shard file as a partial barcode set with its manifest under 'manifest'"""
+    manifest, columns = _read_column_file(shard_path, SHARD_MAGIC, "barcode shard file")
+    if manifest['version'] > SHARD_VERSION:
+        raise ValueError(f"{shard_path} uses shard format {manifest['version']}, this version reads up to {SHARD_VERSION}")
+
+    partial = {
+        'manifest': manifest,
+        'files': [entry['PATH'] for entry in manifest['files']],
+        'sheets': manifest['sheets'],
+        'kinds': [tuple(kind) for kind in manifest['kinds']],
+        'overflow': manifest['overflow']
+    }
+    partial.update(columns)
+    return partial
+
+
+def collect_shard_files(paths):
+    """Expand files and folders into a sorted list of shard files"""
+    shard_files = set()
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                for file in files:
+                    if file.lower().endswith(SHARD_EXTENSION):
+                        shard_files.add(os.path.abspath(os.path.join(root, file)))
+        elif os.path.isfile(path):
+            shard_files.add(os.path.abspath(path))
+    return sorted(shard_files)
+
+
+def extract_shard(file_sheets, matcher, output_path, loader=None, progress=None, logger=None):
+    """Scan Excel files once and save every barcode location as a shard file"""
+    logger = logger or logging.getLogger(__name__)
+    store = LocationStore()
+    for file_path, _ in file_sheets:
+        store.intern_file(os.path.abspath(file_path))  # File ids follow the manifest order
+    if progress is not None:
+        progress.set_files([file_path for file_path, _ in file_sheets])
+    file_summary = scan_files(store, file_sheets, matcher, loader, progress, logger)
+
+    entry_by_path = {os.path.abspath(entry['PATH']): entry for entry in file_summary}
+    sheet_by_path = {os.path.abspath(file_path): sheet_name for file_path, sheet_name in file_sheets}
+    file_entries = []
+    for file_path in store.files:
+        entry = entry_by_path[file_path]
+        try:
+            stat = source_stat(file_path)
+            size, mtime = stat.st_size, stat.st_mtime
+        except OSError:
+            size, mtime = 0, None
+        file_entries.append({
+            'PATH': file_path,
+            'FILE_NAME': entry['FILE_NAME'],
+            'SHEET': sheet_by_path[file_path],
+            'SIZE': size,
+            'MTIME': mtime,
+            'BARCODE_COUNT': entry['BARCODE_COUNT'],
+            'STATUS': entry['STATUS']
+        })
+    shard_bytes = write_shard(output_path, partial_from_store(store), file_entries)
+    logger.info(f"Shard {output_path} written: {len(store)} barcodes from {len(file_entries)} files, {shard_bytes} bytes")
+    return {
+        'files': len(file_entries),
+        'barcodes': len(store),
+        'source_bytes': sum(entry['SIZE'] for entry in file_entries),
+        'shard_bytes': shard_bytes
+    }
+
+
+def merge_shard_partials(partials):
+    """
+    k-way merge sorted partials (e.g. from read_shard) into one sorted partial.
+    File, sheet, format and overflow ids are remapped into combined tables;
+    the postings of each barcode stay in input order.
+    """
+    files = []
+    sheets, sheet_ids = [], {}
+    kinds, kind_ids = [], {}
+    overflow, overflow_ids = [], {}
+    remaps = []
+    for partial in partials:
+        file_offset = len(files)
+        files.extend(partial['files'])
+        remaps.append((
+            file_offset,
+            np.array([LocationStore._intern(sheet, sheets, sheet_ids) for sheet in partial['sheets']] or [0], dtype=np.int64),
+            np.array([LocationStore._intern(tuple(kind), kinds, kind_ids) for kind in partial['kinds']] or [0], dtype=np.int64),
+            np.array([LocationStore._intern(value, overflow, overflow_ids) for value in partial['overflow']] or [0], dtype=np.int64)
+        ))
+
+    # Merge run by run; the heap only ever holds one run per input
+    run_partials, run_starts, run_lengths = [], [], []
+    for _, _, partial_id, start, length in heapq.merge(
+            *(_partial_runs(partial, partial_id) for partial_id, partial in enumerate(partials))):
+        run_partials.append(partial_id)
+        run_starts.append(start)
+        run_lengths.append(length)
+    run_partials = np.array(run_partials, dtype=np.int64)
+    run_starts = np.array(run_starts, dtype=np.int64)
+    run_lengths = np.array(run_lengths, dtype=np.int64)
+    output_starts = np.cumsum(run_lengths) - run_lengths
+
+    total = int(run_lengths.sum())
+    merged = {name: np.zeros(total, dtype=np.int64) for name in _SHARD_COLUMNS}
+    is_overflow_kind = np.array([shape is None for _, shape in kinds] or [False], dtype=bool)
+    for partial_id, partial in enumerate(partials):
+        if not len(partial['keys']):
+            continue
+        # Runs of one input come out in its own order, so each location moves by its run's offset
+        mask = run_partials == partial_id
+        destination = (np.repeat(output_starts[mask] - run_starts[mask], run_lengths[mask])
+                       + np.arange(len(partial['keys'])))
+        file_offset, sheet_map, kind_map, overflow_map = remaps[partial_id]
+        codes = kind_map[partial['codes']]
+        keys = partial['keys'].copy()
+        overflow_rows = is_overflow_kind[codes]
+        keys[overflow_rows] = overflow_map[keys[overflow_rows]]
+        merged['codes'][destination] = codes
+        merged['keys'][destination] = keys
+        merged['file_ids'][destination] = partial['file_ids'] + file_offset
+        merged['sheet_ids'][destination] = sheet_map[partial['sheet_ids']]
+        merged['rows'][destination] = partial['rows']
+        merged['columns'][destination] = partial['columns']
+    merged.update(files=files, sheets=sheets, kinds=kinds, overflow=overflow)
+    return merged
+
+
+def merge_shard_files(shard_paths, output_path, logger=None):
+    """Combine several shard files into one; a source file may appear in only one input"""
+    logger = logger or logging.getLogger(__name__)
+    partials = [read_shard(shard_path) for shard_path in shard_paths]
+    file_entries = []
+    owner = {}
+    for shard_path, partial in zip(shard_paths, partials):
+        for entry in partial['manifest']['files']:
+            if entry['PATH'] in owner:
+                raise ValueError(f"{entry['PATH']} is in both {owner[entry['PATH']]} and {shard_path}")
+            owner[entry['PATH']] = shard_path
+            file_entries.append(entry)
+    merged = merge_shard_partials(partials)
+    shard_bytes = write_shard(output_path, merged, file_entries)
+    logger.info(f"Merged {len(shard_paths)} shards into {output_path}: {len(merged['keys'])} barcodes")
+    return {'files': len(file_entries), 'barcodes': len(merged['keys']), 'shard_bytes': shard_bytes}
+
+
+def find_duplicates_in_shards(shard_paths):
+    """Duplicate detection straight from shard files, in the form save_sharded_report expects"""
+    partials = [read_shard(shard_path) for shard_path in shard_paths]
+    result = merge_partials(partials)
+    file_summary = []
+    shard_rows = []
+    for shard_path, partial in zip(shard_paths, partials):
+        manifest = partial['manifest']
+        for entry in manifest['files']:
+            file_summary.append({
+                'FILE_NAME': entry['FILE_NAME'],
+                'BARCODE_COUNT': entry['BARCODE_COUNT'],
+                'PATH': entry['PATH'],
+                'STATUS': entry['STATUS'],
+                'SHARD': os.path.basename(shard_path)
+            })
+        shard_rows.append({
+            'SHARD': os.path.basename(shard_path),
+            'FILES': len(manifest['files']),
+            'BARCODES': manifest['count'],
+            'CREATED': manifest['created'],
+            'PATH': shard_path
+        })
+    errors = [f"Error processing {entry['FILE_NAME']}: {entry['STATUS']}"
+              for entry in file_summary if not entry['STATUS'].startswith('Processed')]
+    result.update(file_summary=file_summary, shards=shard_rows, errors=errors)
+    return result
+
+
+def format_shard_info(shard_path):
+    """Plain-text summary of one shard file's manifest"""
+    partial = read_shard(shard_path)
+    manifest = partial['manifest']
+    source_bytes = sum(entry['SIZE'] for entry in manifest['files'])
+    shard_bytes = os.path.getsize(shard_path)
+    lines = [
+        f"{shard_path}",
+        f"  created {manifest['created']}, format version {manifest['version']}",
+        f"  {manifest['count']} barcode locations from {len(manifest['files'])} files",
+        f"  {shard_bytes} bytes ({shard_bytes / source_bytes:.1%} of {source_bytes} source bytes)"
+        if source_bytes else f"  {shard_bytes} bytes"
+    ]
+    for entry in manifest['files']:
+        lines.append(f"    {entry['FILE_NAME']}: {entry['BARCODE_COUNT']} barcodes ({entry['STATUS']})")
+    return "\n".join(lines)
+
+
+# Run fingerprints record the duplicate groups of a run so the next run can
+# report only what changed. A group is identified by its kind (format, shape)
+# and packed key, as in the LocationStore, so no barcode text is stored except
+# for the rare barcodes that do not pack. Its signature is the sum of the path
+# hashes of the files holding its copies, so it changes when copies are added,
+# removed or moved to other files, but not when rows shift inside a file.
+# The baseline is kept per folder, so a run that picks up a newly added file
+# is compared with the previous run over the same folder.
+FINGERPRINT_MAGIC = b'ICRUNFP1'
+FINGERPRINT_VERSION = 2  # 2: scanned file paths
+FINGERPRINT_EXTENSION = '.icfp'
+_FINGERPRINT_COLUMNS = ('codes', 'keys', 'copies', 'signatures')
+
+
+def _stable_hash(text):
+    """Signed 64-bit hash of a string that is the same in every process (unlike hash())"""
+    return int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest(), 'little', signed=True)
+
+
+def _normalised_path(path):
+    return os.path.normcase(os.path.abspath(path))
+
+
+def baseline_key(paths):
+    """
+    Short stable key of the folders a run was selected from: folders as
+    given, files (and bundles) by the folder holding them. Files added to or
+    removed from those folders keep the same key.
+    """
+    folders = set()
+    for path in paths:
+        path = split_archive_path(path)[0]
+        folders.add(_normalised_path(path if os.path.isdir(path) else os.path.dirname(path)))
+    return hashlib.blake2b('\n'.join(sorted(folders)).encode('utf-8'), digest_size=8).hexdigest()
+
+
+def default_fingerprint_path(baseline):
+    """Where the baseline fingerprint of a baseline_key is kept: one file per set of folders in the report folder"""
+    return os.path.join(get_report_folder(), f"last_run_{baseline}{FINGERPRINT_EXTENSION}")
+
+
+def run_fingerprint(store, baseline=None, paths=None):
+    """
+    Fingerprint the duplicate groups of a LocationStore, sorted by (kind, key):
+    per group its kind, packed key, number of copies and file signature.
+    'baseline' is the baseline_key of the scanned folders and 'paths' the
+    files scanned, so a delta can list the files added or removed since.
+    'order' and 'starts' (not saved) locate each group's copies in the store.
+    """
+    order, starts, lengths = store._runs() if len(store) else (np.zeros(0, dtype=np.int64),) * 3
+    file_hashes = np.array([_stable_hash(os.path.normcase(path)) for path in store.files] or [0], dtype=np.int64)
+    location_hashes = file_hashes[store._column('file_ids')[order]]
+    signatures = np.add.reduceat(location_hashes, starts) if len(starts) else np.zeros(0, dtype=np.int64)
+
+    duplicated = lengths > 1
+    first = order[starts[duplicated]]
+    codes = store._column('codes')[first].astype(np.int64)
+    keys = store._column('keys')[first].astype(np.int64)
+    overflow = []
+    for i in np.flatnonzero([store.kinds[code][1] is None for code in codes.tolist()]).tolist():
+        overflow.append(store.overflow[keys[i]])
+        keys[i] = len(overflow) - 1
+    return {
+        'created': datetime.datetime.now().isoformat(timespec='seconds'),
+        'files': len(store.files),
+        'baseline': baseline,
+        'paths': [_normalised_path(path) for path in paths] if paths is not None else None,
+        'kinds': list(store.kinds),
+        'overflow': overflow,
+        'codes': codes,
+        'keys': keys,
+        'copies': lengths[duplicated].astype(np.int64),
+        'signatures': signatures[duplicated],
+        'order': order,
+        'starts': starts[duplicated]
+    }
+
+
+def save_fingerprint(output_path, fingerprint):
+    """Save a run fingerprint; returns the bytes written"""
+    manifest = {
+        'version': FINGERPRINT_VERSION,
+        'created': fingerprint['created'],
+        'files': fingerprint['files'],
+        'baseline': fingerprint.get('baseline'),
+        'paths': fingerprint.get('paths'),
+        'count': len(fingerprint['keys']),
+        'kinds': fingerprint['kinds'],
+        'overflow': fingerprint['overflow']
+    }
+    return _write_column_file(output_path, FINGERPRINT_MAGIC, manifest,
+                              [(name, fingerprint[name]) for name in _FINGERPRINT_COLUMNS])
+
+
+def load_fingerprint(path):
+    """Load a saved run fingerprint"""
+    manifest, columns = _read_column_file(path, FINGERPRINT_MAGIC, "run fingerprint file")
+    if manifest['version'] > FINGERPRINT_VERSION:
+        raise ValueError(f"{path} uses fingerprint format {manifest['version']}, "
+                         f"this version reads up to {FINGERPRINT_VERSION}")
+    fingerprint = {
+        'created': manifest['created'],
+        'files': manifest['files'],
+        'baseline': manifest.get('baseline'),
+        'paths': manifest.get('paths'),  # None before version 2
+        'kinds': [tuple(kind) for kind in manifest['kinds']],
+        'overflow': manifest['overflow']
+    }
+    fingerprint.update(columns)
+    return fingerprint
+
+
+def fingerprint_barcode(fingerprint, index):
+    """Barcode text of one fingerprint group"""
+    shape = fingerprint['kinds'][int(fingerprint['codes'][index])][1]
+    key = int(fingerprint['keys'][index])
+    return fingerprint['overflow'][key] if shape is None else unpack_barcode(shape, key)
+
+
+def diff_fingerprints(previous, current):
+    """
+    Compare two run fingerprints. Returns index arrays 'new' (into current),
+    'resolved' (into previous) and 'changed' ((previous, current) pairs whose
+    copies or files differ), plus the 'unchanged' count and the file paths
+    'added' and 'removed' since the previous run (empty if it did not record
+    them). Groups are compared by barcode whatever files each run scanned.
+    Both runs are sorted by (kind, key), so each previous kind's keys are
+    binary-searched in the current run's block of the same kind: O(p log c)
+    over all groups, with only the differences materialised later.
+    """
+    previous_paths = set(previous.get('paths') or ())
+    current_paths = set(current.get('paths') or ())
+    if previous.get('paths') is None or current.get('paths') is None:
+        previous_paths = current_paths = set()
+
+    # Express the previous overflow keys in the current run's overflow indices
+    previous_keys = previous['keys'].copy()
+    overflow_ids = {text: index for index, text in enumerate(current['overflow'])}
+    overflow_kinds = np.array([kind[1] is None for kind in previous['kinds']] or [False], dtype=bool)
+    for i in np.flatnonzero(overflow_kinds[previous['codes']]).tolist():
+        text = previous['overflow'][previous_keys[i]]
+        previous_keys[i] = overflow_ids.get(text, -1)  # Unmatched: no current key is negative
+
+    # Keys are only compared within one kind; kinds missing from the current run match nothing
+    kind_codes = {tuple(kind): code for code, kind in enumerate(current['kinds'])}
+    previous_blocks = np.flatnonzero(np.diff(previous['codes'], prepend=-1, append=-1))
+    previous_parts, current_parts = [], []
+    for lo, hi in zip(previous_blocks[:-1].tolist(), previous_blocks[1:].tolist()):
+        code = kind_codes.get(tuple(previous['kinds'][int(previous['codes'][lo])]))
+        if code is None:
+            continue
+        start, stop = np.searchsorted(current['codes'], [code, code + 1])
+        block = current['keys'][start:stop]
+        keys = previous_keys[lo:hi]
+        positions = np.minimum(np.searchsorted(block, keys), max(len(block) - 1, 0))
+        found = (block[positions] == keys) if len(block) else np.zeros(len(keys), dtype=bool)
+        previous_parts.append(np.flatnonzero(found) + lo)
+        current_parts.append(positions[found] + start)
+    previous_matched = np.concatenate(previous_parts).astype(np.int64) if previous_parts else np.zeros(0, dtype=np.int64)
+    current_matched = np.concatenate(current_parts).astype(np.int64) if current_parts else np.zeros(0, dtype=np.int64)
+
+    differs = ((previous['copies'][previous_matched] != current['copies'][current_matched]) |
+               (previous['signatures'][previous_matched] != current['signatures'][current_matched]))
+    new = np.ones(len(current['keys']), dtype=bool)
+    new[current_matched] = False
+    resolved = np.ones(len(previous_keys), dtype=bool)
+    resolved[previous_matched] = False
+    return {
+        'new': np.flatnonzero(new),
+        'resolved': np.flatnonzero(resolved),
+        'changed': np.column_stack([previous_matched[differs], current_matched[differs]]),
+        'unchanged': int(len(previous_matched) - differs.sum()),
+        'added': sorted(current_paths - previous_paths),
+        'removed': sorted(previous_paths - current_paths)
+    }
+
+
+def save_delta_report(delta, previous, current, store, output_filename, sink=None):
+    """
+    Write the groups that are new, changed or resolved since the previous run
+    through `sink` (default: xlsx). Only these groups are expanded to file
+    names; returns the summary metrics.
+    """
+    file_names = [source_name(path) for path in store.files]
+    file_ids = store._column('file_ids')
+
+    def current_files(index):
+        start = current['starts'][index]
+        locations = current['order'][start:start + current['copies'][index]]
+        return [file_names[file_id] for file_id in file_ids[locations].tolist()]
+
+    def kind_name(fingerprint, index):
+        return fingerprint['kinds'][int(fingerprint['codes'][index])][0]
+
+    new_rows = [[fingerprint_barcode(current, i), kind_name(current, i), int(current['copies'][i])] + current_files(i)
+                for i in delta['new'].tolist()]
+    changed_rows = [[fingerprint_barcode(current, i), kind_name(current, i), int(previous['copies'][p]),
+                     int(current['copies'][i])] + current_files(i)
+                    for p, i in delta['changed'].tolist()]
+    resolved_rows = [[fingerprint_barcode(previous, p), kind_name(previous, p), int(previous['copies'][p])]
+                     for p in delta['resolved'].tolist()]
+
+    summary = {
+        'Previous Run': previous['created'],
+        'Current Run': current['created'],
+        'Duplicate Barcodes Before': len(previous['keys']),
+        'Duplicate Barcodes Now': len(current['keys']),
+        'New Duplicates': len(new_rows),
+        'Changed Duplicates': len(changed_rows),
+        'Resolved Duplicates': len(resolved_rows),
+        'Unchanged Duplicates': delta['unchanged'],
+        'Files Added': len(delta['added']),
+        'Files Removed': len(delta['removed'])
+    }
+    file_changes = ([[source_name(path), path, 'Added'] for path in delta['added']] +
+                    [[source_name(path), path, 'Removed'] for path in delta['removed']])
+    (sink or XlsxReportSink()).write_sheets([
+        ReportSheet('New_Duplicates', ["DUPLICATE_BARCODES", "FORMAT", "COPIES"], new_rows, wide=True),
+        ReportSheet('Changed', ["DUPLICATE_BARCODES", "FORMAT", "PREVIOUS_COPIES", "COPIES"], changed_rows, wide=True),
+        ReportSheet('Resolved', ["DUPLICATE_BARCODES", "FORMAT", "PREVIOUS_COPIES"], resolved_rows),
+        ReportSheet('Summary', ['Metric', 'Value'], [list(item) for item in summary.items()]),
+        ReportSheet('File_Changes', ["FILE_NAME", "PATH", "CHANGE"], file_changes)
+    ], output_filename)
+    return summary
+
+
+# Report sinks write one duplicate report in a given file format. A report is a dict:
+#
+#   groups        iterable of (barcode, barcode_type, locations), read once; each
+#                 location is (file_path, sheet_name, row, column), where sheet, row
+#                 and column may be None (e.g. results merged from shards)
+#   max_copies    largest number of locations in any group
+#   file_summary  rows for the File_Summary table, in report order
+#   summary       {metric: value} for the Summary table
+#   tables        {name: rows} for any further tables (Run_Metrics, Shards)
+#
+# Reports made of several tables (reconciliation, delta) go through
+# write_sheets instead, as a list of ReportSheet: rows are lists in column
+# order; in a `wide` sheet each row is followed by any number of file names,
+# headed FILE_NAME1, FILE_NAME2, ...
+#
+# Every sink returns the list of files it wrote.
+EXCEL_MAX_ROWS = 1048576
+EXCEL_MAX_COLUMNS = 16384
+LONG_REPORT_COLUMNS = ('BARCODE', 'FORMAT', 'FILE_PATH', 'SHEET', 'ROW', 'COLUMN')
+ReportSheet = namedtuple('ReportSheet', 'name columns rows wide', defaults=(False,))
+
+
+def _sheet_columns(table, max_columns=None):
+    """(headers, fixed column count, file name columns) of a ReportSheet"""
+    columns = list(table.columns)
+    fixed = len(columns)
+    if not table.wide:
+        return columns, fixed, 0
+    width = max((len(row) - fixed for row in table.rows), default=0)
+    if max_columns is not None:
+        width = max(1, min(width, max_columns - fixed))
+    return columns + [f"FILE_NAME{i + 1}" for i in range(width)], fixed, width
+
+
+def dict_rows(rows):
+    """(columns, row lists) of a list of dicts, for a ReportSheet"""
+    columns = _table_columns(rows)
+    return columns, [[row.get(column) for column in columns] for row in rows]
+
+
+def iter_store_groups(store, groups):
+    """Report groups for LocationStore.duplicate_groups(), resolving each location as it is written"""
+    for barcode, barcode_type, indices in groups:
+        yield barcode, barcode_type, [store.location(index) for index in indices]
+
+
+def build_duplicate_report(store, file_summary, failed_files, matcher, groups=None, tables=None):
+    """Report dict for the duplicates of one scan (groups: store.duplicate_groups(), computed if not given)"""
+    if groups is None:
+        groups = store.duplicate_groups()
+    # One row per format of every barcode family that was found
+    format_counts = store.format_counts()
+    found_families = {matcher.family_of[barcode_type] for barcode_type in format_counts}
+    summary = {
+        'Total Files Processed': len(file_summary),
+        'Successfully Processed Files': sum(1 for entry in file_summary if entry['STATUS'].startswith('Processed')),
+        'Failed Files': failed_files,
+        'Total ICON Barcodes Found': len(store),
+        'Unique Barcodes': store.unique_count(),
+        'Duplicate Barcodes': len(groups)
+    }
+    for barcode_type in matcher.formats:
+        if matcher.family_of[barcode_type] in found_families:
+            summary[f"{barcode_type} Barcodes ({matcher.family_of[barcode_type]})"] = format_counts.get(barcode_type, 0)
+    return {
+        'groups': iter_store_groups(store, groups),
+        'max_copies': max((len(indices) for _, _, indices in groups), default=0),
+        'file_summary': sorted(file_summary, key=lambda entry: entry['BARCODE_COUNT'], reverse=True),
+        'summary': summary,
+        'tables': tables or {}
+    }
+
+
+def report_tables(report):
+    """(name, rows) for every table of a report besides the duplicates themselves"""
+    yield 'File_Summary', report['file_summary']
+    yield 'Summary', [{'Metric': metric, 'Value': value} for metric, value in report['summary'].items()]
+    yield from report.get('tables', {}).items()
+
+
+def _table_columns(rows):
+    columns = {}
+    for row in rows:
+        columns.update(dict.fromkeys(row))
+    return list(columns)
+
+
+class XlsxReportSink:
+    """
+    The wide Excel report (one row per duplicate barcode, one column per copy),
+    streamed through a write-only workbook. When a sheet reaches Excel's row
+    limit the report continues on Detailed_Report_2, _3, ...; with rows_per_file
+    set it also continues in numbered files (name_part2.xlsx, ...), and the other
+    tables go in the first file. Barcodes with more copies than fit in a row wrap
+    onto continuation rows.
+    """
+
+    def __init__(self, max_rows=EXCEL_MAX_ROWS, max_columns=EXCEL_MAX_COLUMNS, rows_per_file=None, hyperlinks=True):
+        self.max_rows = max_rows
+        self.max_columns = max_columns
+        self.rows_per_file = rows_per_file
+        self.hyperlinks = hyperlinks
+
+    def write(self, report, output_filename):
+        from openpyxl import Workbook
+        from openpyxl.cell import WriteOnlyCell
+
+        stem, extension = os.path.splitext(output_filename)
+        width = max(1, min(report['max_copies'], self.max_columns - 2))
+        headers = ["DUPLICATE_BARCODES", "COPIES"] + [f"FILE_NAME{i + 1}" for i in range(width)]
+        link_font = Font(color="0000FF", underline="single")
+        paths = []
+        workbook = sheet = None
+        sheet_rows = file_rows = sheets = 0
+
+        def file_cell(file_path):
+            cell = WriteOnlyCell(sheet, value=source_name(file_path))
+            cell.hyperlink = split_archive_path(file_path)[0]  # Links to a workbook in a bundle open the bundle
+            cell.font = link_font
+            return cell
+
+        def save():
+            if len(paths) == 1:
+                self.write_tables(workbook, report, link_font)
+            workbook.save(paths[-1])
+
+        def next_sheet():
+            nonlocal workbook, sheet, sheet_rows, file_rows, sheets
+            if workbook is None or (self.rows_per_file and file_rows >= self.rows_per_file):
+                if workbook is not None:
+                    save()
+                workbook = Workbook(write_only=True)
+                paths.append(output_filename if not paths else f"{stem}_part{len(paths) + 1}{extension}")
+                file_rows = 0
+            sheets += 1
+            sheet = workbook.create_sheet("Detailed_Report" if sheets == 1 else f"Detailed_Report_{sheets}")
+            sheet.append(headers)
+            sheet_rows = 0
+
+        for barcode, _, locations in report['groups']:
+            for offset in range(0, len(locations), width):
+                if sheet is None or sheet_rows >= self.max_rows - 1 or (
+                        self.rows_per_file and file_rows >= self.rows_per_file):
+                    next_sheet()
+                files = [file_path for file_path, _, _, _ in locations[offset:offset + width]]
+                if self.hyperlinks:
+                    files = [file_cell(file_path) for file_path in files]
+                else:
+                    files = [source_name(file_path) for file_path in files]
+                # Continuation rows of a wrapped barcode leave COPIES empty
+                sheet.append([barcode, len(locations) if offset == 0 else None] + files)
+                sheet_rows += 1
+                file_rows += 1
+        if sheet is None:
+            next_sheet()
+        save()
+        return paths
+
+    def write_sheets(self, tables, output_filename):
+        """
+        Write ReportSheets to one workbook. A table longer than a sheet
+        continues on Name_2, Name_3, ... and, with rows_per_file set, in
+        numbered files; wide rows with more file names than fit wrap onto
+        continuation rows that repeat only the first column.
+        """
+        from openpyxl import Workbook
+        from openpyxl.cell import WriteOnlyCell
+
+        stem, extension = os.path.splitext(output_filename)
+        link_font = Font(color="0000FF", underline="single")
+        paths = []
+        workbook = None
+        file_rows = 0
+
+        def next_file():
+            nonlocal workbook, file_rows
+            if workbook is not None:
+                workbook.save(paths[-1])
+            workbook = Workbook(write_only=True)
+            paths.append(output_filename if not paths else f"{stem}_part{len(paths) + 1}{extension}")
+            file_rows = 0
+
+        for table in tables:
+            columns, fixed, width = _sheet_columns(table, self.max_columns)
+            link = columns.index('PATH') if self.hyperlinks and 'PATH' in columns else None
+            sheet = None
+            sheet_rows = sheets = 0
+            for row in table.rows:
+                if table.wide:
+                    files = row[fixed:]
+                    lines = [(list(row[:fixed]) if offset == 0 else [row[0]] + [None] * (fixed - 1))
+                             + list(files[offset:offset + width]) for offset in range(0, max(len(files), 1), width)]
+                else:
+                    lines = [list(row)]
+                for line in lines:
+                    file_full = self.rows_per_file and file_rows >= self.rows_per_file
+                    if sheet is None or sheet_rows >= self.max_rows - 1 or file_full:
+                        if workbook is None or file_full:
+                            next_file()
+                        sheets += 1
+                        sheet = workbook.create_sheet(table.name if sheets == 1 else f"{table.name}_{sheets}")
+                        sheet.append(columns)
+                        sheet_rows = 0
+                    if link is not None and line[link]:
+                        cell = WriteOnlyCell(sheet, value=line[link])
+                        cell.hyperlink = split_archive_path(line[link])[0]
+                        cell.font = link_font
+                        line[link] = cell
+                    sheet.append(line)
+                    sheet_rows += 1
+                    file_rows += 1
+            if sheet is None:
+                if workbook is None:
+                    next_file()
+                workbook.create_sheet(table.name).append(columns)
+        if workbook is None:
+            next_file()
+            workbook.create_sheet()
+        workbook.save(paths[-1])
+        return paths
+
+    def write_tables(self, workbook, report, link_font):
+        from openpyxl.cell import WriteOnlyCell
+
+        for name, rows in report_tables(report):
+            sheet = workbook.create_sheet(name)
+            columns = _table_columns(rows)
+            sheet.append(columns)
+            for row in rows:
+                values = [row.get(column) for column in columns]
+                if self.hyperlinks and row.get('PATH'):
+                    cell = WriteOnlyCell(sheet, value=row['PATH'])
+                    cell.hyperlink = split_archive_path(row['PATH'])[0]
+                    cell.font = link_font
+                    values[columns.index('PATH')] = cell
+                sheet.append(values)
+
+
+class CsvReportSink:
+    """
+    Long-format CSV: one line per barcode location, written as the groups are
+    produced so memory stays flat however large the report is. The other tables
+    go in sibling files (name_File_Summary.csv, name_Summary.csv, ...).
+    """
+
+    def __init__(self, encoding='utf-8-sig'):
+        self.encoding = encoding  # With a BOM, Excel opens the file as UTF-8
+
+    def write(self, report, output_filename):
+        stem, extension = os.path.splitext(output_filename)
+        with open(output_filename, 'w', newline='', encoding=self.encoding) as handle:
+            writer = csv.writer(handle)
+            writer.writerow(LONG_REPORT_COLUMNS)
+            for barcode, barcode_type, locations in report['groups']:
+                writer.writerows((barcode, barcode_type) + location for location in locations)
+
+        paths = [output_filename]
+        for name, rows in report_tables(report):
+            paths.append(f"{stem}_{name}{extension}")
+            with open(paths[-1], 'w', newline='', encoding=self.encoding) as handle:
+                writer = csv.DictWriter(handle, fieldnames=_table_columns(rows))
+                writer.writeheader()
+                writer.writerows(rows)
+        return paths
+
+    def write_sheets(self, tables, output_filename):
+        """Write ReportSheets as CSV files: the first to output_filename, the others beside it (name_Table.csv)"""
+        stem, extension = os.path.splitext(output_filename)
+        paths = []
+        for table in tables:
+            paths.append(output_filename if not paths else f"{stem}_{table.name}{extension}")
+            with open(paths[-1], 'w', newline='', encoding=self.encoding) as handle:
+                writer = csv.writer(handle)
+                writer.writerow(_sheet_columns(table)[0])
+                writer.writerows(table.rows)
+        return paths
+
+
+class ParquetReportSink:
+    """
+    Long-format Parquet (needs pyarrow): one row per barcode location, written
+    in row groups of chunk_size so only one chunk is held in memory. The other
+    tables go in sibling files (name_File_Summary.parquet, ...).
+    """
+
+    def __init__(self, chunk_size=100000, compression='snappy'):
+        self.chunk_size = chunk_size
+        self.compression = compression
+
+    def write(self, report, output_filename):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Parquet reports need the pyarrow package (pip install pyarrow)") from None
+
+        schema = pa.schema([
+            ('BARCODE', pa.string()), ('FORMAT', pa.string()), ('FILE_PATH', pa.string()),
+            ('SHEET', pa.string()), ('ROW', pa.int32()), ('COLUMN', pa.int32())
+        ])
+        stem, extension = os.path.splitext(output_filename)
+        chunk = [[] for _ in LONG_REPORT_COLUMNS]
+        barcodes, formats, file_paths, sheets, rows, columns = chunk
+
+        def flush():
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(chunk, schema)], schema=schema
+            ))
+            for values in chunk:
+                values.clear()
+
+        with pq.ParquetWriter(output_filename, schema, compression=self.compression) as writer:
+            for barcode, barcode_type, locations in report['groups']:
+                for file_path, sheet_name, row, column in locations:
+                    barcodes.append(barcode)
+                    formats.append(barcode_type)
+                    file_paths.append(file_path)
+                    sheets.append(sheet_name)
+                    rows.append(row)
+                    columns.append(column)
+                if len(barcodes) >= self.chunk_size:
+                    flush()
+            if barcodes:
+                flush()
+
+        paths = [output_filename]
+        for name, table_rows in report_tables(report):
+            paths.append(f"{stem}_{name}{extension}")
+            pq.write_table(pa.Table.from_pylist(table_rows), paths[-1], compression=self.compression)
+        return paths
+
+    def write_sheets(self, tables, output_filename):
+        """Write ReportSheets as Parquet files: the first to output_filename, the others beside it"""
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Parquet reports need the pyarrow package (pip install pyarrow)") from None
+
+        stem, extension = os.path.splitext(output_filename)
+        paths = []
+        for table in tables:
+            paths.append(output_filename if not paths else f"{stem}_{table.name}{extension}")
+            columns = _sheet_columns(table)[0]
+            data = {}
+            for position, column in enumerate(columns):
+                values = [row[position] if position < len(row) else None for row in table.rows]
+                if len({type(value) for value in values if value is not None}) > 1:
+                    values = [str(value) if value is not None else None for value in values]  # e.g. Summary values
+                data[column] = values
+            pq.write_table(pa.table(data), paths[-1], compression=self.compression)
+        return paths
+
+
+REPORT_SINKS = {
+    'xlsx': XlsxReportSink,
+    'csv': CsvReportSink,
+    'parquet': ParquetReportSink,
+}
+
+
+def create_report_sink(report_format, rows_per_file=None):
+    """Sink for one of REPORT_SINKS; rows_per_file splits xlsx reports across files"""
+    if report_format not in REPORT_SINKS:
+        raise ValueError(f"Unknown report format '{report_format}' (choose from {', '.join(REPORT_SINKS)})")
+    if report_format == 'xlsx':
+        return XlsxReportSink(rows_per_file=rows_per_file)
+    return REPORT_SINKS[report_format]()
+
+
+def format_result_row(store, barcode, barcode_type, file_ids):
+    """Results list row for one duplicate group: (barcode, format, copies, files)"""
+    copies = {}
+    for file_id in file_ids:
+        copies[file_id] = copies.get(file_id, 0) + 1
+    files = ", ".join(
+        source_name(store.files[file_id]) + (f" \u00d7{count}" if count > 1 else "")
+        for file_id, count in copies.items()
+    )
+    return (barcode, barcode_type, len(file_ids), files)
+
+
+class DuplicateResultsView:
+    """
+    Virtualised list of duplicate groups. The Treeview holds only as many row
+    items as fit on screen and their values are swapped as the list scrolls,
+    so hundreds of thousands of groups cost no extra widgets. Rows may arrive
+    while a scan is running; filtering and sorting work on plain lists and are
+    redrawn at most once per `interval` ms.
+    """
+
+    COLUMNS = ('DUPLICATE_BARCODES', 'FORMAT', 'COPIES', 'FILES')
+
+    def __init__(self, parent, visible_rows=10, interval=300):
+        self.interval = interval
+        self.rows = {}  # barcode -> (barcode, format, copies, files)
+        self.order = []  # Barcodes in arrival order
+        self.view = []  # Barcodes shown after filtering and sorting
+        self.offset = 0
+        self.sort_column = None
+        self.sort_reverse = False
+        self._refresh_id = None
+
+        self.frame = tk.Frame(parent)
+        filter_frame = tk.Frame(self.frame)
+        filter_frame.pack(fill="x")
+        tk.Label(filter_frame, text="Filter:").pack(side="left")
+        self.filter_var = tk.StringVar()
+        self.filter_var.trace_add("write", lambda *args: self.schedule_refresh())
+        tk.Entry(filter_frame, textvariable=self.filter_var).pack(side="left", fill="x", expand=True, padx=5)
+        self.count_label = tk.Label(filter_frame, text="")
+        self.count_label.pack(side="right")
+
+        table_frame = tk.Frame(self.frame)
+        table_frame.pack(fill="both", expand=True)
+        self.tree = Treeview(table_frame, columns=self.COLUMNS, show="headings", height=visible_rows,
+                             selectmode="browse")
+        for column, width in zip(self.COLUMNS, (170, 70, 60, 300)):
+            self.tree.heading(column, text=column, command=lambda c=column: self.sort_by(c))
+            self.tree.column(column, width=width, stretch=column == 'FILES', anchor="e" if column == 'COPIES' else "w")
+        self.scrollbar = tk.Scrollbar(table_frame, orient="vertical", command=self.on_scroll)
+        self.tree.pack(side="left", fill="both", expand=True)
+        self.scrollbar.pack(side="right", fill="y")
+
+        self.items = []
+        self.resize(visible_rows)
+        self.tree.bind("<Configure>", self._on_configure)
+        for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            self.tree.bind(sequence, self._on_mousewheel)
+        self.draw()
+
+    def clear(self):
+        self.rows = {}
+        self.order = []
+        self.offset = 0
+        self.refresh()
+
+    def update_rows(self, rows):
+        """Add or replace rows (barcode first); the view is redrawn shortly after"""
+        for row in rows:
+            if row[0] not in self.rows:
+                self.order.append(row[0])
+            self.rows[row[0]] = row
+        self.schedule_refresh()
+
+    def schedule_refresh(self):
+        if self._refresh_id is None:
+            self._refresh_id = self.frame.after(self.interval, self.refresh)
+
+    def refresh(self):
+        """Re-apply the filter and sort order, then redraw"""
+        if self._refresh_id is not None:
+            self.frame.after_cancel(self._refresh_id)
+            self._refresh_id = None
+        text = self.filter_var.get().strip().upper()
+        view = self.order
+        if text:
+            view = [barcode for barcode in view if text in barcode or text in self.rows[barcode][3].upper()]
+        if self.sort_column is not None:
+            index = self.COLUMNS.index(self.sort_column)
+            view = sorted(view, key=lambda barcode: self.rows[barcode][index], reverse=self.sort_reverse)
+        self.view = view
+        self.draw()
+
+    def sort_by(self, column):
+        """Sort on `column`; clicking the same heading again reverses the order"""
+        self.sort_reverse = not self.sort_reverse if column == self.sort_column else column == 'COPIES'
+        self.sort_column = column
+        for name in self.COLUMNS:
+            arrow = (" \u25bc" if self.sort_reverse else " \u25b2") if name == column else ""
+            self.tree.heading(name, text=name + arrow)
+        self.refresh()
+
+    def resize(self, visible_rows):
+        """Keep exactly `visible_rows` Treeview items"""
+        while len(self.items) < visible_rows:
+            self.items.append(self.tree.insert("", "end", values=()))
+        while len(self.items) > visible_rows:
+            self.tree.delete(self.items.pop())
+
+    def draw(self):
+        total = len(self.view)
+        self.offset = max(0, min(self.offset, total - len(self.items)))
+        for position, item in enumerate(self.items, self.offset):
+            self.tree.item(item, values=self.rows[self.view[position]] if position < total else ())
+        if total:
+            self.scrollbar.set(self.offset / total, min(1.0, (self.offset + len(self.items)) / total))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+        self.count_label.config(text=f"{total:,} of {len(self.rows):,} duplicate barcodes")
+
+    def scroll_to(self, offset):
+        self.offset = offset
+        self.tree.selection_remove(self.tree.selection())
+        self.draw()
+
+    def on_scroll(self, action, amount, unit=None):
+        """Scrollbar command: 'moveto' fraction or 'scroll' n units/pages"""
+        if action == "moveto":
+            self.scroll_to(int(float(amount) * len(self.view)))
+        elif action == "scroll":
+            step = len(self.items) if unit == "pages" else 1
+            self.scroll_to(self.offset + int(amount) * step)
+
+    def _on_mousewheel(self, event):
+        if event.num == 5 or event.delta < 0:
+            self.on_scroll("scroll", 3)
+        elif event.num == 4 or event.delta > 0:
+            self.on_scroll("scroll", -3)
+        return "break"  # Keep the file list canvas from scrolling too
+
+    def _on_configure(self, event):
+        row_height = int(Style().lookup("Treeview", "rowheight") or 20)
+        visible_rows = max(1, (event.height - row_height) // row_height)  # Less the heading
+        if visible_rows != len(self.items):
+            self.resize(visible_rows)
+            self.draw()
 
 
 class DuplicateFinderApp:
@@ -21,21 +4846,103 @@ class DuplicateFinderApp:
         self.root = root
         self.setup_logging()
         self.setup_memory_monitor()
+        self.setup_io()
         self.initialize_gui()
+        # Load pandas/openpyxl and compile patterns while the user picks files
+        self.root.after(100, self.start_prewarm)
+
+    def start_prewarm(self):
+        thread = threading.Thread(target=self.prewarm, daemon=True)
+        thread.start()
+
+    def prewarm(self):
+        start = time.perf_counter()
+        try:
+            prewarm_modules()
+            self.barcode_matcher  # Compiles the patterns
+            self.logger.info(f"Prewarm finished in {time.perf_counter() - start:.2f}s")
+        except Exception as e:
+            self.logger.warning(f"Prewarm failed, modules will load on first use: {str(e)}")
+
+    @property
+    def barcode_matcher(self):
+        """Compiled barcode patterns, built on first use"""
+        with self.matcher_lock:
+            if self._barcode_matcher is None:
+                self._barcode_matcher = load_barcode_matcher()
+        return self._barcode_matcher
 
     def setup_logging(self):
-        logging.basicConfig(
-            filename='duplicate_finder.log',
-            level=logging.INFO,
-            format='%(asctime)s - %(levelname)s - %(message)s'
-        )
-        self.logger = logging.getLogger(__name__)
+        self.logger = configure_logging()
 
     def setup_memory_monitor(self):
         self.memory_threshold = 85  # Percentage
-        self.process = psutil.Process()
+        self.memory_ceiling_bytes = None  # Absolute ceiling; overrides the percentage when set
+        self.trace_allocations = False  # tracemalloc peaks per phase (slows scanning several times)
+        self.process = None  # psutil.Process, created on the first check
+
+    def setup_io(self):
+        self.read_concurrency = 4  # Concurrent whole-file reads
+        self.max_file_bytes = 256 * 1024 * 1024  # Larger files are read directly from disk
+        self.max_inflight_bytes = 1024 * 1024 * 1024  # Total prefetched bytes held in memory
+        self.use_mmap = True  # Memory-map local files instead of copying them
+        self.progress_interval = 0.25  # Seconds between progress bar updates
+        self.report_format = 'xlsx'  # Export Report format: xlsx, csv (long format) or parquet (long format, needs pyarrow)
+        self.report_rows_per_file = None  # Duplicate rows per xlsx file before continuing in name_part2.xlsx, ...
+        self.fingerprint_path = None  # Baseline duplicate groups for delta reports (default: one per selection in the report folder)
+        self.discovery_include = DEFAULT_INCLUDE  # Glob rules for Select Folder
+        self.discovery_exclude = DEFAULT_EXCLUDE
+        self.discovery_min_size = None  # Bytes
+        self.discovery_max_size = None
+        self.discovery_modified_after = None  # Timestamps
+        self.discovery_modified_before = None
+        self.discovery_archives = True  # Scan workbooks inside .zip bundles in place
+        self.discovery_workers = 16  # Directories listed concurrently
+        self.isolate_files = True  # Parse each file in a worker process that can be killed
+        self.scan_workers = max(1, min(4, (os.cpu_count() or 2) - 1))
+        self.file_timeout = 300  # Seconds one file may take before its worker is killed
+        self.file_memory_limit = 2 * 1024 ** 3  # Bytes one worker may use before it is killed
+
+    def create_loader(self):
+        return ReadAheadLoader(
+            max_workers=self.read_concurrency,
+            max_file_bytes=self.max_file_bytes,
+            max_inflight_bytes=self.max_inflight_bytes,
+            use_mmap=self.use_mmap,
+            logger=self.logger
+        )
+
+    def create_report_sink(self):
+        return create_report_sink(self.report_format, rows_per_file=self.report_rows_per_file)
+
+    def create_job_scheduler(self):
+        return JobScheduler(
+            self.barcode_matcher,
+            workers=self.scan_workers,
+            timeout=self.file_timeout,
+            memory_limit=self.file_memory_limit,
+            loader=self.create_loader(),
+            logger=self.logger
+        )
+
+    def get_job_scheduler(self):
+        """The one pool of scan workers shared by queued checks and Start Duplicate Check"""
+        with self.scheduler_lock:
+            if self.job_scheduler is None:
+                self.job_scheduler = self.create_job_scheduler()
+            return self.job_scheduler
+
+    def create_governor(self):
+        return MemoryGovernor(
+            ceiling_percent=self.memory_threshold,
+            ceiling_bytes=self.memory_ceiling_bytes,
+            trace=self.trace_allocations,
+            logger=self.logger
+        )
 
     def check_memory_usage(self):
+        if self.process is None:
+            self.process = psutil.Process()
         memory_percent = self.process.memory_percent()
         if memory_percent > self.memory_threshold:
             self.logger.warning(f"High memory usage: {memory_percent:.2f}%")
@@ -45,8 +4952,7 @@ class DuplicateFinderApp:
     @lru_cache(maxsize=128)
     def get_sheet_names(self, file_path):
         try:
-            with pd.ExcelFile(file_path) as xls:
-                return xls.sheet_names
+            return read_sheet_names(file_path)
         except Exception as e:
             self.logger.error(f"Error reading sheet names from {file_path}: {str(e)}")
             raise
@@ -77,40 +4983,6 @@ class DuplicateFinderApp:
         if hasattr(self, 'processed_data'):
             del self.processed_data
 
-    def retry_operation(self, operation, max_retries=3):
-        for attempt in range(max_retries):
-            try:
-                return operation()
-            except Exception as e:
-                self.logger.warning(f"Attempt {attempt + 1} failed: {str(e)}")
-                if attempt == max_retries - 1:
-                    raise
-                time.sleep(1)
-
-    def process_files(self):
-        try:
-            self.disable_controls()
-            self.clear_memory()
-
-            results = []
-            for file in self.selected_files:
-                if not self.check_memory_usage():
-                    raise MemoryError("Insufficient memory to continue processing")
-
-                result = self.retry_operation(
-                    lambda: self.process_single_file(file)
-                )
-                results.append(result)
-
-            self.generate_report(results)
-
-        except Exception as e:
-            self.logger.error(f"Critical error in process_files: {str(e)}")
-            self.queue.put(("error", str(e)))
-        finally:
-            self.enable_controls()
-            self.clear_memory()
-
     def save_report(self, df, filename):
         try:
             with pd.ExcelWriter(filename, engine='openpyxl') as writer:
@@ -155,32 +5027,38 @@ class DuplicateFinderApp:
 
     def initialize_gui(self):
         self.root.title("ICON Barcode Duplicate Finder v2.3.5-beta")
-        self.root.geometry("600x500")
+        self.root.geometry("800x860")
 
-        # Custom ICON barcode patterns
-        self.barcode_patterns = {
-            'ICON-17': r'^ICON\d{13}$',  # ICON followed by 13 digits
-            'ICON-18': r'^ICON\d{3}[A-Z]\d{10}$',  # ICON + 3 digits + 1 letter + 10 digits
-            'ICON-20': r'^ICON\d{5}[A-Z]\d{10}$'  # ICON + 5 digits + 1 letter + 10 digits
-        }
+        self._barcode_matcher = None  # See barcode_matcher
+        self.matcher_lock = threading.Lock()
 
         self.selected_files = []
+        self.selection_roots = []  # Files and folders the user picked; delta baselines are kept per folder
         self.sheet_selection_comboboxes = []
         self.sheet_headers = {}
+        self.gatekeep_stop_after = 5  # Conflicts reported before a gatekeeping check stops
+        self.scan_result = None  # Last duplicate check, kept for Export Report
+        self.job_scheduler = None  # Created when the first check is queued or run isolated
+        self.scheduler_lock = threading.Lock()
 
         # Queue for thread communication
         self.queue = Queue()
+        self.queue_poll_id = None
 
         # Create GUI elements
         self.create_gui()
 
     def reset_selection(self):
         self.selected_files = []
+        self.selection_roots = []
         self.file_label.config(text="No files selected")
         for widget in self.scrollable_frame.winfo_children():
             widget.destroy()
         self.sheet_selection_comboboxes = []
         self.sheet_headers = {}
+        self.scan_result = None
+        self.results_view.clear()
+        self.export_button.config(state="disabled")
 
         # Reset the progress bar and status
         self.progress["value"] = 0  # Reset the progress bar to 0
@@ -189,7 +5067,14 @@ class DuplicateFinderApp:
     def disable_controls(self):
         self.file_button.config(state="disabled")
         self.folder_button.config(state="disabled")
+        self.rules_button.config(state="disabled")
         self.start_button.config(state="disabled")
+        self.queue_button.config(state="disabled")
+        self.export_button.config(state="disabled")
+        self.delta_check.config(state="disabled")
+        self.triage_button.config(state="disabled")
+        self.reconcile_button.config(state="disabled")
+        self.stop_at_first_check.config(state="disabled")
         self.reset_button.config(state="disabled")
         for combobox in self.sheet_selection_comboboxes:
             combobox.config(state="disabled")
@@ -197,7 +5082,14 @@ class DuplicateFinderApp:
     def enable_controls(self):
         self.file_button.config(state="normal")
         self.folder_button.config(state="normal")
+        self.rules_button.config(state="normal")
         self.start_button.config(state="normal")
+        self.queue_button.config(state="normal")
+        self.export_button.config(state="normal" if self.scan_result is not None else "disabled")
+        self.delta_check.config(state="normal")
+        self.triage_button.config(state="normal")
+        self.reconcile_button.config(state="normal")
+        self.stop_at_first_check.config(state="normal")
         self.reset_button.config(state="normal")
         for combobox in self.sheet_selection_comboboxes:
             combobox.config(state="readonly")
@@ -207,11 +5099,205 @@ class DuplicateFinderApp:
             messagebox.showwarning("Warning", "Please select files first.")
             return
 
+        arguments = ()
+        if self.stop_at_first_var.get():
+            # The selection holds the new files; they are checked against the allocations
+            reference_folder = filedialog.askdirectory(
+                title="Select Allocation (Reference) Folder - Cancel to check the selected files only")
+            target, arguments = self.gatekeep_files, (reference_folder or None,)
+        else:
+            target = self.process_files
+        self.disable_controls()
+        thread = threading.Thread(target=target, args=arguments, daemon=True)
+        thread.start()
+        self.check_queue()
+
+    def queue_check(self):
+        """Run a duplicate check of the current selection as a background job with its own report"""
+        if not self.selected_files:
+            messagebox.showwarning("Warning", "Please select files first.")
+            return
+        scheduler = self.get_job_scheduler()
+
+        file_sheets = [
+            (file, self.sheet_selection_comboboxes[idx].get())
+            for idx, file in enumerate(self.selected_files)
+        ]
+        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        job_number = len(scheduler.jobs) + 1
+        job = CheckJob(
+            self.selection_name(),
+            file_sheets,
+            priority=JOB_PRIORITIES[self.priority_combobox.get()],
+            output=os.path.join(get_report_folder(), f"ICON_Duplicates_{timestamp}_job{job_number}.{self.report_format}"),
+            sink=self.create_report_sink(),
+            on_update=lambda job: self.queue.put(("job", job))
+        )
+        scheduler.submit(job)
+        self.update_job_row(job)
+        self.check_queue()
+
+    def selection_name(self):
+        name = source_name(self.selected_files[0])
+        if len(self.selected_files) > 1:
+            name += f" and {len(self.selected_files) - 1} more"
+        return name
+
+    def cancel_selected_jobs(self):
+        if self.job_scheduler is None:
+            return
+        for item in self.jobs_view.selection():
+            self.job_scheduler.cancel(self.job_scheduler.jobs[int(item) - 1])
+
+    def update_job_row(self, job):
+        if job.state == 'done':
+            status = f"Done: {job.duplicates} duplicate barcodes" + (" (double-click for report)" if job.report else "")
+        elif job.state == 'failed':
+            status = f"Failed: {job.error}"
+        elif job.state == 'running':
+            status = f"Running ({job.percent:.0f}%)"
+        else:
+            status = job.state.capitalize()
+        priority = next((label for label, value in JOB_PRIORITIES.items() if value == job.priority), job.priority)
+        values = (job.name, priority, status, f"{job.files_done}/{len(job.file_sheets)}")
+        item = str(job.job_id)
+        if self.jobs_view.exists(item):
+            self.jobs_view.item(item, values=values)
+        else:
+            self.jobs_view.insert("", "end", iid=item, values=values)
+
+    def open_job_report(self, event):
+        item = self.jobs_view.identify_row(event.y)
+        if not item or self.job_scheduler is None:
+            return
+        job = self.job_scheduler.jobs[int(item) - 1]
+        if job.report:
+            try:
+                open_file(job.report[0])
+            except Exception as e:
+                messagebox.showerror("Error", f"Failed to open file: {str(e)}")
+
+    def gatekeep_files(self, reference_folder=None):
+        """
+        Yes/no check that stops at the first cross-file duplicate involving a
+        selected file; files in `reference_folder` (first sheet) are only
+        checked against the selection, not against each other.
+        """
+        try:
+            file_sheets = [
+                (file, self.sheet_selection_comboboxes[idx].get())
+                for idx, file in enumerate(self.selected_files)
+            ]
+            selected = set(self.selected_files)
+            reference_files = []
+            if reference_folder:
+                self.update_status(0, "Searching for allocation files...")
+                reference_files = [file for file in collect_excel_files([reference_folder], self.create_discovery())
+                                   if file not in selected]
+            errors = []
+            with self.create_progress_tracker() as tracker:
+                groups = find_first_duplicates(
+                    [(file, None) for file in reference_files] + file_sheets,
+                    self.barcode_matcher,
+                    stop_after=self.gatekeep_stop_after,
+                    loader=self.create_loader(),
+                    cross_file_only=True,
+                    reference_files=reference_files,
+                    errors=errors,
+                    progress=tracker,
+                    logger=self.logger
+                )
+            self.update_status(100, "Complete")
+            self.queue.put(("complete", True, format_conflicts(groups, errors), None))
+        except Exception as e:
+            self.logger.error(f"Critical error in gatekeep_files: {str(e)}")
+            self.queue.put(("complete", False, f"A critical error occurred: {str(e)}", None))
+
+    def start_reconcile(self):
+        reference_folder = filedialog.askdirectory(title="Select Allocation (Reference) Folder")
+        if not reference_folder:
+            return
+        probe_folder = filedialog.askdirectory(title="Select Challan (Shipped) Folder")
+        if not probe_folder:
+            return
+
+        self.disable_controls()
+        thread = threading.Thread(
+            target=self.reconcile_folders, args=(reference_folder, probe_folder), daemon=True
+        )
+        thread.start()
+        self.check_queue()
+
+    def reconcile_folders(self, reference_folder, probe_folder):
+        """Check every shipped serial against the allocations (first sheet of each file)"""
+        try:
+            self.update_status(0, "Searching for allocation and challan files...")
+            reference_files = collect_excel_files([reference_folder], self.create_discovery())
+            probe_files = collect_excel_files([probe_folder], self.create_discovery())
+            if not reference_files or not probe_files:
+                self.queue.put(("complete", False, "Both folders must contain Excel files.", None))
+                return
+            with self.create_progress_tracker() as tracker:
+                result = reconcile_files(
+                    [(file, None) for file in reference_files],
+                    [(file, None) for file in probe_files],
+                    self.barcode_matcher,
+                    loader=self.create_loader(),
+                    progress=tracker,
+                    logger=self.logger
+                )
+            self.update_status(95, "Saving reconciliation report...")
+            timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+            output_filename = os.path.join(get_report_folder(), f"ICON_Reconciliation_{timestamp}.{self.report_format}")
+            metrics = save_reconciliation_report(result, output_filename, self.create_report_sink())
+
+            success_msg = (
+                f"Unallocated shipments: {metrics['Unallocated Shipments']}\n"
+                f"Double-shipped barcodes: {metrics['Double-Shipped Barcodes']}\n"
+                f"Never-shipped barcodes: {metrics['Never-Shipped Barcodes']}"
+            )
+            if result['errors']:
+                success_msg += f"\n\nWarning: {len(result['errors'])} file(s) were skipped due to errors."
+            success_msg += f"\nReport saved to '{output_filename}'"
+            self.update_status(100, "Saved.")
+            self.queue.put(("complete", True, success_msg, output_filename))
+        except Exception as e:
+            self.logger.error(f"Critical error in reconcile_folders: {str(e)}")
+            self.queue.put(("complete", False, f"A critical error occurred: {str(e)}", None))
+
+    def start_triage(self):
+        if not self.selected_files:
+            messagebox.showwarning("Warning", "Please select files first.")
+            return
+
         self.disable_controls()
-        thread = threading.Thread(target=self.process_files, daemon=True)
+        thread = threading.Thread(target=self.triage_files, daemon=True)
         thread.start()
         self.check_queue()
 
+    def triage_files(self):
+        """Quick HyperLogLog estimate of distinct barcodes and overlapping files"""
+        try:
+            file_sheets = [
+                (file, self.sheet_selection_comboboxes[idx].get())
+                for idx, file in enumerate(self.selected_files)
+            ]
+            store = TriageSketchStore(os.path.join(get_report_folder(), "triage_sketches.json"))
+            with self.create_progress_tracker() as tracker:
+                result = run_triage(
+                    file_sheets,
+                    self.barcode_matcher,
+                    loader=self.create_loader(),
+                    store=store,
+                    progress=tracker,
+                    logger=self.logger
+                )
+            self.update_status(100, "Triage complete")
+            self.queue.put(("complete", True, format_triage_summary(result), None))
+        except Exception as e:
+            self.logger.error(f"Critical error in triage_files: {str(e)}")
+            self.queue.put(("complete", False, f"A critical error occurred: {str(e)}", None))
+
     def create_gui(self):
         # Create a frame for the buttons
         button_frame = tk.Frame(self.root)
@@ -225,6 +5311,10 @@ class DuplicateFinderApp:
         self.folder_button = tk.Button(button_frame, text="Select Folder", command=self.select_folder)
         self.folder_button.pack(side="left", padx=5)
 
+        # Include/exclude, size and date rules for Select Folder and the reference folders
+        self.rules_button = tk.Button(button_frame, text="Folder Rules...", command=self.edit_discovery_rules)
+        self.rules_button.pack(side="left", padx=5)
+
         self.file_label = tk.Label(self.root, text="No files selected")
         self.file_label.pack()
 
@@ -254,6 +5344,10 @@ class DuplicateFinderApp:
         self.canvas.pack(side="left", fill="both", expand=True)
         self.scrollbar.pack(side="right", fill="y")
 
+        # Duplicate groups, filled in while the scan runs
+        self.results_view = DuplicateResultsView(self.root)
+        self.results_view.frame.pack(fill="both", expand=True, padx=10)
+
         # Progress frame
         self.progress_frame = tk.Frame(self.root)
         self.progress_frame.pack(fill="x", pady=10)
@@ -284,6 +5378,70 @@ class DuplicateFinderApp:
         )
         self.start_button.pack(pady=10)
 
+        # Queued checks run side by side on a shared pool of scan workers
+        queue_frame = tk.Frame(self.root)
+        queue_frame.pack(pady=5)
+        self.queue_button = tk.Button(queue_frame, text="Add to Queue", command=self.queue_check)
+        self.queue_button.pack(side="left", padx=5)
+        self.priority_combobox = Combobox(queue_frame, values=list(JOB_PRIORITIES), state="readonly", width=8)
+        self.priority_combobox.set("Normal")
+        self.priority_combobox.pack(side="left", padx=5)
+        self.cancel_job_button = tk.Button(queue_frame, text="Cancel Job", command=self.cancel_selected_jobs)
+        self.cancel_job_button.pack(side="left", padx=5)
+
+        self.jobs_view = Treeview(
+            self.root, columns=("job", "priority", "status", "files"), show="headings", height=4
+        )
+        for column, heading, width in (("job", "Job", 300), ("priority", "Priority", 80),
+                                       ("status", "Status", 260), ("files", "Files", 80)):
+            self.jobs_view.heading(column, text=heading)
+            self.jobs_view.column(column, width=width, anchor="w")
+        self.jobs_view.bind("<Double-1>", self.open_job_report)
+        self.jobs_view.pack(fill="x", padx=10)
+
+        # Writing the xlsx report is a separate, backgrounded step
+        self.export_button = tk.Button(
+            self.root,
+            text="Export Report",
+            command=self.start_export,
+            state="disabled"
+        )
+        self.export_button.pack(pady=5)
+
+        # Delta mode: only what changed since the previous duplicate check
+        self.delta_var = tk.BooleanVar(value=False)
+        self.delta_check = tk.Checkbutton(
+            self.root,
+            text="Export only changes since the previous run",
+            variable=self.delta_var
+        )
+        self.delta_check.pack()
+
+        # Early-exit mode for goods-in checks
+        self.stop_at_first_var = tk.BooleanVar(value=False)
+        self.stop_at_first_check = tk.Checkbutton(
+            self.root,
+            text="Stop at first cross-file duplicate",
+            variable=self.stop_at_first_var
+        )
+        self.stop_at_first_check.pack()
+
+        # Quick triage button
+        self.triage_button = tk.Button(
+            self.root,
+            text="Quick Triage (Estimate)",
+            command=self.start_triage
+        )
+        self.triage_button.pack(pady=5)
+
+        # Challan versus allocation reconciliation
+        self.reconcile_button = tk.Button(
+            self.root,
+            text="Reconcile Challans vs Allocations",
+            command=self.start_reconcile
+        )
+        self.reconcile_button.pack(pady=5)
+
         # Reset button (add this after the Start button)
         self.reset_button = tk.Button(
             self.root,
@@ -297,25 +5455,7 @@ class DuplicateFinderApp:
         Detect if a value matches ICON barcode pattern
         Returns (is_barcode, barcode_type)
         """
-        if pd.isna(value):
-            return False, None
-
-        # Convert to string and remove any whitespace
-        str_value = str(value).strip().upper()
-
-        # Skip empty strings
-        if not str_value:
-            return False, None
-
-        # Check for exact length (17 or 18 characters)
-        if len(str_value) not in [17, 18, 20]:
-            return False, None
-
-        # Check patterns
-        for barcode_type, pattern in self.barcode_patterns.items():
-            if re.fullmatch(pattern, str_value):  # Explicit flag
-                return True, barcode_type
-        return False, None
+        return detect_barcode(value, self.barcode_matcher)
 
     def find_barcodes_in_dataframe(self, df):
         """Find all ICON barcode values in a DataFrame."""
@@ -340,25 +5480,21 @@ class DuplicateFinderApp:
         elif event.num == 4 or event.delta > 0:
             self.canvas.yview_scroll(-1, "units")
 
-    def is_valid_excel_file(self, filename):
-        """Check if the file is a valid Excel file (not temporary and has correct extension)"""
-        base_name = os.path.basename(filename)
-        return (
-            not base_name.startswith("~$") and  # Skip temporary files
-            base_name.endswith((".xlsx", ".xls", ".xlsm"))  # Must be Excel file
-        )
-
     def select_files(self):
         files = filedialog.askopenfilenames(
             title="Select Excel Files",
-            filetypes=[("Excel Files", "*.xlsx *.xls *.xlsm")]
+            filetypes=[("Excel Files", "*.xlsx *.xls *.xlsm"), ("Zipped Workbooks", "*.zip")]
         )
         if files:
             # Convert selected files to absolute paths
             selected_absolute_paths = {os.path.abspath(f) for f in files}
+            self.selection_roots.extend(selected_absolute_paths)
 
-            # Filter out temporary files
-            valid_files = {f for f in selected_absolute_paths if self.is_valid_excel_file(f)}
+            # Filter out temporary files; bundles contribute the workbooks inside them
+            valid_files = {f for f in selected_absolute_paths if is_valid_excel_file(f)}
+            archives = [f for f in selected_absolute_paths if is_archive_file(f)]
+            if archives:
+                valid_files.update(self.create_discovery().collect(archives))
 
             if not valid_files:
                 messagebox.showwarning("Warning", "No valid Excel files selected. Temporary files (~$) will be skipped.")
@@ -368,7 +5504,7 @@ class DuplicateFinderApp:
             existing_absolute_paths = {os.path.abspath(f) for f in self.selected_files}
             self.selected_files = list(existing_absolute_paths.union(valid_files))
 
-            skipped = len(files) - len(valid_files)
+            skipped = sum(1 for f in selected_absolute_paths if not is_valid_excel_file(f) and not is_archive_file(f))
             if skipped > 0:
                 self.file_label.config(
                     text=f"{len(valid_files)} file(s) selected ({skipped} temporary file(s) skipped)")
@@ -378,14 +5514,6 @@ class DuplicateFinderApp:
         else:
             self.file_label.config(text="No files selected")
 
-    def is_valid_excel_file(self, filename):
-        # Check if the file is a valid Excel file (not temporary and has correct extension)
-        base_name = os.path.basename(filename)
-        return (
-            not base_name.startswith("~$") and  # Skip temporary files
-            base_name.endswith((".xlsx", ".xls", ".xlsm"))  # Added .xlsm
-        )
-
     def get_excel_engine(self, file_path):
         """Determine the appropriate engine based on file extension"""
         file_extension = os.path.splitext(file_path)[1].lower()
@@ -400,35 +5528,123 @@ class DuplicateFinderApp:
         if not folder_selected:
             return
 
-        excel_files = set()
-        skipped_files = 0
-        # Walk through all subdirectories and files
-        for root, dirs, files in os.walk(folder_selected):
-            for file in files:
-                full_path = os.path.abspath(os.path.join(root, file))
-                if self.is_valid_excel_file(full_path):
-                    excel_files.add(full_path)
-                elif file.endswith(('.xlsx', '.xls', '.xlsm')):  # Count skipped Excel files
-                    skipped_files += 1
-
-        if excel_files:
-            # Convert existing files to absolute paths and combine with new unique files
-            existing_absolute_paths = {os.path.abspath(f) for f in self.selected_files}
-            self.selected_files = list(existing_absolute_paths.union(excel_files))
+        # Files are listed in the background and appear in the list as they are found
+        self.selection_roots.append(os.path.abspath(folder_selected))
+        self.disable_controls()
+        self.file_label.config(text="Searching for Excel files...")
+        thread = threading.Thread(target=self.discover_files, args=(folder_selected,), daemon=True)
+        thread.start()
+        self.check_queue()
 
-            if skipped_files > 0:
-                self.file_label.config(
-                    text=f"{len(excel_files)} file(s) selected ({skipped_files} temporary file(s) skipped)")
-            else:
-                self.file_label.config(text=f"{len(self.selected_files)} file(s) selected")
+    def create_discovery(self):
+        return FileDiscovery(
+            include=self.discovery_include,
+            exclude=self.discovery_exclude,
+            min_size=self.discovery_min_size,
+            max_size=self.discovery_max_size,
+            modified_after=self.discovery_modified_after,
+            modified_before=self.discovery_modified_before,
+            archives=self.discovery_archives,
+            workers=self.discovery_workers,
+            logger=self.logger
+        )
 
-            self.display_file_selection()
+    def edit_discovery_rules(self):
+        """Dialog for the rules create_discovery applies to folders"""
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Folder Rules")
+        dialog.grab_set()  # Make dialog modal
+
+        def size_text(size):
+            return str(size) if size is not None else ""
+
+        def date_text(timestamp):
+            return datetime.date.fromtimestamp(timestamp).isoformat() if timestamp is not None else ""
+
+        fields = [
+            ("Include (globs, ; separated)", "; ".join(self.discovery_include)),
+            ("Exclude (globs, ; separated)", "; ".join(rule for rule in self.discovery_exclude
+                                                     if rule not in DEFAULT_EXCLUDE)),
+            ("Minimum size (e.g. 10K)", size_text(self.discovery_min_size)),
+            ("Maximum size (e.g. 500M)", size_text(self.discovery_max_size)),
+            ("Modified on or after (YYYY-MM-DD)", date_text(self.discovery_modified_after)),
+            ("Modified before (YYYY-MM-DD)", date_text(self.discovery_modified_before)),
+        ]
+        variables = []
+        for row, (label, value) in enumerate(fields):
+            tk.Label(dialog, text=label, anchor="w").grid(row=row, column=0, sticky="w", padx=10, pady=2)
+            variable = tk.StringVar(value=value)
+            tk.Entry(dialog, textvariable=variable, width=40).grid(row=row, column=1, padx=10, pady=2)
+            variables.append(variable)
+        archives_var = tk.BooleanVar(value=self.discovery_archives)
+        tk.Checkbutton(dialog, text="Look inside .zip bundles", variable=archives_var).grid(
+            row=len(fields), column=0, columnspan=2, sticky="w", padx=10)
+
+        def globs(text):
+            return tuple(rule.strip() for rule in text.split(";") if rule.strip())
+
+        def optional(parse, text):
+            return parse(text) if text.strip() else None
+
+        def apply():
+            include, exclude, min_size, max_size, after, before = (variable.get() for variable in variables)
+            try:
+                rules = (globs(include) or DEFAULT_INCLUDE, DEFAULT_EXCLUDE + globs(exclude),
+                         optional(parse_size, min_size), optional(parse_size, max_size),
+                         optional(parse_date, after), optional(parse_date, before))
+            except argparse.ArgumentTypeError as e:
+                messagebox.showerror("Error", str(e), parent=dialog)
+                return
+            (self.discovery_include, self.discovery_exclude, self.discovery_min_size, self.discovery_max_size,
+             self.discovery_modified_after, self.discovery_modified_before) = rules
+            self.discovery_archives = archives_var.get()
+            dialog.destroy()
+
+        button_frame = tk.Frame(dialog)
+        button_frame.grid(row=len(fields) + 1, column=0, columnspan=2, pady=10)
+        tk.Button(button_frame, text="OK", command=apply).pack(side=tk.LEFT, padx=5)
+        tk.Button(button_frame, text="Cancel", command=dialog.destroy).pack(side=tk.LEFT, padx=5)
+        dialog.wait_window()
+
+    def discover_files(self, folder):
+        """Walk `folder` and stream (file, sheet names) batches to the selection list"""
+        try:
+            discovery = self.create_discovery()
+            known = set(self.selected_files)
+            unreadable = []
+            for batch in discovery.iter_batches([folder]):
+                entries = []
+                for file in batch:
+                    if file in known:
+                        continue
+                    known.add(file)
+                    try:
+                        entries.append((file, self.get_sheet_names(file)))
+                    except Exception as e:
+                        unreadable.append(f"{source_name(file)}: {str(e)}")
+                if entries:
+                    self.queue.put(("discovered", entries))
+                self.update_status(0, format_discovery_stats(discovery.stats))
+            self.logger.info(format_discovery_stats(discovery.stats))
+            self.queue.put(("discovery_done", dict(discovery.stats), unreadable))
+        except Exception as e:
+            self.logger.error(f"Critical error in discover_files: {str(e)}")
+            self.queue.put(("complete", False, f"A critical error occurred: {str(e)}", None))
+
+    def finish_discovery(self, stats, unreadable):
+        self.enable_controls()
+        self.status_var.set(format_discovery_stats(stats))
+        if self.selected_files:
+            label = f"{len(self.selected_files)} file(s) selected"
+            if stats['skipped']:
+                label += f" ({stats['skipped']} file(s) skipped by the discovery rules)"
+            self.file_label.config(text=label)
+        elif stats['skipped']:
+            messagebox.showinfo("Information", "Only skipped Excel files (temporary or filtered) were found.")
         else:
-            if skipped_files > 0:
-                messagebox.showinfo("Information",
-                                    "Only temporary Excel files were found. These files are skipped.")
-            else:
-                messagebox.showinfo("Information", "No Excel files found in the selected folder and its subfolders.")
+            messagebox.showinfo("Information", "No Excel files found in the selected folder and its subfolders.")
+        if unreadable:
+            messagebox.showerror("Error", "Some files could not be read:\n" + "\n".join(unreadable[:20]))
 
     def display_file_selection(self):
         for widget in self.scrollable_frame.winfo_children():
@@ -436,249 +5652,311 @@ class DuplicateFinderApp:
         self.sheet_selection_comboboxes = []
         self.sheet_headers = {}
 
-        for idx, file in enumerate(self.selected_files):
+        files, self.selected_files = self.selected_files, []
+        for file in files:
             try:
-                # Get appropriate engine for the file type
-                engine = self.get_excel_engine(file)
-
-                # Read Excel file with appropriate engine
-                excel_file = pd.ExcelFile(file, engine=engine)
-                sheet_names = excel_file.sheet_names
-                self.sheet_headers[file] = sheet_names
-
-                file_frame = tk.Frame(self.scrollable_frame)
-                file_frame.pack(fill="x", pady=5)
-
-                sheet_label = tk.Label(
-                    file_frame,
-                    text=f"File {idx + 1}: {os.path.basename(file)}",
-                    width=50,
-                    anchor="w"
-                )
-                sheet_label.pack(side="left", padx=10)
-
-                sheet_combobox = Combobox(
-                    file_frame,
-                    values=sheet_names,
-                    state="readonly",
-                    width=17
-                )
-                sheet_combobox.pack(side="left", padx=10)
-                sheet_combobox.current(0)
-                self.sheet_selection_comboboxes.append(sheet_combobox)
+                self.add_file_rows([(file, self.get_sheet_names(file))])
             except Exception as e:
-                messagebox.showerror("Error", f"Error reading file {os.path.basename(file)}: {str(e)}")
+                messagebox.showerror("Error", f"Error reading file {source_name(file)}: {str(e)}")
+
+    def add_file_rows(self, entries):
+        """Append (file, sheet names) rows to the selection list"""
+        for file, sheet_names in entries:
+            self.selected_files.append(file)
+            self.sheet_headers[file] = sheet_names
+
+            file_frame = tk.Frame(self.scrollable_frame)
+            file_frame.pack(fill="x", pady=5)
+
+            sheet_label = tk.Label(
+                file_frame,
+                text=f"File {len(self.selected_files)}: {source_name(file)}",
+                width=50,
+                anchor="w"
+            )
+            sheet_label.pack(side="left", padx=10)
+
+            sheet_combobox = Combobox(
+                file_frame,
+                values=sheet_names,
+                state="disabled" if self.file_button["state"] == "disabled" else "readonly",
+                width=17
+            )
+            sheet_combobox.pack(side="left", padx=10)
+            sheet_combobox.current(0)
+            self.sheet_selection_comboboxes.append(sheet_combobox)
 
     def process_files(self):
+        governor = self.create_governor()
         try:
-            all_barcodes = []
+            store = LocationStore()  # Columnar store of every barcode location
             file_summary = []
             error_files = []
             file_paths_dict = {}  # Dictionary to store file paths with filenames as keys
-            total_files = len(self.selected_files)
 
-            # Calculate progress weights (80% for file processing, 10% for duplicates, 10% for report)
-            file_progress_weight = 80
-            progress_per_file = file_progress_weight / total_files if total_files > 0 else 0
-
-            for idx, file in enumerate(self.selected_files):
-                try:
-                    selected_sheet = self.sheet_selection_comboboxes[idx].get()
-                    file_name = os.path.basename(file)
-                    file_path = os.path.abspath(file)
-                    file_paths_dict[file_name] = file_path  # Store file path with filename as key
+            # Duplicate groups are streamed to the results list after every file
+            self.scan_result = None
+            live = DuplicateTracker(store)
+            self.queue.put(("results_clear",))
 
-                    current_progress = idx * progress_per_file
-                    self.update_status(current_progress, f"Reading {file_name}...")
+            def publish_groups(*args):
+                changed = live.update()
+                if changed:
+                    self.queue.put(("results", [format_result_row(store, *group) for group in changed]))
 
-                    engine = self.get_excel_engine(file)
-                    df = pd.read_excel(file, sheet_name=selected_sheet, dtype=str, engine=engine)
-                    self.update_status(current_progress + (progress_per_file / 2), f"Scanning for ICON barcodes in {file_name}...")
+            # Isolated, the check is a high-priority job on the shared scheduler, whose
+            # workers parse files with a time and memory limit each, fetch each
+            # workbook with one large read and report rows as they go, and the governor
+            # cuts the workers and workbooks in flight if memory runs short; in
+            # process, workbooks are prefetched with large sequential reads and the
+            # governor throttles the read-ahead instead. The tracker
+            # turns per-file counters into rate-limited progress updates
+            governor.start()
+            with self.create_progress_tracker() as tracker:
+                tracker.set_files(self.selected_files)
+                file_sheets = [(file, self.sheet_selection_comboboxes[idx].get())
+                               for idx, file in enumerate(self.selected_files)]
+                if self.isolate_files:
+                    governor.enter('detector')
+                    job = CheckJob(self.selection_name(), file_sheets, priority=JOB_PRIORITIES['High'],
+                                   on_update=lambda job: self.queue.put(("job", job)),
+                                   store=store, progress=tracker, on_file=publish_groups)
+                    scheduler = governor.govern(self.get_job_scheduler())
+                    try:
+                        scheduler.submit(job)
+                        job.wait()
+                    finally:
+                        governor.release(scheduler)
+                    if job.state != 'done':
+                        raise RuntimeError(job.error or f"The check was {job.state}")
+                    file_summary = job.file_summary
+                    for entry in file_summary:
+                        file_paths_dict[entry['FILE_NAME']] = entry['PATH']
+                        if entry['STATUS'].startswith('Failed: '):
+                            error_files.append(f"Error processing {entry['FILE_NAME']}: {entry['STATUS'][8:]}")
+                else:
+                    loader = governor.govern(self.create_loader())
+                    for idx, (file, source, read_error) in enumerate(governor.track(loader.iter_files(self.selected_files))):
+                        tracker.begin_file(file)
+                        governor.enter('detector')
+                        try:
+                            selected_sheet = self.sheet_selection_comboboxes[idx].get()
+                            file_name = source_name(file)
+                            file_path = os.path.abspath(file)
+                            file_paths_dict[file_name] = file_path  # Store file path with filename as key
 
-                    barcodes = self.find_barcodes_in_dataframe(df)
+                            if read_error:
+                                raise read_error
 
-                    file_summary.append({
-                        'FILE_NAME': file_name,
-                        'BARCODE_COUNT': len(barcodes),
-                        'PATH': file_path,
-                        'STATUS': 'Processed successfully'
-                    })
+                            barcode_count = scan_file_into_store(
+                                store, source, file, selected_sheet, self.barcode_matcher, tracker
+                            )
+                            file_summary.append({
+                                'FILE_NAME': file_name,
+                                'BARCODE_COUNT': barcode_count,
+                                'PATH': file_path,
+                                'STATUS': 'Processed successfully'
+                            })
 
-                    if not barcodes:
-                        self.update_status(current_progress + progress_per_file,
-                                           f"No ICON barcodes found in {file_name}, continuing...")
-                        continue
+                            publish_groups()
+                            if not barcode_count:
+                                self.logger.info(f"No ICON barcodes found in {file_name}, continuing...")
 
-                    for barcode in barcodes:
-                        all_barcodes.append({
-                            'BARCODE': barcode['value'],
-                            'FILE_NAME': file_name,
-                            'FORMAT': barcode['type'],
-                            'FILE_PATH': file_path  # Add file path to barcode data
-                        })
-
-                except Exception as e:
-                    error_message = f"Error processing {file_name}: {str(e)}"
-                    error_files.append(error_message)
-                    file_summary.append({
-                        'FILE_NAME': file_name,
-                        'BARCODE_COUNT': 0,
-                        'PATH': file_path,
-                        'STATUS': f'Failed: {str(e)}'
-                    })
-                    self.update_status(current_progress + progress_per_file, f"Skipping {file_name} due to error...")
-                    continue
+                        except Exception as e:
+                            error_message = f"Error processing {file_name}: {str(e)}"
+                            error_files.append(error_message)
+                            file_summary.append({
+                                'FILE_NAME': file_name,
+                                'BARCODE_COUNT': 0,
+                                'PATH': file_path,
+                                'STATUS': f'Failed: {str(e)}'
+                            })
+                            self.logger.warning(f"Skipping {file_name} due to error: {str(e)}")
+                        finally:
+                            tracker.end_file()
 
-            if not all_barcodes:
+            if not len(store):
                 self.update_status(100, "No barcodes found.")
                 self.queue.put(("complete", False, "No ICON barcodes found in any of the selected file(s).", None))
                 return
 
-            self.update_status(90, "Processing duplicates...")
+            # The groups are already on screen; reports are written on request. The
+            # fingerprint becomes this selection's baseline once a delta is exported
+            self.scan_result = {
+                'store': store,
+                'file_summary': file_summary,
+                'error_files': error_files,
+                'file_paths_dict': file_paths_dict,
+                'governor': governor,
+                'fingerprint': run_fingerprint(store, baseline_key(self.selection_roots),
+                                               [file for file, _ in file_sheets])
+            }
+            if not len(live):
+                success_msg = "No duplicate ICON barcodes found."
+            else:
+                success_msg = f"Found {len(live)} duplicate ICON barcodes. Use 'Export Report' to save them to Excel."
+            if error_files:
+                success_msg += f"\n\nWarning: {len(error_files)} file(s) were skipped due to errors."
+            self.update_status(100, "Complete")
+            self.queue.put(("complete", True, success_msg, None))
+            self.root.after(1000, lambda: self.update_status(0, ""))
+
+        except Exception as e:
+            self.queue.put(("complete", False, f"A critical error occurred: {str(e)}", None))
+            self.root.after(1000, lambda: self.update_status(0, ""))
+        finally:
+            governor.stop()
+
+    def baseline_fingerprint(self, fingerprint):
+        """Path and saved fingerprint (None if there is none) of the previous run over the same folders"""
+        path = self.fingerprint_path or default_fingerprint_path(fingerprint['baseline'])
+        try:
+            if os.path.exists(path):
+                return path, load_fingerprint(path)
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"Ignoring the previous run fingerprint: {str(e)}")
+        return path, None
+
+    def start_export(self):
+        if self.scan_result is None:
+            messagebox.showwarning("Warning", "Run a duplicate check first.")
+            return
+
+        self.disable_controls()
+        target = self.export_delta_report if self.delta_var.get() else self.export_report
+        thread = threading.Thread(target=target, daemon=True)
+        thread.start()
+        self.check_queue()
 
-            file_summary_df = pd.DataFrame(file_summary)
-            file_summary_df = file_summary_df.sort_values('BARCODE_COUNT', ascending=False)
+    def export_report(self):
+        """Write the duplicates of the last scan through the report sink for self.report_format (runs in the background)"""
+        result = self.scan_result
+        store = result['store']
+        file_summary = result['file_summary']
+        error_files = result['error_files']
+        governor = result['governor']
+        governor.start()
+        try:
+            self.update_status(10, "Compiling Duplicates...")
 
-            if all_barcodes:
-                barcode_df = pd.DataFrame(all_barcodes)
-                duplicate_barcodes = barcode_df[barcode_df.duplicated("BARCODE", keep=False)]
+            # Group straight from the columnar arrays
+            governor.enter('index')
+            duplicate_groups = store.duplicate_groups()
+            if not duplicate_groups:
+                self.update_status(100, "Complete")
+                self.queue.put(("complete", True, "No duplicate ICON barcodes to export.", None))
+                return
 
-                if duplicate_barcodes.empty:
-                    success_msg = "No duplicate ICON barcodes found."
-                    if error_files:
-                        success_msg += f"\n\nWarning: {len(error_files)} file(s) were skipped due to errors."
-                    self.update_status(100, "Complete")
-                    self.queue.put(("complete", True, success_msg, None))
-                    return
+            self.update_status(30, "Writing report...")
+            governor.enter('report')
 
-                self.update_status(95, "Compiling Duplicates...")
-
-                grouped_duplicates = []
-                for barcode, group in duplicate_barcodes.groupby("BARCODE"):
-                    copies = len(group)
-                    row_data = [barcode, copies]
-                    for _, row in group.iterrows():
-                        row_data.append((row['FILE_NAME'], row['FILE_PATH']))
-                    grouped_duplicates.append(row_data)
-
-                max_files = max(len(row) - 2 for row in grouped_duplicates)
-                headers = ["DUPLICATE_BARCODES", "COPIES"] + [f"FILE_NAME{i + 1}" for i in range(max_files)]
-
-                # Prepare data for DataFrame (separate names and paths)
-                aligned_duplicates = []
-                for row in grouped_duplicates:
-                    new_row = [row[0], row[1]]  # Barcode and copies
-                    file_tuples = row[2:]  # List of (name, path) tuples
-                    # Add file names only (paths will be used later for hyperlinks)
-                    new_row.extend([tup[0] if isinstance(tup, tuple) else "" for tup in file_tuples + [("", "")] * (max_files - len(file_tuples))])
-                    aligned_duplicates.append(new_row)
-
-                duplicates_df = pd.DataFrame(aligned_duplicates, columns=headers)
-
-                timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-                destination_path = os.path.expanduser("~")
-                folder_path = os.path.join(destination_path, "Desktop", "DUPLICATE_BARCODES")
-                os.makedirs(folder_path, exist_ok=True)
-                output_filename = os.path.join(folder_path, f"ICON_Duplicates_{timestamp}.xlsx")
-
-                # Save the basic structure first
-                with pd.ExcelWriter(output_filename, engine='openpyxl') as writer:
-                    duplicates_df.to_excel(writer, sheet_name='Detailed_Report', index=False)
-                    file_summary_df.to_excel(writer, sheet_name='File_Summary', index=False)
-
-                    summary_data = {
-                        'Metric': [
-                            'Total Files Processed',
-                            'Successfully Processed Files',
-                            'Failed Files',
-                            'Total ICON Barcodes Found',
-                            'Unique Barcodes',
-                            'Duplicate Barcodes',
-                            '17-Character Barcodes',
-                            '18-Character Barcodes',
-                            '20-Character Barcodes'
-                        ],
-                        'Value': [
-                            len(self.selected_files),
-                            len(file_summary_df[file_summary_df['STATUS'].str.startswith('Processed')]),
-                            len(error_files),
-                            len(barcode_df),
-                            len(barcode_df['BARCODE'].unique()),
-                            len(duplicate_barcodes['BARCODE'].unique()),
-                            len(barcode_df[barcode_df['FORMAT'] == 'ICON-17']),
-                            len(barcode_df[barcode_df['FORMAT'] == 'ICON-18']),
-                            len(barcode_df[barcode_df['FORMAT'] == 'ICON-20'])
-                        ]
-                    }
-                    pd.DataFrame(summary_data).to_excel(writer, sheet_name='Summary', index=False)
-
-                # Now add hyperlinks using openpyxl
-                wb = load_workbook(output_filename)
-
-                # Add hyperlinks to Detailed_Report sheet
-                ws_detailed = wb['Detailed_Report']
-                for row in range(2, ws_detailed.max_row + 1):  # Start from row 2 to skip header
-                    for col in range(3, ws_detailed.max_column + 1):  # Start from column 3 (FILE_NAME1)
-                        cell = ws_detailed.cell(row=row, column=col)
-                        if cell.value:  # If there's a filename
-                            file_path = file_paths_dict.get(cell.value)  # Use dictionary get() method
-                            if file_path:
-                                cell.hyperlink = file_path
-                                cell.font = Font(color="0000FF", underline="single")  # Blue, underlined
-
-                # Add hyperlinks to File_Summary sheet
-                ws_summary = wb['File_Summary']
-                path_col = None
-                # Find the PATH column
-                for col in range(1, ws_summary.max_column + 1):
-                    if ws_summary.cell(row=1, column=col).value == 'PATH':
-                        path_col = col
-                        break
+            report = build_duplicate_report(store, file_summary, len(error_files), self.barcode_matcher,
+                                            duplicate_groups, tables={'Run_Metrics': governor.metrics()})
+            timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+            output_filename = os.path.join(get_report_folder(), f"ICON_Duplicates_{timestamp}.{self.report_format}")
+            paths = self.create_report_sink().write(report, output_filename)
+            self.logger.info(f"Report written to {', '.join(paths)}")
 
-                if path_col:
-                    for row in range(2, ws_summary.max_row + 1):
-                        cell = ws_summary.cell(row=row, column=path_col)
-                        if cell.value:
-                            cell.hyperlink = cell.value
-                            cell.font = Font(color="0000FF", underline="single")
+            success_msg = f"Found {len(duplicate_groups)} duplicate ICON barcodes. "
+            if error_files:
+                success_msg += f"\n\nWarning: {len(error_files)} file(s) were skipped due to errors. "
+            success_msg += f"\nReport saved to '{output_filename}'"
+            if len(paths) > 1:
+                success_msg += f" and {len(paths) - 1} more file(s) next to it"
 
-                # Save the workbook with hyperlinks
-                wb.save(output_filename)
+            self.update_status(100, "Saved.")
+            self.queue.put(("complete", True, success_msg, output_filename))
+            self.root.after(1000, lambda: self.update_status(0, ""))
 
-                success_msg = f"Found {len(duplicate_barcodes['BARCODE'].unique())} duplicate ICON barcodes. "
-                if error_files:
-                    success_msg += f"\n\nWarning: {len(error_files)} file(s) were skipped due to errors. "
-                success_msg += f"\nReport saved to '{output_filename}'"
+        except Exception as e:
+            self.logger.error(f"Critical error in export_report: {str(e)}")
+            self.queue.put(("complete", False, f"A critical error occurred: {str(e)}", None))
+            self.root.after(1000, lambda: self.update_status(0, ""))
+        finally:
+            governor.stop()
 
+    def export_delta_report(self):
+        """
+        Write the duplicates that are new, changed or resolved since the previous
+        run over the same folders, then make this run the baseline for the next one.
+        Exporting the same scan again compares with the same baseline.
+        """
+        result = self.scan_result
+        fingerprint = result['fingerprint']
+        try:
+            if 'baseline' not in result:
+                result['baseline'] = self.baseline_fingerprint(fingerprint)
+            path, previous = result['baseline']
+            if previous is None:
+                save_fingerprint(path, fingerprint)
                 self.update_status(100, "Saved.")
-                self.queue.put(("complete", True, success_msg, output_filename))
-                self.root.after(1000, lambda: self.update_status(0, ""))
+                self.queue.put(("complete", True, "There is no previous run over these folders to compare with yet. "
+                                                  "This run is now the baseline for the next delta export.", None))
+                return
 
-            else:
-                msg = "No valid barcodes found in processable files."
-                if error_files:
-                    msg += f"\n\nWarning: {len(error_files)} file(s) were skipped due to errors:"
-                    for error in error_files:
-                        msg += f"\n- {error}"
-                self.update_status(100, "")
-                self.queue.put(("complete", True, msg, None))  # Add None as filename
-                self.root.after(1000, lambda: self.update_status(0, ""))
+            self.update_status(30, "Comparing with the previous run...")
+            delta = diff_fingerprints(previous, fingerprint)
+            timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+            output_filename = os.path.join(get_report_folder(), f"ICON_Delta_{timestamp}.{self.report_format}")
+            summary = save_delta_report(delta, previous, fingerprint, result['store'], output_filename,
+                                        self.create_report_sink())
+            save_fingerprint(path, fingerprint)
 
+            success_msg = (
+                f"Since the previous run ({previous['created']}):\n"
+                f"New duplicates: {summary['New Duplicates']}\n"
+                f"Changed duplicates: {summary['Changed Duplicates']}\n"
+                f"Resolved duplicates: {summary['Resolved Duplicates']}\n"
+                f"Files added: {summary['Files Added']}, removed: {summary['Files Removed']}"
+                f"\nReport saved to '{output_filename}'"
+            )
+            self.update_status(100, "Saved.")
+            self.queue.put(("complete", True, success_msg, output_filename))
         except Exception as e:
+            self.logger.error(f"Critical error in export_delta_report: {str(e)}")
             self.queue.put(("complete", False, f"A critical error occurred: {str(e)}", None))
+        finally:
             self.root.after(1000, lambda: self.update_status(0, ""))
 
     def update_status(self, progress, status):
         self.queue.put(("status", progress, status))
 
+    def publish_progress(self, event):
+        """ProgressTracker sink: forward the aggregated event to the Tk queue"""
+        self.update_status(event.percent, format_progress(event))
+
+    def create_progress_tracker(self):
+        return ProgressTracker(
+            sinks=[self.publish_progress, LogProgressSink(self.logger)],
+            interval=self.progress_interval
+        )
+
     def check_queue(self):
+        # Keep a single polling loop however many times this is called
+        if self.queue_poll_id is not None:
+            self.root.after_cancel(self.queue_poll_id)
+            self.queue_poll_id = None
+
+        # Coalesce status messages: only the newest one is drawn per poll
+        latest_status = None
         while not self.queue.empty():
             msg = self.queue.get()
             if msg[0] == "status":
-                _, progress, status = msg
-                self.progress["value"] = progress
-                self.status_var.set(status)
+                latest_status = msg
+            elif msg[0] == "results":
+                self.results_view.update_rows(msg[1])
+            elif msg[0] == "job":
+                self.update_job_row(msg[1])
+            elif msg[0] == "results_clear":
+                self.results_view.clear()
+            elif msg[0] == "discovered":
+                self.add_file_rows(msg[1])
+                self.file_label.config(text=f"Searching... {len(self.selected_files)} file(s) found")
+            elif msg[0] == "discovery_done":
+                latest_status = None
+                self.finish_discovery(msg[1], msg[2])
             elif msg[0] == "complete":
+                latest_status = None
                 _, success, message, filename = msg
                 self.enable_controls()
                 
@@ -696,15 +5974,289 @@ class DuplicateFinderApp:
 
                 self.progress["value"] = 0
                 self.status_var.set("")
-            
-            self.root.update_idletasks()
-        
-        self.root.after(100, self.check_queue)
+
+        if latest_status:
+            _, progress, status = latest_status
+            self.progress["value"] = progress
+            self.status_var.set(status)
+        self.root.update_idletasks()
+
+        self.queue_poll_id = self.root.after(100, self.check_queue)
 
 def open_file(filepath):
     os.startfile(filepath)
 
+def parse_size(text):
+    """Byte count from '2048', '10K', '2M' or '1G'"""
+    units = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+    text = text.strip().upper().rstrip('B')
+    try:
+        if text and text[-1] in units:
+            return int(float(text[:-1]) * units[text[-1]])
+        return int(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid size: '{text}'")
+
+
+def parse_count(text):
+    """Non-negative whole number for counts such as --stop-after"""
+    try:
+        value = int(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid count: '{text}'")
+    if value < 0:
+        raise argparse.ArgumentTypeError(f"must be 0 or more: '{text}'")
+    return value
+
+
+def parse_date(text):
+    """Timestamp of local midnight on a YYYY-MM-DD date"""
+    try:
+        return datetime.datetime.strptime(text, "%Y-%m-%d").timestamp()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid date (expected YYYY-MM-DD): '{text}'")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="ICON Barcode Duplicate Finder. Run without arguments to open the GUI."
+    )
+    parser.add_argument("paths", nargs="*", help="Excel files or folders to scan headlessly")
+    parser.add_argument("--patterns", help="Barcode pattern JSON file (default: barcode_patterns.json)")
+    parser.add_argument("--sheet", help="Sheet to scan in every file (default: first sheet)")
+    parser.add_argument("--triage", action="store_true",
+                        help="Estimate distinct barcodes and file overlaps with HyperLogLog sketches")
+    parser.add_argument("--gatekeep", action="store_true",
+                        help="Stop at the first cross-file duplicates involving a positional (new) file; "
+                             "exit code 1 if any are found")
+    parser.add_argument("--stop-after", type=parse_count, default=1,
+                        help="Number of conflicts to report before a --gatekeep check stops, 0 for all (default: 1)")
+    parser.add_argument("--reference", nargs="+", metavar="PATH",
+                        help="Allocation files/folders; the positional paths are checked against them "
+                             "(reconciliation report, or with --gatekeep an early-exit check)")
+    parser.add_argument("--output",
+                        help="Report file for --reference/--coordinator/--from-shards/--delta "
+                             "(default: Desktop/DUPLICATE_BARCODES)")
+    parser.add_argument("--format", choices=list(REPORT_SINKS), default='xlsx',
+                        help="Duplicate report format for --coordinator/--from-shards: xlsx, or one row per "
+                             "location as csv or parquet (needs pyarrow) (default: xlsx)")
+    parser.add_argument("--rows-per-file", type=int, metavar="N",
+                        help="Continue an xlsx duplicate report in numbered files after N rows")
+    parser.add_argument("--delta", action="store_true",
+                        help="Report only duplicates that are new, changed or resolved since the previous --delta run")
+    parser.add_argument("--fingerprint", metavar="FILE",
+                        help="Run fingerprint read and replaced by --delta (default: one "
+                             "Desktop/DUPLICATE_BARCODES/last_run_<key>.icfp per selection of files and sheet)")
+    parser.add_argument("--coordinator", metavar="[HOST:]PORT",
+                        help="Hand the positional paths out in shards to --worker processes and merge their results "
+                             "(HOST defaults to 127.0.0.1; any other address needs --token)")
+    parser.add_argument("--shard-size", type=int, default=20,
+                        help="Files per shard for --coordinator (default: 20)")
+    parser.add_argument("--lease-timeout", type=float, default=120.0,
+                        help="Seconds without a heartbeat before a shard is reassigned (default: 120)")
+    parser.add_argument("--worker", metavar="URL",
+                        help="Scan shards leased from the coordinator at URL (e.g. http://server:8765)")
+    parser.add_argument("--worker-name",
+                        help="Stable worker name, so a restarted worker hands back its shard at once")
+    parser.add_argument("--token", help="Shared secret between the coordinator and its workers")
+    parser.add_argument("--extract-shard", metavar="FILE",
+                        help="Scan the positional Excel paths once and save their barcodes as a shard file")
+    parser.add_argument("--merge-shards", metavar="FILE",
+                        help="Merge the positional shard files (or folders of them) into one shard file")
+    parser.add_argument("--from-shards", action="store_true",
+                        help="Find duplicates across the positional shard files without reading any Excel file")
+    parser.add_argument("--shard-info", action="store_true", help="Describe the positional shard files")
+    parser.add_argument("--include", action="append", metavar="GLOB",
+                        help="Only scan files matching this glob (repeatable; default: *.xlsx, *.xls, *.xlsm)")
+    parser.add_argument("--exclude", action="append", metavar="GLOB",
+                        help="Skip files and folders matching this glob (repeatable); "
+                             "globs with '/' match the path below each folder")
+    parser.add_argument("--min-size", type=parse_size, help="Skip files smaller than this (e.g. 10K, 2M)")
+    parser.add_argument("--max-size", type=parse_size, help="Skip files larger than this (e.g. 500M)")
+    parser.add_argument("--modified-after", type=parse_date, metavar="YYYY-MM-DD",
+                        help="Skip files last modified before this date")
+    parser.add_argument("--modified-before", type=parse_date, metavar="YYYY-MM-DD",
+                        help="Skip files last modified on or after this date")
+    parser.add_argument("--no-archives", action="store_true", help="Do not look inside .zip bundles")
+    parser.add_argument("--quiet", action="store_true", help="Do not show progress on the console")
+    parser.add_argument("--sketch-store",
+                        help="JSON file for reusing and merging triage sketches across runs")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    if args.worker:
+        logger = configure_logging()
+        completed = run_shard_worker(
+            args.worker, load_barcode_matcher(args.patterns), worker_name=args.worker_name,
+            token=args.token, logger=logger
+        )
+        print(f"Worker finished: {completed} shard(s) scanned.")
+        return 0
+
+    if not args.paths:
+        root = tk.Tk()
+        app = DuplicateFinderApp(root)
+        root.mainloop()
+        return 0
+
+    logger = configure_logging()
+
+    if args.merge_shards or args.from_shards or args.shard_info:
+        shard_files = collect_shard_files(args.paths)
+        if not shard_files:
+            print("No shard files found.")
+            return 1
+        try:
+            if args.shard_info:
+                for shard_file in shard_files:
+                    print(format_shard_info(shard_file))
+                return 0
+            if args.merge_shards:
+                summary = merge_shard_files(shard_files, args.merge_shards, logger)
+                print(f"Merged {len(shard_files)} shards: {summary['barcodes']} barcodes from "
+                      f"{summary['files']} files into '{args.merge_shards}' ({summary['shard_bytes']} bytes)")
+                return 0
+            result = find_duplicates_in_shards(shard_files)
+        except ValueError as e:
+            print(f"Error: {str(e)}")
+            return 1
+        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        output_filename = args.output or os.path.join(get_report_folder(), f"ICON_Duplicates_{timestamp}.{args.format}")
+        metrics = save_sharded_report(result, output_filename, create_report_sink(args.format, args.rows_per_file))
+        for metric, value in metrics.items():
+            print(f"{metric}: {value}")
+        print(f"Report saved to '{output_filename}'")
+        return 0
+
+    matcher = load_barcode_matcher(args.patterns)
+    discovery = FileDiscovery(
+        include=args.include or DEFAULT_INCLUDE,
+        exclude=DEFAULT_EXCLUDE + tuple(args.exclude or ()),
+        min_size=args.min_size,
+        max_size=args.max_size,
+        modified_after=args.modified_after,
+        modified_before=args.modified_before,
+        archives=not args.no_archives,
+        logger=logger
+    )
+    files = collect_excel_files(args.paths, discovery)
+    logger.info(format_discovery_stats(discovery.stats))
+    if not files:
+        print("No Excel files found.")
+        return 1
+    file_sheets = [(file, args.sheet) for file in files]
+
+    sinks = [LogProgressSink(logger)]
+    if not args.quiet:
+        sinks.append(ConsoleProgressSink())
+    tracker = ProgressTracker(sinks=sinks)
+
+    if args.triage:
+        store = TriageSketchStore(args.sketch_store) if args.sketch_store else None
+        with tracker:
+            result = run_triage(file_sheets, matcher, store=store, progress=tracker, logger=logger)
+        print(format_triage_summary(result))
+        return 0
+
+    reference_files = []
+    if args.reference:
+        reference_files = collect_excel_files(args.reference, discovery)
+        if not reference_files:
+            print("No reference Excel files found.")
+            return 1
+
+    if args.reference and not args.gatekeep:
+        with tracker:
+            result = reconcile_files(
+                [(file, args.sheet) for file in reference_files], file_sheets, matcher,
+                progress=tracker, logger=logger
+            )
+        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        output_filename = args.output or os.path.join(get_report_folder(),
+                                                      f"ICON_Reconciliation_{timestamp}.{args.format}")
+        metrics = save_reconciliation_report(result, output_filename, create_report_sink(args.format, args.rows_per_file))
+        for metric, value in metrics.items():
+            print(f"{metric}: {value}")
+        print(f"Report saved to '{output_filename}'")
+        return 0
+
+    if args.extract_shard:
+        with tracker:
+            summary = extract_shard(file_sheets, matcher, args.extract_shard, progress=tracker, logger=logger)
+        ratio = summary['shard_bytes'] / summary['source_bytes'] if summary['source_bytes'] else 0
+        print(f"Shard saved to '{args.extract_shard}': {summary['barcodes']} barcodes from {summary['files']} files, "
+              f"{summary['shard_bytes']} bytes ({ratio:.1%} of the source workbooks)")
+        return 0
+
+    if args.coordinator:
+        host, _, port = args.coordinator.rpartition(':')
+        try:
+            coordinator = ShardCoordinator(
+                file_sheets, shard_size=args.shard_size, host=host or '127.0.0.1', port=int(port),
+                token=args.token, lease_timeout=args.lease_timeout, logger=logger
+            )
+        except ValueError as e:
+            print(f"Error: {str(e)}")
+            return 1
+        with tracker:
+            result = coordinator.run(progress=tracker)
+        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        output_filename = args.output or os.path.join(get_report_folder(), f"ICON_Duplicates_{timestamp}.{args.format}")
+        metrics = save_sharded_report(result, output_filename, create_report_sink(args.format, args.rows_per_file))
+        for metric, value in metrics.items():
+            print(f"{metric}: {value}")
+        print(f"Report saved to '{output_filename}'")
+        return 0
+
+    if args.delta:
+        # Check the baseline before spending a whole scan on it
+        baseline = baseline_key(args.paths)
+        fingerprint_file = args.fingerprint or default_fingerprint_path(baseline)
+        try:
+            previous = load_fingerprint(fingerprint_file) if os.path.exists(fingerprint_file) else None
+        except (OSError, ValueError) as e:
+            print(f"Error: cannot use the previous run fingerprint: {str(e)}")
+            return 1
+        store = LocationStore()
+        with tracker:
+            scan_files(store, file_sheets, matcher, progress=tracker, logger=logger)
+        fingerprint = run_fingerprint(store, baseline, files)
+        if previous is None:
+            save_fingerprint(fingerprint_file, fingerprint)
+            print(f"No previous run over these folders to compare with; {len(fingerprint['keys'])} duplicate barcodes "
+                  f"recorded in '{fingerprint_file}'.")
+            return 0
+        delta = diff_fingerprints(previous, fingerprint)
+        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        output_filename = args.output or os.path.join(get_report_folder(), f"ICON_Delta_{timestamp}.{args.format}")
+        summary = save_delta_report(delta, previous, fingerprint, store, output_filename,
+                                    create_report_sink(args.format, args.rows_per_file))
+        save_fingerprint(fingerprint_file, fingerprint)
+        for metric, value in summary.items():
+            print(f"{metric}: {value}")
+        print(f"Report saved to '{output_filename}'")
+        return 0
+
+    if args.gatekeep:
+        errors = []
+        selected = set(files)
+        reference_files = [file for file in reference_files if file not in selected]
+        with tracker:
+            groups = find_first_duplicates(
+                [(file, args.sheet) for file in reference_files] + file_sheets, matcher, stop_after=args.stop_after,
+                cross_file_only=True, reference_files=reference_files, errors=errors, progress=tracker, logger=logger
+            )
+        print(format_conflicts(groups, errors))
+        return 1 if groups else 0
+
+    print("Choose a headless mode (e.g. --triage).")
+    return 2
+
+
 if __name__ == "__main__":
-    root = tk.Tk()
-    app = DuplicateFinderApp(root)
-    root.mainloop()
+    import multiprocessing
+    multiprocessing.freeze_support()  # Scan workers of a frozen (PyInstaller) build
+    sys.exit(main())
@@ -0,0 +1,433 @@
+"""
+Benchmarks for the duplicate finder engine.
+
+Run every benchmark:   python benchmarks.py
+Run selected ones:     python benchmarks.py store patterns
+"""
+import importlib.util
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+FINDER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "DUPLICATE_FINDER_V2.3.5-beta.py")
+
+_finder = None
+
+
+def load_finder():
+    """Import the finder script as a module (its file name is not importable directly)"""
+    global _finder
+    if _finder is None:
+        spec = importlib.util.spec_from_file_location("duplicate_finder", FINDER_SCRIPT)
+        _finder = importlib.util.module_from_spec(spec)
+        sys.modules[spec.name] = _finder  # Lets pickle (worker processes) resolve its classes
+        spec.loader.exec_module(_finder)
+    return _finder
+
+
+def synthetic_barcodes(count, duplicate_ratio=0.1):
+    """Yield (barcode, barcode_type) in the three ICON formats with a share of repeats"""
+    distinct = max(1, int(count * (1 - duplicate_ratio)))
+    for i in range(count):
+        n = i % distinct
+        kind = n % 3
+        if kind == 0:
+            yield f"ICON{5001000000000 + n:013d}", 'ICON-17'
+        elif kind == 1:
+            yield f"ICON500{chr(65 + n % 26)}{n:010d}", 'ICON-18'
+        else:
+            yield f"ICON50010{chr(65 + n % 26)}{n:010d}", 'ICON-20'
+
+
+def bench_location_store(count=500_000, files=200):
+    """Memory per location: list of dicts (previous layout) versus LocationStore"""
+    finder = load_finder()
+    paths = [os.path.join("\\\\server", "share", "BACODE ALLOWCATED", f"file_{i}.xlsx") for i in range(files)]
+    names = [os.path.basename(path) for path in paths]
+    barcodes = list(synthetic_barcodes(count))
+
+    tracemalloc.start()
+    records = []
+    for i, (barcode, barcode_type) in enumerate(barcodes):
+        records.append({
+            'BARCODE': ''.join(barcode),  # Fresh string, as read from a workbook
+            'FILE_NAME': names[i % files],
+            'FORMAT': barcode_type,
+            'FILE_PATH': paths[i % files]
+        })
+    dict_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del records
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    store = finder.LocationStore()
+    file_ids = [store.intern_file(path) for path in paths]
+    sheet_id = store.intern_sheet("Sheet1")
+    for i, (barcode, barcode_type) in enumerate(barcodes):
+        store.add(barcode, barcode_type, file_ids[i % files], sheet_id, i % 130000 + 2, 2)
+    fill_time = time.perf_counter() - start
+    store_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    groups = store.duplicate_groups()
+    group_time = time.perf_counter() - start
+
+    print(f"store: {count:,} locations, {len(groups):,} duplicate groups")
+    print(f"  list of dicts:   {dict_bytes / count:8.1f} bytes/location")
+    print(f"  LocationStore:   {store.nbytes() / len(store):8.1f} bytes/location (columns)")
+    print(f"                   {store_bytes / count:8.1f} bytes/location (including interned tables)")
+    print(f"  fill: {fill_time:.2f}s, group: {group_time:.2f}s")
+
+
+def synthetic_families(count):
+    """Build `count` barcode formats spread over families with distinct prefixes and lengths"""
+    families = {}
+    for i in range(count):
+        family = f"MFR{i // 8:03d}"
+        digits = 8 + i % 8
+        families.setdefault(family, {})[f"{family}-{i % 8}"] = rf'^{family}[A-Z]\d{{{digits}}}$'
+    return families
+
+
+def bench_pattern_matcher(sizes=(3, 30, 300), values=200_000):
+    """Detection throughput as the number of configured formats grows"""
+    finder = load_finder()
+    cells = []
+    for i in range(values):
+        kind = i % 4
+        if kind == 0:
+            cells.append(f"ICON{5001000000000 + i:013d}")
+        elif kind == 1:
+            cells.append(f"MFR{i % 37:03d}Q{i:0{8 + i % 8}d}")
+        elif kind == 2:
+            cells.append("S.NO.")
+        else:
+            cells.append(i)
+
+    for size in sizes:
+        families = dict(finder.BARCODE_PATTERNS)
+        families.update(synthetic_families(size - 3))
+        matcher = finder.BarcodeMatcher(families)
+        start = time.perf_counter()
+        hits = sum(1 for value in cells if finder.detect_barcode(value, matcher)[0])
+        elapsed = time.perf_counter() - start
+        print(f"patterns: {size:4d} formats, {values / elapsed:12,.0f} cells/s ({hits:,} hits)")
+
+
+def bench_progress_overhead(repeats=3):
+    """Scan time of one example workbook with and without a live ProgressTracker"""
+    finder = load_finder()
+    matcher = finder.load_barcode_matcher()
+    file_path = os.path.join(os.path.dirname(FINDER_SCRIPT), "EXAMPLES", "BACODE ALLOWCATED",
+                             "500W - 126000 NOS SOLAR (MSEDCL).xlsx")
+
+    def scan(tracker):
+        best = None
+        for _ in range(repeats):
+            store = finder.LocationStore()
+            start = time.perf_counter()
+            if tracker is not None:
+                tracker.begin_file(file_path)
+            finder.scan_file_into_store(store, file_path, file_path, None, matcher, tracker)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best
+
+    baseline = scan(None)
+    with finder.ProgressTracker(sinks=[lambda event: None], interval=0.05) as tracker:
+        tracker.set_files([file_path])
+        tracked = scan(tracker)
+    print(f"progress: without tracker {baseline:.2f}s, with tracker {tracked:.2f}s "
+          f"({(tracked / baseline - 1) * 100:+.1f}%)")
+
+
+def bench_xlsx_reader(repeats=3):
+    """Shared-string fast path versus openpyxl read-only mode on the example workbooks"""
+    finder = load_finder()
+    matcher = finder.load_barcode_matcher()
+    folder = os.path.join(os.path.dirname(FINDER_SCRIPT), "EXAMPLES", "BACODE ALLOWCATED")
+    files = [
+        ("shared strings", os.path.join(folder, "550W - 30600 NOS ANNU (MSEDCL).xlsx")),
+        ("inline strings", os.path.join(folder, "500W - 126000 NOS SOLAR (MSEDCL).xlsx")),
+    ]
+
+    def openpyxl_scan(file_path):
+        return sum(1 for _, _, value in finder.iter_sheet_values(file_path, file_path)
+                   if finder.detect_barcode(value, matcher)[0])
+
+    def fast_scan(file_path):
+        return sum(1 for _ in finder.iter_sheet_barcodes(file_path, file_path, None, matcher))
+
+    def fast_count(file_path):
+        return sum(count for _, count in finder.count_sheet_barcodes(file_path, file_path, None, matcher).values())
+
+    for label, file_path in files:
+        timings = []
+        for scan in (openpyxl_scan, fast_scan, fast_count):
+            best = None
+            for _ in range(repeats):
+                start = time.perf_counter()
+                hits = scan(file_path)
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            timings.append(best)
+        print(f"xlsx ({label}, {hits:,} barcodes): openpyxl {timings[0]:.2f}s, "
+              f"fast path {timings[1]:.2f}s ({timings[0] / timings[1]:.1f}x), counts only {timings[2]:.2f}s")
+
+
+def bench_xls_reader(sheets=6, rows=20_000):
+    """
+    Legacy .xls: pandas/xlrd (loads every sheet) versus XlsSheetReader (opens
+    on demand and loads only the chosen sheet) on a synthetic multi-sheet
+    workbook. Writing the workbook needs xlwt.
+    """
+    finder = load_finder()
+    matcher = finder.load_barcode_matcher()
+    try:
+        import xlwt
+    except ImportError:
+        print("xls: skipped (pip install xlwt to generate the test workbook)")
+        return
+
+    with tempfile.TemporaryDirectory() as folder:
+        file_path = os.path.join(folder, "dispatch.xls")
+        workbook = xlwt.Workbook()
+        for sheet_index in range(sheets):
+            sheet = workbook.add_sheet(f"Dispatch {sheet_index + 1}")
+            for row in range(rows):
+                sheet.write(row, 0, row + 1)
+                sheet.write(row, 1, f"ICON{5001000000000 + sheet_index * rows + row:013d}")
+                sheet.write(row, 2, "Dispatched")
+        workbook.save(file_path)
+        print(f"xls: {sheets} sheets x {rows:,} rows, {os.path.getsize(file_path) / 1024 / 1024:.1f} MB")
+
+        def pandas_names():
+            import pandas
+            with pandas.ExcelFile(file_path, engine='xlrd') as xls:
+                return xls.sheet_names
+
+        def pandas_scan():
+            return sum(1 for _, _, value in finder.iter_sheet_values(file_path, file_path, "Dispatch 2")
+                       if finder.detect_barcode(value, matcher)[0])
+
+        def reader_scan():
+            return sum(1 for _ in finder.iter_sheet_barcodes(file_path, file_path, "Dispatch 2", matcher))
+
+        for label, previous, current in (
+                ("sheet names", pandas_names, lambda: finder.read_sheet_names(file_path)),
+                ("scan one sheet", pandas_scan, reader_scan)):
+            results = []
+            for run in (previous, current):
+                start = time.perf_counter()
+                value = run()
+                elapsed = time.perf_counter() - start
+                tracemalloc.start()  # Separate run: tracing slows pure-Python xlrd several times
+                run()
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                results.append((elapsed, peak, value))
+            assert results[0][2] == results[1][2]
+            (old_time, old_peak, _), (new_time, new_peak, _) = results
+            print(f"  {label}: pandas/xlrd {old_time:.2f}s {old_peak / 1024 / 1024:.0f} MB peak, "
+                  f"on demand {new_time:.2f}s {new_peak / 1024 / 1024:.0f} MB peak ({old_time / new_time:.1f}x)")
+
+
+def bench_discovery(fanout=(8, 8, 8), files_per_dir=20, latency=0.005):
+    """
+    Folder discovery: a single os.walk (previous select_folder) versus FileDiscovery
+    on a synthetic tree, on local disk and with a simulated network share round
+    trip of `latency` seconds per directory listing.
+    """
+    finder = load_finder()
+    with tempfile.TemporaryDirectory() as root:
+        directories = [root]
+        for width in fanout:
+            directories = [os.path.join(parent, f"d{i}") for parent in directories for i in range(width)]
+            for directory in directories:
+                os.mkdir(directory)
+        for directory in directories:
+            for i in range(files_per_dir):
+                name = f"~$f{i}.xlsx" if i == 0 else f"f{i}.{('xlsx', 'xls', 'pdf', 'txt')[i % 4]}"
+                open(os.path.join(directory, name), "wb").close()
+
+        total = len(directories) * files_per_dir
+        print(f"discovery: {total:,} files in {len(directories):,} leaf folders")
+        local_scandir = os.scandir
+
+        def remote_scandir(path):
+            time.sleep(latency)
+            return local_scandir(path)
+
+        for label, scandir in (("local", local_scandir), (f"{latency * 1000:g} ms/listing", remote_scandir)):
+            os.scandir = scandir  # os.walk looks scandir up on the os module too
+            try:
+                start = time.perf_counter()
+                walked = set()
+                for folder, _, files in os.walk(root):
+                    for file in files:
+                        full_path = os.path.abspath(os.path.join(folder, file))
+                        if finder.is_valid_excel_file(full_path):
+                            walked.add(full_path)
+                walk_time = time.perf_counter() - start
+                print(f"  {label}: os.walk {walk_time:.2f}s ({total / walk_time:,.0f} files/s)", end="")
+                for workers in (1, 16):
+                    discovery = finder.FileDiscovery(workers=workers)
+                    assert set(discovery.collect([root])) == walked
+                    seconds = discovery.stats['seconds']
+                    print(f", FileDiscovery x{workers} {seconds:.2f}s ({discovery.stats['files'] / seconds:,.0f} files/s)",
+                          end="")
+                print()
+            finally:
+                os.scandir = local_scandir
+
+
+def bench_report_sinks(count=200_000, files=50):
+    """Write time and output size of the same duplicate report through each report sink"""
+    finder = load_finder()
+    store = finder.LocationStore()
+    file_ids = [store.intern_file(os.path.join("\\\\server", "share", f"file_{i}.xlsx")) for i in range(files)]
+    sheet_id = store.intern_sheet(None)
+    for i, (barcode, barcode_type) in enumerate(synthetic_barcodes(count, duplicate_ratio=0.5)):
+        store.add(barcode, barcode_type, file_ids[i % files], sheet_id, i % 60000 + 2, 2)
+    groups = store.duplicate_groups()
+    locations = sum(len(indices) for _, _, indices in groups)
+    print(f"report: {len(groups):,} duplicate groups, {locations:,} locations")
+
+    with tempfile.TemporaryDirectory() as folder:
+        for name in finder.REPORT_SINKS:
+            report = {
+                'groups': finder.iter_store_groups(store, groups),
+                'max_copies': max(len(indices) for _, _, indices in groups),
+                'file_summary': [{'FILE_NAME': os.path.basename(path), 'PATH': path} for path in store.files],
+                'summary': {'Duplicate Barcodes': len(groups)}
+            }
+            start = time.perf_counter()
+            try:
+                paths = finder.create_report_sink(name).write(report, os.path.join(folder, f"report.{name}"))
+            except RuntimeError as e:
+                print(f"  {name:8s} skipped: {e}")
+                continue
+            elapsed = time.perf_counter() - start
+            size = sum(os.path.getsize(path) for path in paths)
+            print(f"  {name:8s} {elapsed:6.2f}s ({locations / elapsed:10,.0f} locations/s), {size / 1024 / 1024:6.1f} MB")
+
+
+def bench_archive_bundles():
+    """
+    The EXAMPLES workbooks as a zipped bundle (challans in a nested zip): extracting
+    it to a folder and scanning that (the previous workflow) versus scanning it in place.
+    """
+    import zipfile
+    finder = load_finder()
+    matcher = finder.load_barcode_matcher()
+    examples = os.path.join(os.path.dirname(FINDER_SCRIPT), "EXAMPLES")
+    files = finder.collect_excel_files([examples])
+
+    def scan(paths):
+        store = finder.LocationStore()
+        file_sheets = [(file_path, None) for file_path in finder.collect_excel_files(paths)]
+        finder.scan_files(store, file_sheets, matcher)
+        return store
+
+    with tempfile.TemporaryDirectory() as folder:
+        bundle = os.path.join(folder, "bundle.zip")
+        nested = io.BytesIO()
+        with zipfile.ZipFile(nested, "w") as inner, zipfile.ZipFile(bundle, "w", zipfile.ZIP_DEFLATED) as outer:
+            for file_path in files:
+                member = os.path.relpath(file_path, examples).replace(os.sep, "/")
+                (inner if member.startswith("CHALLAN/") else outer).write(file_path, member)
+        with zipfile.ZipFile(bundle, "a", zipfile.ZIP_DEFLATED) as outer:
+            outer.writestr("CHALLAN/challans.zip", nested.getvalue())
+        print(f"bundles: {len(files)} workbooks, {os.path.getsize(bundle) / 1024 / 1024:.1f} MB zipped")
+
+        start = time.perf_counter()
+        extracted = os.path.join(folder, "extracted")
+        with zipfile.ZipFile(bundle) as outer:
+            outer.extractall(extracted)
+            with zipfile.ZipFile(os.path.join(extracted, "CHALLAN", "challans.zip")) as inner:
+                inner.extractall(extracted)
+        os.remove(os.path.join(extracted, "CHALLAN", "challans.zip"))
+        written = sum(os.path.getsize(os.path.join(root, name))
+                      for root, _, names in os.walk(extracted) for name in names)
+        expected = len(scan([extracted]))
+        print(f"  extract then scan {time.perf_counter() - start:6.2f}s, {written / 1024 / 1024:.1f} MB written to disk")
+
+        start = time.perf_counter()
+        found = len(scan([bundle]))
+        assert found == expected, (found, expected)
+        print(f"  scan in place     {time.perf_counter() - start:6.2f}s, nothing written ({found:,} barcodes)")
+
+
+STARTUP_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import importlib.util
+spec = importlib.util.spec_from_file_location("duplicate_finder", sys.argv[1])
+finder = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(finder)
+result = {"import": time.perf_counter() - start, "first_paint": None}
+try:
+    root = finder.tk.Tk()
+    app = finder.DuplicateFinderApp(root)
+    root.update()
+    result["first_paint"] = time.perf_counter() - start
+except finder.tk.TclError:
+    app = None  # No display available
+store = finder.LocationStore()
+matcher = app.barcode_matcher if app else finder.load_barcode_matcher()
+finder.scan_file_into_store(store, sys.argv[2], sys.argv[2], None, matcher)
+result["first_scan"] = time.perf_counter() - start
+print(json.dumps(result))
+"""
+
+
+def bench_startup(repeats=3):
+    """Cold start: script import, time to first paint and time to first scan (fresh interpreter each run)"""
+    file_path = os.path.join(os.path.dirname(FINDER_SCRIPT), "EXAMPLES", "CHALLAN", "13.12.24 CHN-2177.xlsx")
+    runs = []
+    for _ in range(repeats):
+        output = subprocess.run(
+            [sys.executable, "-c", STARTUP_PROBE, FINDER_SCRIPT, file_path],
+            capture_output=True, text=True, check=True
+        ).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+
+    def best(key):
+        values = [run[key] for run in runs if run[key] is not None]
+        return f"{min(values):.2f}s" if values else "n/a (no display)"
+
+    print(f"startup: import {best('import')}, first paint {best('first_paint')}, first scan {best('first_scan')}")
+
+
+BENCHMARKS = {
+    'store': bench_location_store,
+    'patterns': bench_pattern_matcher,
+    'progress': bench_progress_overhead,
+    'startup': bench_startup,
+    'xlsx': bench_xlsx_reader,
+    'xls': bench_xls_reader,
+    'discovery': bench_discovery,
+    'report': bench_report_sinks,
+    'bundles': bench_archive_bundles,
+}
+
+
+def main(argv=None):
+    names = (argv if argv is not None else sys.argv[1:]) or list(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            print(f"Unknown benchmark '{name}'. Available: {', '.join(BENCHMARKS)}")
+            return 2
+        BENCHMARKS[name]()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
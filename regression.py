@@ -0,0 +1,302 @@
+"""
+End-to-end regression and performance-budget check on the EXAMPLES corpus.
+
+Check the current engine:   python regression.py
+Record a new golden result: python regression.py --update-golden
+Keep a history of runs:     python regression.py --history regression_history.jsonl
+
+The duplicate groups found in EXAMPLES are compared with regression_golden.json
+(every location of every group, plus per-file and per-format counts), and the
+time, peak memory and throughput of each phase are compared with the limits in
+regression_budget.json. The exit code is 1 if either check fails. Workbook
+layouts the fast readers once got wrong are rebuilt and checked against
+openpyxl first.
+"""
+import argparse
+import datetime
+import hashlib
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+import zipfile
+
+from benchmarks import load_finder
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+CORPUS = os.path.join(ROOT, "EXAMPLES")
+GOLDEN_FILE = os.path.join(ROOT, "regression_golden.json")
+BUDGET_FILE = os.path.join(ROOT, "regression_budget.json")
+GOLDEN_VERSION = 1
+PHASE_UNITS = {'discovery': 'files', 'scan': 'barcodes', 'index': 'locations', 'report': 'locations'}
+
+
+def run_engine(report_format='csv', isolated=False):
+    """Scan the corpus once, phase by phase; returns (store, file_summary, groups, phase metrics)"""
+    finder = load_finder()
+    matcher = finder.load_barcode_matcher()
+    governor = finder.MemoryGovernor(interval=0.05).start()
+    phases = {}
+
+    def finish(phase, started, amount):
+        seconds = time.perf_counter() - started
+        phases[phase] = {'seconds': seconds, 'amount': amount, 'throughput': amount / seconds if seconds else None}
+
+    try:
+        governor.enter('discovery')
+        started = time.perf_counter()
+        files = sorted(finder.collect_excel_files([CORPUS]))
+        finish('discovery', started, len(files))
+
+        governor.enter('scan')
+        started = time.perf_counter()
+        store = finder.LocationStore()
+        file_sheets = [(file_path, None) for file_path in files]
+        if isolated:
+            file_summary = finder.IsolatedScanner(matcher).scan(store, file_sheets)
+        else:
+            file_summary = finder.scan_files(store, file_sheets, matcher, governor.govern(finder.ReadAheadLoader()))
+        finish('scan', started, len(store))
+        phases['scan']['source_mb'] = sum(os.path.getsize(file_path) for file_path in files) / 1024 ** 2
+
+        governor.enter('index')
+        started = time.perf_counter()
+        groups = store.duplicate_groups()
+        finish('index', started, len(store))
+
+        governor.enter('report')
+        started = time.perf_counter()
+        locations = sum(len(indices) for _, _, indices in groups)
+        with tempfile.TemporaryDirectory() as folder:
+            report = finder.build_duplicate_report(store, file_summary, 0, matcher, groups)
+            finder.create_report_sink(report_format).write(report, os.path.join(folder, f"report.{report_format}"))
+        finish('report', started, locations)
+    finally:
+        governor.stop()
+
+    for phase, stats in governor.stats.items():
+        if phase in phases:
+            phases[phase]['rss_mb'] = stats['rss_peak'] / 1024 ** 2
+    return store, file_summary, groups, phases
+
+
+def _rewrite_sheet(file_path, rewrite):
+    """Copy of a workbook whose first sheet XML has been passed through `rewrite`"""
+    output_path = file_path.replace(".xlsx", "_rewritten.xlsx")
+    with zipfile.ZipFile(file_path) as source, zipfile.ZipFile(output_path, "w", zipfile.ZIP_DEFLATED) as target:
+        for item in source.infolist():
+            data = source.read(item)
+            if item.filename == "xl/worksheets/sheet1.xml":
+                data = rewrite(data)
+            target.writestr(item, data)
+    return output_path
+
+
+def check_readers(rows=5000):
+    """
+    Layouts the shared-string fast path must read exactly as openpyxl does:
+    cells whose r= attribute is not the first one, and cells without r= that
+    only appear after the fast path has started yielding.
+    Returns a list of problems.
+    """
+    from openpyxl import Workbook
+
+    finder = load_finder()
+    matcher = finder.load_barcode_matcher()
+    problems = []
+    with tempfile.TemporaryDirectory() as folder:
+        file_path = os.path.join(folder, "readers.xlsx")
+        workbook = Workbook()
+        sheet = workbook.active
+        for row in range(1, rows + 1):
+            sheet.append([f"line {row}", f"ICON{5000000000000 + row}", 1000000 + row])
+        workbook.save(file_path)
+
+        def attributes_reordered(data):
+            return re.sub(rb'<c r="([A-Z]+[0-9]+)"([^>]*)', rb'<c\2 r="\1"', data)
+
+        def late_cells_without_references(data):
+            cut = data.index(f'<row r="{rows - 100}"'.encode())
+            return data[:cut] + re.sub(rb'<c r="[A-Z]+[0-9]+"', b'<c', data[cut:])
+
+        chunk_size = finder.XlsxSheetReader.CHUNK_SIZE
+        finder.XlsxSheetReader.CHUNK_SIZE = 16 * 1024  # So the late cells land in a later chunk
+        try:
+            for label, rewrite in (("attributes in another order", attributes_reordered),
+                                   ("cells without references late in the sheet", late_cells_without_references)):
+                path = _rewrite_sheet(file_path, rewrite)
+                expected = [
+                    (row, column, str(value).strip().upper())
+                    for row, column, value in finder.iter_sheet_values(path, path)
+                    if finder.detect_barcode(value, matcher)[0]
+                ]
+                found = [found[:3] for found in finder.iter_sheet_barcodes(path, path, None, matcher)]
+                counts = finder.count_sheet_barcodes(path, path, None, matcher)
+                if len(expected) != rows or found != expected:
+                    problems.append(f"reader, {label}: {len(found)} barcodes found, openpyxl finds {len(expected)}")
+                if sum(count for _, count in counts.values()) != len(expected):
+                    problems.append(f"reader counts, {label}: {sum(c for _, c in counts.values())} barcodes, "
+                                    f"openpyxl finds {len(expected)}")
+        finally:
+            finder.XlsxSheetReader.CHUNK_SIZE = chunk_size
+    return problems
+
+
+def corpus_name(file_path):
+    return os.path.relpath(file_path, CORPUS).replace(os.sep, '/')
+
+
+def summarise(store, file_summary, groups):
+    """Golden-file form of a run: counts plus a digest of every group, overall and per file"""
+    group_digest = hashlib.sha256()
+    file_digests = {}
+    for barcode, barcode_type, indices in groups:
+        locations = sorted(
+            (corpus_name(file_path), sheet_name or '', row, column)
+            for file_path, sheet_name, row, column in (store.location(index) for index in indices)
+        )
+        line = f"{barcode}\t{barcode_type}\t" + ";".join(f"{name}!{sheet}!{row}:{column}"
+                                                          for name, sheet, row, column in locations)
+        group_digest.update(line.encode('utf-8') + b"\n")
+        for name in dict.fromkeys(name for name, _, _, _ in locations):
+            digest = file_digests.setdefault(name, [0, hashlib.sha256()])
+            digest[0] += 1
+            digest[1].update(line.encode('utf-8') + b"\n")
+
+    return {
+        'version': GOLDEN_VERSION,
+        'totals': {
+            'files': len(file_summary),
+            'locations': len(store),
+            'unique': store.unique_count(),
+            'duplicate_groups': len(groups),
+            'formats': dict(sorted(store.format_counts().items()))
+        },
+        'files': {
+            corpus_name(entry['PATH']): {'barcodes': entry['BARCODE_COUNT'], 'status': entry['STATUS']}
+            for entry in sorted(file_summary, key=lambda entry: corpus_name(entry['PATH']))
+        },
+        'groups_sha256': group_digest.hexdigest(),
+        'file_groups': {
+            name: {'groups': count, 'sha256': digest.hexdigest()}
+            for name, (count, digest) in sorted(file_digests.items())
+        }
+    }
+
+
+def compare_with_golden(result, golden, limit=10):
+    """Return a list of differences between a run and the golden result (empty when they match)"""
+    if golden.get('version') != GOLDEN_VERSION:
+        return [f"golden file version {golden.get('version')} (expected {GOLDEN_VERSION}); re-record it"]
+    problems = []
+    for key, expected in golden['totals'].items():
+        if result['totals'].get(key) != expected:
+            problems.append(f"{key}: expected {expected}, got {result['totals'].get(key)}")
+    for section, label in (('files', 'file'), ('file_groups', 'duplicate groups of')):
+        names = sorted(set(golden[section]) | set(result[section]))
+        changed = [name for name in names if golden[section].get(name) != result[section].get(name)]
+        for name in changed[:limit]:
+            problems.append(f"{label} {name}: expected {golden[section].get(name)}, got {result[section].get(name)}")
+        if len(changed) > limit:
+            problems.append(f"... and {len(changed) - limit} more {label} differences")
+    if result['groups_sha256'] != golden['groups_sha256'] and not problems:
+        problems.append("duplicate group digest differs (group order or contents)")
+    return problems
+
+
+def check_budget(phases, budget):
+    """Return a list of budget overruns; budget maps phase (or 'total') to seconds / rss_mb / min_throughput"""
+    problems = []
+    measured = dict(phases)
+    measured['total'] = {
+        'seconds': sum(stats['seconds'] for stats in phases.values()),
+        'rss_mb': max((stats.get('rss_mb', 0) for stats in phases.values()), default=0),
+        'throughput': None
+    }
+    for phase, limits in budget.items():
+        stats = measured.get(phase)
+        if stats is None:
+            problems.append(f"budget names unknown phase '{phase}'")
+            continue
+        if 'seconds' in limits and stats['seconds'] > limits['seconds']:
+            problems.append(f"{phase}: {stats['seconds']:.2f}s over the {limits['seconds']}s budget")
+        if 'rss_mb' in limits and stats.get('rss_mb', 0) > limits['rss_mb']:
+            problems.append(f"{phase}: peak RSS {stats['rss_mb']:.0f} MB over the {limits['rss_mb']} MB budget")
+        if 'min_throughput' in limits and (stats['throughput'] or 0) < limits['min_throughput']:
+            problems.append(f"{phase}: {stats['throughput'] or 0:,.0f} {PHASE_UNITS.get(phase, 'items')}/s "
+                            f"under the {limits['min_throughput']:,} minimum")
+    return problems
+
+
+def format_phases(phases):
+    lines = [f"{'phase':10s} {'seconds':>8s} {'peak RSS':>10s} {'throughput':>24s}"]
+    for phase, stats in phases.items():
+        throughput = f"{stats['throughput']:,.0f} {PHASE_UNITS[phase]}/s" if stats['throughput'] else "-"
+        lines.append(f"{phase:10s} {stats['seconds']:8.2f} {stats.get('rss_mb', 0):7.0f} MB {throughput:>24s}")
+    if 'source_mb' in phases.get('scan', {}):
+        lines.append(f"{'':10s} scan read {phases['scan']['source_mb'] / phases['scan']['seconds']:.1f} MB/s "
+                     f"of workbooks")
+    return "\n".join(lines)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Regression and performance-budget check on EXAMPLES")
+    parser.add_argument("--golden", default=GOLDEN_FILE, help="Golden result file (default: %(default)s)")
+    parser.add_argument("--budget", default=BUDGET_FILE, help="Performance budget file (default: %(default)s)")
+    parser.add_argument("--update-golden", action="store_true", help="Record this run as the golden result")
+    parser.add_argument("--no-budget", action="store_true", help="Check results only")
+    parser.add_argument("--format", default='csv', help="Report format timed in the report phase (default: csv)")
+    parser.add_argument("--isolated", action="store_true",
+                        help="Scan in worker processes like the GUI (their memory is not counted)")
+    parser.add_argument("--history", metavar="FILE", help="Append this run's metrics to a JSON lines file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    reader_problems = check_readers()
+    print("readers: " + ("match openpyxl" if not reader_problems else "DIFFER from openpyxl"))
+    for problem in reader_problems:
+        print(f"  {problem}")
+
+    store, file_summary, groups, phases = run_engine(args.format, args.isolated)
+    result = summarise(store, file_summary, groups)
+    print(f"regression: {result['totals']['files']} files, {result['totals']['locations']:,} barcodes, "
+          f"{result['totals']['duplicate_groups']:,} duplicate groups")
+    print(format_phases(phases))
+
+    if args.history:
+        with open(args.history, "a", encoding="utf-8") as f:
+            f.write(json.dumps({
+                'run': datetime.datetime.now().isoformat(timespec='seconds'),
+                'totals': result['totals'],
+                'phases': phases
+            }) + "\n")
+
+    if args.update_golden:
+        with open(args.golden, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+        print(f"Golden result written to '{args.golden}'")
+        return 0
+
+    with open(args.golden, encoding="utf-8") as f:
+        problems = compare_with_golden(result, json.load(f))
+    problems += reader_problems
+    print("results: " + ("match the golden result" if not problems else "DIFFER from the golden result"))
+    for problem in problems:
+        print(f"  {problem}")
+
+    if not args.no_budget:
+        with open(args.budget, encoding="utf-8") as f:
+            overruns = check_budget(phases, json.load(f))
+        print("budget: " + ("within budget" if not overruns else "EXCEEDED"))
+        for overrun in overruns:
+            print(f"  {overrun}")
+        problems += overruns
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())